@@ -58,6 +58,9 @@ from OCC.Core.XCAFDoc import (
 from OCC.Core.XSControl import XSControl_WorkSession
 from PyQt5.QtWidgets import QFileDialog
 
+from optimer import op_timer
+from workplane import forget_face_placements
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.ERROR)  # set to DEBUG | INFO | ERROR
 
@@ -134,6 +137,7 @@ class DocModel:
         self._share_dict[entry] = value
         return entry + '.' + str(value)
 
+    @op_timer.timed("parse")
     def parse_doc(self):
         """Generate new part_dict & label_dict from self.doc
 
@@ -300,7 +304,7 @@ class DocModel:
         self.parent_uid_stack.pop()
 
     def save_step_doc(self):
-        """Export self.doc to STEP file."""
+        """Export self.doc to STEP file. Return file name."""
 
         prompt = 'Specify name for saved step file.'
         fname, __ = QFileDialog.getSaveFileName(None, prompt, './',
@@ -317,10 +321,10 @@ class DocModel:
         step_writer.Transfer(self.doc, STEPControl_AsIs)
         status = step_writer.Write(fname)
         assert status == IFSelect_RetDone
-
+        return fname
 
     def open_doc(self):
-        """Open (.xbf) file, assign it to self.doc
+        """Open (.xbf) file, assign it to self.doc, return file name
 
         This doesn't work in PythonOCC.
         Use workaround: save_step_doc / load_stp_at_top
@@ -345,11 +349,12 @@ class DocModel:
             self.doc = doc
             save_step_doc(doc)
             self.parse_doc()
+            return fname
         else:
             print("Unable to open file.")
 
     def save_doc(self, doc=None):
-        """Save doc to file in XML Format (.xbf)"""
+        """Save doc to file in XML Format (.xbf), return file name"""
 
         # Enable using this method to save a doc other than self.doc
         if not doc:
@@ -371,9 +376,11 @@ class DocModel:
         save_status = self.app.SaveAs(doc, TCollection_ExtendedString(fname))
         if save_status == PCDM_SS_OK:
             print(f"File {fname} saved successfully.")
+            return fname
         else:
             print("File save failed.")
 
+    @op_timer.timed("doc")
     def replace_shape(self, uid, modshape):
         """Replace referred shape with modshape of component with uid
 
@@ -400,7 +407,9 @@ class DocModel:
         color_tool.SetColor(modshape, color, XCAFDoc_ColorGen)
         shape_tool.UpdateAssemblies()
         self.parse_doc()  # generate new part_dict
+        forget_face_placements(uid)
 
+    @op_timer.timed("doc")
     def add_component(self, shape, name, color):
         """Add new shape to top assembly of self.doc & return uid"""
 
@@ -428,6 +437,7 @@ class DocModel:
         uid = self.get_uid_from_entry(entry)
         return uid
 
+    @op_timer.timed("doc")
     def add_component_to_asy(self, shape, name, color, tag=1):
         """Add new shape to label at root with tag & return uid"""
 
@@ -455,6 +465,7 @@ class DocModel:
         uid = entry + '.0'  # this should work OK since it is new
         return uid
 
+    @op_timer.timed("doc")
     def change_label_name(self, uid, name):
         """Change the name of component with uid."""
 
@@ -536,6 +547,7 @@ def set_name_from_uid(doc, uid, name):
         return None
 
 
+@op_timer.timed("lint")
 def doc_linter(doc):
     """Clean doc by cycling through a STEP save/load cycle."""
 
@@ -608,7 +620,7 @@ def save_step_doc(doc):
 def _load_step():
     """Allow user to select step file to load, create doc and app,
 
-    transfer step data to doc, return step_file_name, doc, app"""
+    transfer step data to doc, return step_file_name, doc, app, f_path"""
 
     prompt = 'Select STEP file to import'
     f_path, __ = QFileDialog.getOpenFileName(
@@ -634,17 +646,17 @@ def _load_step():
     if status == IFSelect_RetDone:
         logger.info("Transfer doc to STEPCAFControl_Reader")
         step_reader.Transfer(doc)
-    return step_file_name, doc, app
+    return step_file_name, doc, app, f_path
 
 
 def load_stp_at_top(dm):
     """Get OCAF document from STEP file and assign it directly to dm.doc.
 
     This works as a surrogate for loading a CAD project that has previously
-    been saved as a STEP file."""
+    been saved as a STEP file. Return path of STEP file."""
 
     try:
-        f_name, doc, app = _load_step()
+        f_name, doc, app, f_path = _load_step()
     except TypeError as e:
         print("Load step cancelled")
         return
@@ -652,13 +664,14 @@ def load_stp_at_top(dm):
     dm.doc = doc
     dm.app = app
     dm.parse_doc()
+    return f_path
 
 
 def load_stp_cmpnt(dm):
     """Get OCAF document from STEP file and add (as component) to doc root.
 
     This is the way to load step files containing a single shape at root."""
-    f_name, doc, app = _load_step()
+    f_name, doc, app, __ = _load_step()
     shape_tool = XCAFDoc_DocumentTool_ShapeTool(doc.Main())
     color_tool = XCAFDoc_DocumentTool_ColorTool(doc.Main())
 
@@ -706,7 +719,7 @@ def load_stp_undr_top(dm):
     TDataStd_Name.Set(root_proto.label, TCollection_ExtendedString("Top"))
 
     # Get root label of step data (source label)
-    step_file_name, step_doc, step_app = _load_step()
+    step_file_name, step_doc, step_app, __ = _load_step()
     step_labels = TDF_LabelSequence()
     step_shape_tool = XCAFDoc_DocumentTool_ShapeTool(step_doc.Main())
     step_shape_tool.GetShapes(step_labels)
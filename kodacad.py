@@ -24,12 +24,13 @@
 
 import logging
 import math
+import os.path
 import pprint
 import sys
 
 from OCC.Core.BRep import BRep_Tool
 from OCC.Core.BRepAlgoAPI import BRepAlgoAPI_Cut, BRepAlgoAPI_Fuse
-from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_MakeFace, BRepBuilderAPI_Transform
+from OCC.Core.BRepBuilderAPI import BRepBuilderAPI_Transform
 from OCC.Core.BRepFilletAPI import BRepFilletAPI_MakeFillet
 from OCC.Core.BRepOffsetAPI import BRepOffsetAPI_MakeThickSolid
 from OCC.Core.BRepPrimAPI import BRepPrimAPI_MakePrism, BRepPrimAPI_MakeRevol
@@ -40,13 +41,15 @@ from OCC.Core.TopoDS import topods_Edge, topods_Face, topods_Vertex
 from OCC.Core.TopTools import TopTools_ListOfShape
 
 from PyQt5.QtGui import QIcon, QPixmap
-from PyQt5.QtWidgets import QApplication, QMenu, QTreeWidgetItemIterator
+from PyQt5.QtWidgets import QApplication, QFileDialog, QMenu
 
 from m2d import M2D
+from optimer import op_timer
 import stepanalyzer
 import docmodel
 from mainwindow import MainWindow, dm
 from OCCUtils import Topology
+import profileio
 import workplane
 
 logger = logging.getLogger(__name__)
@@ -126,7 +129,9 @@ def wpOnFace(*args):
         return
     faceU = win.faceStack.pop()
     faceW = win.faceStack.pop()
-    wp = workplane.WorkPlane(100, face=faceW, faceU=faceU)
+    # placement of faceW is cached under the uid of the part owning it
+    wp = workplane.WorkPlane(100, face=faceW, faceU=faceU,
+                             uid=win.part_uid_of_shape(faceW))
     new_uid = win.get_wp_uid(wp)
     display_new_active_wp(prev_uid, new_uid)
     win.clearCallback()
@@ -157,13 +162,10 @@ def makeWP():
 
 
 def display_new_active_wp(prev_uid, new_uid):
-    """Display new active wp & redraw previous active wp if it is displayed."""
+    """Display new active wp. (The border color of the previous active wp
+    was already updated by win.setActiveWp.)"""
 
-    # If currently active wp is displayed, redraw to show its new border color
-    if prev_uid and prev_uid not in win.hide_list:
-        win.redraw_workplanes()
-    else:
-        win.draw_wp(new_uid)
+    win.draw_wp(new_uid)
 
 
 #############################################
@@ -196,6 +198,39 @@ def get_inv_loc_of_active_asy():
     return loc
 
 
+def profile_ok(wp):
+    """Check profile on wp before using it for a 3D operation.
+    Return False (with crossing edges shown in red) if it isn't valid."""
+    crossings = wp.validateProfile()
+    if crossings:
+        win.draw_wp(win.activeWpUID)
+        pnts = [pnt for edge1, edge2, pnt in crossings]
+        print(f"Profile edges cross (or touch) at: {pnts}")
+        statusText = "Profile edges cross each other (shown in red)."
+        win.statusBar().showMessage(statusText)
+        return False
+    return True
+
+
+@op_timer.timed("kernel")
+def profile_face(wp):
+    """Return face of profile on wp for a 3D operation, else None.
+    If a region of the profile has been picked, its face is used.
+    Otherwise the profile edges must make valid closed loops."""
+    if wp.regionPnt:
+        face = wp.makeRegionFace(wp.regionPnt)
+        if not face:
+            print("No profile region at picked point.")
+        return face
+    if not profile_ok(wp):
+        return None
+    wireOK = wp.makeWire()
+    if not wireOK:
+        print(f"Unable to make wire. Open end points: {wp.openPts}")
+        return None
+    return wp.makeFace()
+
+
 def extrude():
     """Extrude profile on active WP to create a new part.
     Add new part to active assembly, if any, else to Top"""
@@ -206,21 +241,18 @@ def extrude():
     if len(win.lineEditStack) == 2:
         name = win.lineEditStack.pop()
         length = float(win.lineEditStack.pop()) * win.unitscale
-        wireOK = wp.makeWire()
-        if not wireOK:
-            print("Unable to make wire.")
+        myFaceProfile = profile_face(wp)
+        if not myFaceProfile:
             return
-        myFaceProfile = BRepBuilderAPI_MakeFace(wp.wire)
         aPrismVec = wp.wVec * length
-        new_part = BRepPrimAPI_MakePrism(
-            myFaceProfile.Shape(), aPrismVec).Shape()
-        loc_new_part = BRepBuilderAPI_Transform(
-            new_part, loc.Transformation()).Shape()
+        with op_timer.phase("kernel"):
+            new_part = BRepPrimAPI_MakePrism(myFaceProfile, aPrismVec).Shape()
+            loc_new_part = BRepBuilderAPI_Transform(
+                new_part, loc.Transformation()).Shape()
         uid = dm.add_component_to_asy(loc_new_part, name, DEFAULT_COLOR, tag)
         win.build_tree()
         win.setActivePart(uid)
         win.draw_shape(uid)
-        win.syncUncheckedToHideList()
         win.statusBar().showMessage("New part created.")
         win.clearCallback()
     else:
@@ -250,20 +282,18 @@ def revolve():
         p1 = win.ptStack.pop()
         name = win.lineEditStack.pop()
         win.clearAllStacks()
-        wireOK = wp.makeWire()
-        if not wireOK:
-            print("Unable to make wire.")
+        face = profile_face(wp)
+        if not face:
             return
-        face = BRepBuilderAPI_MakeFace(wp.wire).Shape()
         revolve_axis = gp_Ax1(p1, gp_Dir(gp_Vec(p1, p2)))
-        new_part = BRepPrimAPI_MakeRevol(face, revolve_axis).Shape()
-        loc_new_part = BRepBuilderAPI_Transform(
-            new_part, loc.Transformation()).Shape()
+        with op_timer.phase("kernel"):
+            new_part = BRepPrimAPI_MakeRevol(face, revolve_axis).Shape()
+            loc_new_part = BRepBuilderAPI_Transform(
+                new_part, loc.Transformation()).Shape()
         uid = dm.add_component_to_asy(loc_new_part, name, DEFAULT_COLOR, tag)
         win.build_tree()
         win.setActivePart(uid)
         win.draw_shape(uid)
-        win.syncUncheckedToHideList()
         win.statusBar().showMessage("New part created.")
         win.clearCallback()
     else:
@@ -341,17 +371,15 @@ def mill():
     wp = win.activeWp
     if win.lineEditStack:
         depth = float(win.lineEditStack.pop()) * win.unitscale
-        wireOK = wp.makeWire()
-        if not wireOK:
-            print("Unable to make wire.")
+        punchProfile = profile_face(wp)
+        if not punchProfile:
             return
-        wire = wp.wire
         workPart = win.activePart
         uid = win.activePartUID
-        punchProfile = BRepBuilderAPI_MakeFace(wire)
         aPrismVec = wp.wVec * -depth
-        tool = BRepPrimAPI_MakePrism(punchProfile.Shape(), aPrismVec).Shape()
-        newPart = BRepAlgoAPI_Cut(workPart, tool).Shape()
+        with op_timer.phase("kernel"):
+            tool = BRepPrimAPI_MakePrism(punchProfile, aPrismVec).Shape()
+            newPart = BRepAlgoAPI_Cut(workPart, tool).Shape()
         win.erase_shape(uid)
         dm.replace_shape(uid, newPart)
         win.draw_shape(uid)
@@ -379,17 +407,15 @@ def pull():
     wp = win.activeWp
     if win.lineEditStack:
         length = float(win.lineEditStack.pop()) * win.unitscale
-        wireOK = wp.makeWire()
-        if not wireOK:
-            print("Unable to make wire.")
+        pullProfile = profile_face(wp)
+        if not pullProfile:
             return
-        wire = wp.wire
         workPart = win.activePart
         uid = win.activePartUID
-        pullProfile = BRepBuilderAPI_MakeFace(wire)
         aPrismVec = wp.wVec * length
-        tool = BRepPrimAPI_MakePrism(pullProfile.Shape(), aPrismVec).Shape()
-        newPart = BRepAlgoAPI_Fuse(workPart, tool).Shape()
+        with op_timer.phase("kernel"):
+            tool = BRepPrimAPI_MakePrism(pullProfile, aPrismVec).Shape()
+            newPart = BRepAlgoAPI_Fuse(workPart, tool).Shape()
         win.erase_shape(uid)
         dm.replace_shape(uid, newPart)
         win.draw_shape(uid)
@@ -444,7 +470,8 @@ def fillet(event=None):
         for edge in edges:
             mkFillet.Add(fillet_r, edge)
         try:
-            newPart = mkFillet.Shape()
+            with op_timer.phase("kernel"):
+                newPart = mkFillet.Shape()
             win.erase_shape(uid)
             dm.replace_shape(uid, newPart)
             win.draw_shape(uid)
@@ -478,7 +505,8 @@ def fuse():
         shape = win.shapeStack.pop()
         workpart = win.activePart
         uid = win.activePartUID
-        newPart = BRepAlgoAPI_Fuse(workpart, shape).Shape()
+        with op_timer.phase("kernel"):
+            newPart = BRepAlgoAPI_Fuse(workpart, shape).Shape()
         win.erase_shape(uid)
         dm.replace_shape(uid, newPart)
         win.draw_shape(uid)
@@ -512,8 +540,9 @@ def shell(event=None):
         workPart = win.activePart
         uid = win.activePartUID
         shellT = float(text) * win.unitscale
-        newPart = BRepOffsetAPI_MakeThickSolid(
-            workPart, faces, -shellT, 1.0e-3).Shape()
+        with op_timer.phase("kernel"):
+            newPart = BRepOffsetAPI_MakeThickSolid(
+                workPart, faces, -shellT, 1.0e-3).Shape()
         win.erase_shape(uid)
         dm.replace_shape(uid, newPart)
         win.draw_shape(uid)
@@ -545,13 +574,35 @@ def shellC(shapeList, *args):
 #############################################
 
 
+def save_workplanes(doc_fname):
+    """Save all workplanes in a file alongside doc file doc_fname."""
+    if doc_fname:
+        fname = workplane.wp_file_name(doc_fname)
+        workplane.save_workplanes(fname, win.wp_dict)
+
+
+def load_workplanes(doc_fname):
+    """Load workplanes (if any) saved alongside doc file doc_fname."""
+    if doc_fname:
+        fname = workplane.wp_file_name(doc_fname)
+        if os.path.exists(fname):
+            win.load_wp_dict(workplane.load_workplanes(fname))
+
+
 def open_doc():
-    dm.open_doc()
+    fname = dm.open_doc()
+    load_workplanes(fname)
     win.build_tree()
 
 
 def save_doc():
-    dm.save_doc()
+    fname = dm.save_doc()
+    save_workplanes(fname)
+
+
+def save_step_doc():
+    fname = dm.save_step_doc()
+    save_workplanes(fname)
 
 
 def load_stp_at_top():
@@ -560,7 +611,8 @@ def load_stp_at_top():
 
     win.setActivePart(0)
     win.setActiveAsy(0)
-    docmodel.load_stp_at_top(dm)
+    fname = docmodel.load_stp_at_top(dm)
+    load_workplanes(fname)
     win.build_tree()
     win.redraw()
     win.fitAll()
@@ -584,6 +636,76 @@ def load_stp_undr_top():
     win.fitAll()
 
 
+def add_to_active_wp(records, points, constr=False):
+    """Add records & points (in user units) to active wp in one batch."""
+    wp = win.activeWp
+    if not wp:
+        print("No active workplane.")
+        return
+    records = profileio.scale_records(records, win.unitscale)
+    wp.add_records(records, constr)
+    for x, y in points:
+        wp.hvcl((x * win.unitscale, y * win.unitscale))
+    win.draw_wp(win.activeWpUID)
+    statusText = f"Added {len(records)} elements and {len(points)} points."
+    win.statusBar().showMessage(statusText)
+
+
+def import_to_wp(constr=False):
+    """Import profile (or construction) geometry from CSV or DXF file."""
+    prompt = "Select file to import onto active workplane"
+    fname, __ = QFileDialog.getOpenFileName(
+        None, prompt, "./", "DXF or CSV files (*.dxf *.csv *.txt)")
+    if not fname:
+        return
+    try:
+        if fname.lower().endswith(".dxf"):
+            records, points = profileio.read_dxf(fname), []
+        else:
+            records, points = profileio.read_csv(fname)
+    except (OSError, ValueError) as e:
+        win.statusBar().showMessage(f"Unable to import {fname}: {e}")
+        return
+    add_to_active_wp(records, points, constr)
+
+
+def import_constr_to_wp():
+    import_to_wp(constr=True)
+
+
+def export_wp(constr=False):
+    """Export active wp profile (and construction geometry) to a DXF or
+    SVG file, in wp 2d coords."""
+    wp = win.activeWp
+    if not wp:
+        print("No active workplane.")
+        return
+    prompt = "Export active workplane as"
+    fname, __ = QFileDialog.getSaveFileName(
+        None, prompt, "./", "DXF files (*.dxf);;SVG files (*.svg)")
+    if not fname:
+        return
+    construction = wp.constructionRecords() if constr else []
+    if fname.lower().endswith(".svg"):
+        profileio.write_svg(fname, wp.profileRecords(), construction)
+    else:
+        if not fname.lower().endswith(".dxf"):
+            fname += ".dxf"
+        profileio.write_dxf(fname, wp.profileRecords(), construction)
+    win.statusBar().showMessage(f"Workplane exported to {fname}")
+
+
+def export_wp_constr():
+    export_wp(constr=True)
+
+
+def paste_to_wp():
+    """Add profile geometry from CSV text (x,y rows) on the clipboard."""
+    text = QApplication.clipboard().text()
+    records, points = profileio.csv_records(text.splitlines())
+    add_to_active_wp(records, points)
+
+
 #############################################
 #
 #  Info & Utility functions
@@ -649,18 +771,15 @@ def printActPart():
 def printTreeView():
     """Print 'uid'; 'name'; 'parent' for all items in treeView."""
 
-    iterator = QTreeWidgetItemIterator(win.treeView)
-    while iterator.value():
-        item = iterator.value()
-        name = item.text(0)
-        uid = item.text(1)
+    model = win.treeModel
+    for node in model.nodes():
+        uid = node.uid
+        name = model.name(uid)
         pname = None
-        parent = item.parent()
-        if parent:
-            puid = parent.text(1)
-            pname = parent.text(0)
+        parent = node.parent
+        if parent.uid:
+            pname = model.name(parent.uid)
         print(f"UID: {uid}; Name: {name}; Parent: {pname}")
-        iterator += 1
 
 
 def printDrawList():
@@ -671,6 +790,12 @@ def printInSync():
     print(win.inSync())
 
 
+def printOpTimings():
+    """Print timing (ms) of the phases of recent operations, oldest first."""
+    for line in op_timer.dump():
+        print(line)
+
+
 def setUnits_in():
     win.setUnits("in")
 
@@ -690,11 +815,22 @@ if __name__ == "__main__":
     win.add_function_to_menu("File", "Load STEP At Top", load_stp_at_top)
     win.add_function_to_menu("File", "Load STEP Under Top", load_stp_undr_top)
     win.add_function_to_menu("File", "Load STEP Component", load_stp_cmpnt)
-    win.add_function_to_menu("File", "Save STEP (Top)", dm.save_step_doc)
+    win.add_function_to_menu("File", "Save STEP (Top)", save_step_doc)
     win.add_menu("Workplane")
     win.add_function_to_menu("Workplane", "At Origin, XY Plane", makeWP)
     win.add_function_to_menu("Workplane", "On face", wpOnFace)
     win.add_function_to_menu("Workplane", "By 3 points", wpBy3Pts)
+    win.add_function_to_menu("Workplane", "Import Profile (DXF/CSV)",
+                             import_to_wp)
+    win.add_function_to_menu("Workplane", "Import Construction (DXF/CSV)",
+                             import_constr_to_wp)
+    win.add_function_to_menu("Workplane", "Paste Profile Points",
+                             paste_to_wp)
+    win.add_function_to_menu("Workplane", "Export Profile (DXF/SVG)",
+                             export_wp)
+    win.add_function_to_menu("Workplane",
+                             "Export Profile + Construction (DXF/SVG)",
+                             export_wp_constr)
     win.add_menu("Create 3D")
     win.add_function_to_menu("Create 3D", "Extrude", extrude)
     win.add_function_to_menu("Create 3D", "Revolve", revolve)
@@ -720,6 +856,8 @@ if __name__ == "__main__":
         "Utility", "print(Active Prt Info)", printActivePartInfo)
     win.add_function_to_menu(
         "Utility", "Clear Line Edit Stack", win.clearLEStack)
+    win.add_function_to_menu(
+        "Utility", "print(Operation Timings)", printOpTimings)
     win.add_function_to_menu("Utility", "Calculator", win.launchCalc)
     win.add_function_to_menu("Utility", "set Units ->in", setUnits_in)
     win.add_function_to_menu("Utility", "set Units ->mm", setUnits_mm)
@@ -765,10 +903,14 @@ if __name__ == "__main__":
     win.wcToolBar.addAction(
         QIcon(QPixmap("icons/lbcl.gif")), "Linear Bisector", a2d.clineLinBisec
     )
-    # win.wcToolBar.addAction(QIcon(QPixmap('icons/parcl.gif')), 'Parallel', a2d.clinePara)
-    # win.wcToolBar.addAction(QIcon(QPixmap('icons/perpcl.gif')), 'Perpendicular', a2d.clinePerp)
-    # win.wcToolBar.addAction(QIcon(QPixmap('icons/cltan1.gif')), 'Tangent to circle', a2d.clineTan1)
-    # win.wcToolBar.addAction(QIcon(QPixmap('icons/cltan2.gif')), 'Tangent 2 circles', a2d.clineTan2)
+    win.wcToolBar.addAction(
+        QIcon(QPixmap("icons/parcl.gif")), "Parallel", a2d.clinePara)
+    win.wcToolBar.addAction(
+        QIcon(QPixmap("icons/perpcl.gif")), "Perpendicular", a2d.clinePerp)
+    win.wcToolBar.addAction(
+        QIcon(QPixmap("icons/cltan1.gif")), "Tangent to circle", a2d.clineTan1)
+    win.wcToolBar.addAction(
+        QIcon(QPixmap("icons/cltan2.gif")), "Tangent 2 circles", a2d.clineTan2)
     win.wcToolBar.addAction(
         QIcon(QPixmap("icons/ccirc.gif")), "Circle", a2d.ccirc)
     # win.wcToolBar.addAction(QIcon(QPixmap('icons/cc3p.gif')), 'Circle by 3Pts', a2d.ccirc)
@@ -790,6 +932,10 @@ if __name__ == "__main__":
     )
     win.wgToolBar.addAction(
         QIcon(QPixmap("icons/arc3p.gif")), "Arc by 3Pts", a2d.arc3p)
+    win.wgToolBar.addAction(
+        QIcon(QPixmap("icons/array.gif")), "Linear Array", a2d.linearArray)
+    win.wgToolBar.addAction(
+        QIcon(QPixmap("icons/rotate.gif")), "Polar Array", a2d.polarArray)
     win.wgToolBar.addSeparator()
     # win.wgToolBar.addAction(QIcon(QPixmap('icons/translate.gif')), 'Translate Profile', a2d.geom)
     # win.wgToolBar.addAction(QIcon(QPixmap('icons/rotate.gif')), 'Rotate Profile', a2d.geom)
@@ -797,5 +943,23 @@ if __name__ == "__main__":
         QIcon(QPixmap("icons/del_el.gif")), "Delete Profile Elem", a2d.delEl
     )
 
+    win.add_function_to_menu("Workplane", "Offset Profile", a2d.offsetProfile)
+    win.add_function_to_menu("Workplane", "Pick Profile Region",
+                             a2d.pickRegion)
+    win.add_function_to_menu("Workplane", "Intersection Points In View",
+                             a2d.pointsInView)
+    win.add_function_to_menu("Workplane", "Intersection Points In Border",
+                             a2d.pointsInBorder)
+
+    win.add_menu("Constrain")
+    win.add_function_to_menu("Constrain", "Horizontal", a2d.constrH)
+    win.add_function_to_menu("Constrain", "Vertical", a2d.constrV)
+    win.add_function_to_menu("Constrain", "Length / Radius", a2d.constrSize)
+    win.add_function_to_menu("Constrain", "Angle", a2d.constrAngle)
+    win.add_function_to_menu("Constrain", "Tangent", a2d.constrTangent)
+    win.add_function_to_menu("Constrain", "Coincident", a2d.constrCoinc)
+    win.add_function_to_menu("Constrain", "Distance", a2d.constrDist)
+    win.add_function_to_menu("Constrain", "Fix Point", a2d.constrFix)
+
     win.raise_()  # bring the app to the top
     app.exec_()
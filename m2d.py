@@ -23,7 +23,10 @@
 
 
 from OCC.Core.BRep import BRep_Tool
-from OCC.Core.TopoDS import TopoDS_Vertex, topods_Vertex
+from OCC.Core.gp import gp_Dir, gp_Pnt
+from OCC.Core.TopoDS import TopoDS_Edge, TopoDS_Vertex, topods_Vertex
+
+SNAP_PIXELS = 10  # snap to workplane points within this distance of cursor
 
 
 class M2D:
@@ -32,6 +35,7 @@ class M2D:
     def __init__(self, win, display):
         self.win = win
         self.display = display
+        self.offsetEdges = []  # edges added by latest offsetProfile
 
     #############################################
     #
@@ -39,9 +43,19 @@ class M2D:
     #
     #############################################
 
-    def add_vertex_to_xyPtStack(self, shapeList):
-        """Helper function to convert vertex to gp_Pnt and put on ptStack."""
+    def add_vertex_to_xyPtStack(self, shapeList, *args):
+        """Helper function to put 2d point picked on active wp on ptStack.
+
+        The point is found from the mouse coords (args) with the active
+        workplane's snap index (wp intersection points aren't selectable).
+        Only if nothing is snapped to, picked vertices (of parts, say) are
+        converted to 2d points and used instead."""
         wp = self.win.activeWp
+        if len(args) >= 2 and wp:
+            pt2d = self.snap_to_wp_pt(args[0], args[1])
+            if pt2d:
+                self.win.xyPtStack.append(pt2d)
+                return
         for shape in shapeList:
             if isinstance(shape, TopoDS_Vertex):  # Guard against wrong type
                 vrtx = topods_Vertex(shape)
@@ -53,6 +67,58 @@ class M2D:
             else:
                 print(f"(Unwanted) shape type: {type(shape)}")
 
+    def cursor_to_wp(self, x, y):
+        """Return (2d point, snap tolerance) on active wp under mouse
+        coords x, y, or (None, None) if the view is edge-on to the wp."""
+        wp = self.win.activeWp
+        view = self.display.View
+        X, Y, Z, Vx, Vy, Vz = view.ConvertWithProj(int(x), int(y))
+        cursor = wp.ray_to_2d(gp_Pnt(X, Y, Z), gp_Dir(Vx, Vy, Vz))
+        if cursor:
+            return (cursor, view.Convert(SNAP_PIXELS))  # model distance
+        return (None, None)
+
+    def snap_to_wp_pt(self, x, y):
+        """Return snap point on active wp nearest mouse coords x, y, if any."""
+        cursor, tol = self.cursor_to_wp(x, y)
+        if cursor:
+            return self.win.activeWp.snap(cursor, tol)
+
+    def add_cline_to_clineStack(self, shapeList, *args):
+        """Helper function to put cline under cursor (if any) on clineStack.
+
+        Clines aren't returned as picked shapes, so the cline is found from
+        the mouse coords (args)."""
+        if len(args) >= 2 and self.win.activeWp:
+            cursor, tol = self.cursor_to_wp(args[0], args[1])
+            if cursor:
+                cline = self.win.activeWp.nearest_cline(cursor, tol)
+                if cline:
+                    self.win.clineStack.append(cline)
+                    return True
+        return False
+
+    def add_ccirc_to_ccircStack(self, shapeList, *args):
+        """Helper function to put ccirc under cursor (if any) on ccircStack."""
+        if len(args) >= 2 and self.win.activeWp:
+            cursor, tol = self.cursor_to_wp(args[0], args[1])
+            if cursor:
+                ccirc = self.win.activeWp.nearest_ccirc(cursor, tol)
+                if ccirc:
+                    self.win.ccircStack.append(ccirc)
+                    return True
+        return False
+
+    def floatsFromLineEdit(self):
+        """Pop text from lineEditStack and return list of the (space or
+        comma separated) numbers in it."""
+        text = self.win.lineEditStack.pop()
+        try:
+            return [float(val) for val in text.replace(",", " ").split()]
+        except ValueError as e:
+            print(f"{e}")
+            return []
+
     def processLineEdit(self):
         """pop value from lineEditStack and place on floatStack or ptStack."""
 
@@ -90,7 +156,7 @@ class M2D:
 
     def clineHC(self, shapeList, *args):
         """Callback (collector) for clineH"""
-        self.add_vertex_to_xyPtStack(shapeList)
+        self.add_vertex_to_xyPtStack(shapeList, *args)
         if self.win.lineEditStack:
             self.processLineEdit()
         if self.win.floatStack:
@@ -119,7 +185,7 @@ class M2D:
 
     def clineVC(self, shapeList, *args):
         """Callback (collector) for clineV"""
-        self.add_vertex_to_xyPtStack(shapeList)
+        self.add_vertex_to_xyPtStack(shapeList, *args)
         if self.win.lineEditStack:
             self.processLineEdit()
         if self.win.floatStack:
@@ -148,7 +214,7 @@ class M2D:
 
     def clineHVC(self, shapeList, *args):
         """Callback (collector) for clineHV"""
-        self.add_vertex_to_xyPtStack(shapeList)
+        self.add_vertex_to_xyPtStack(shapeList, *args)
         if self.win.lineEditStack:
             self.processLineEdit()
         if self.win.xyPtStack:
@@ -174,7 +240,7 @@ class M2D:
 
     def cline2PtsC(self, shapeList, *args):
         """Callback (collector) for cline2Pts"""
-        self.add_vertex_to_xyPtStack(shapeList)
+        self.add_vertex_to_xyPtStack(shapeList, *args)
         if self.win.lineEditStack:
             self.processLineEdit()
         if len(self.win.xyPtStack) == 2:
@@ -202,7 +268,7 @@ class M2D:
 
     def clineAngC(self, shapeList, *args):
         """Callback (collector) for clineAng"""
-        self.add_vertex_to_xyPtStack(shapeList)
+        self.add_vertex_to_xyPtStack(shapeList, *args)
         self.win.lineEdit.setFocus()
         if self.win.lineEditStack:
             self.processLineEdit()
@@ -230,21 +296,136 @@ class M2D:
 
     def clineLinBisecC(self, shapeList, *args):
         """Callback (collector) for clineLinBisec"""
-        self.add_vertex_to_xyPtStack(shapeList)
+        self.add_vertex_to_xyPtStack(shapeList, *args)
         if len(self.win.xyPtStack) == 2:
             self.clineLinBisec()
 
     def clinePara(self):
-        pass
+        """Construction lines parallel to a cline, at a list of offset
+        distances (both sides) or through picked points."""
+        if self.win.clineStack and (self.win.floatStack or
+                                    self.win.xyPtStack):
+            wp = self.win.activeWp
+            dists = [d * self.win.unitscale for d in self.win.floatStack]
+            wp.parcl(self.win.clineStack[-1], dists, self.win.xyPtStack)
+            self.win.floatStack = []
+            self.win.xyPtStack = []
+            self.win.draw_wp(self.win.activeWpUID)
+        else:
+            self.win.registerCallback(self.clineParaC)
+            self.display.SetSelectionModeVertex()
+            self.win.clineStack = []
+            self.win.xyPtStack = []
+            self.win.floatStack = []
+            self.win.lineEditStack = []
+            self.win.lineEdit.setFocus()
+            statusText = ("Select cline, then enter offset distance(s) "
+                          "or pick point (or enter x,y coords).")
+            self.win.statusBar().showMessage(statusText)
+
+    def clineParaC(self, shapeList, *args):
+        """Callback (collector) for clinePara"""
+        if not self.win.clineStack:
+            self.add_cline_to_clineStack(shapeList, *args)
+        else:
+            self.add_vertex_to_xyPtStack(shapeList, *args)
+        self.win.lineEdit.setFocus()
+        if self.win.lineEditStack:
+            isPnt = "," in self.win.lineEditStack[-1]  # x,y (not distances)
+            vals = self.floatsFromLineEdit()
+            if isPnt and len(vals) == 2:
+                self.win.xyPtStack.append(
+                    (vals[0] * self.win.unitscale, vals[1] * self.win.unitscale))
+            else:
+                self.win.floatStack.extend(vals)
+        if self.win.clineStack and (self.win.floatStack or
+                                    self.win.xyPtStack):
+            self.clinePara()
 
     def clinePerp(self):
-        pass
+        """Construction lines perpendicular to a cline through points."""
+        if self.win.clineStack and self.win.xyPtStack:
+            wp = self.win.activeWp
+            wp.perpcl(self.win.clineStack[-1], self.win.xyPtStack)
+            self.win.xyPtStack = []
+            self.win.draw_wp(self.win.activeWpUID)
+        else:
+            self.win.registerCallback(self.clinePerpC)
+            self.display.SetSelectionModeVertex()
+            self.win.clineStack = []
+            self.win.xyPtStack = []
+            self.win.lineEditStack = []
+            self.win.lineEdit.setFocus()
+            statusText = "Select cline, then pick point(s) or enter x,y coords."
+            self.win.statusBar().showMessage(statusText)
+
+    def clinePerpC(self, shapeList, *args):
+        """Callback (collector) for clinePerp"""
+        if not self.win.clineStack:
+            self.add_cline_to_clineStack(shapeList, *args)
+        else:
+            self.add_vertex_to_xyPtStack(shapeList, *args)
+        self.win.lineEdit.setFocus()
+        if self.win.lineEditStack:
+            vals = self.floatsFromLineEdit()
+            if len(vals) == 2:
+                self.win.xyPtStack.append(
+                    (vals[0] * self.win.unitscale, vals[1] * self.win.unitscale))
+            else:
+                self.win.statusBar().showMessage("Enter x,y coords of point.")
+        if self.win.clineStack and self.win.xyPtStack:
+            self.clinePerp()
 
     def clineTan1(self):
-        pass
+        """Construction lines through a point tangent to c-circle(s)."""
+        if self.win.ccircStack and self.win.xyPtStack:
+            wp = self.win.activeWp
+            wp.tancl1(self.win.ccircStack, self.win.xyPtStack)
+            self.win.xyPtStack = []
+            self.win.draw_wp(self.win.activeWpUID)
+        else:
+            self.win.registerCallback(self.clineTan1C)
+            self.display.SetSelectionModeVertex()
+            self.win.ccircStack = []
+            self.win.xyPtStack = []
+            self.win.lineEditStack = []
+            self.win.lineEdit.setFocus()
+            statusText = "Select c-circle(s), then pick point or enter x,y coords."
+            self.win.statusBar().showMessage(statusText)
+
+    def clineTan1C(self, shapeList, *args):
+        """Callback (collector) for clineTan1"""
+        if shapeList or not self.add_ccirc_to_ccircStack(shapeList, *args):
+            self.add_vertex_to_xyPtStack(shapeList, *args)
+        self.win.lineEdit.setFocus()
+        if self.win.lineEditStack:
+            self.processLineEdit()
+        if self.win.ccircStack and self.win.xyPtStack:
+            self.clineTan1()
 
     def clineTan2(self):
-        pass
+        """Construction lines tangent to every pair of picked c-circles."""
+        if len(self.win.ccircStack) >= 2:
+            wp = self.win.activeWp
+            wp.tancl2(self.win.ccircStack)
+            self.win.ccircStack = []
+            self.win.draw_wp(self.win.activeWpUID)
+        else:
+            self.win.registerCallback(self.clineTan2C)
+            self.display.SetSelectionModeVertex()
+            self.win.ccircStack = []
+            self.win.lineEditStack = []
+            self.win.lineEdit.setFocus()
+            statusText = "Select c-circles, then press Enter to make tangent lines."
+            self.win.statusBar().showMessage(statusText)
+
+    def clineTan2C(self, shapeList, *args):
+        """Callback (collector) for clineTan2"""
+        self.add_ccirc_to_ccircStack(shapeList, *args)
+        if self.win.lineEditStack:
+            self.win.lineEditStack = []
+            if len(self.win.ccircStack) >= 2:
+                self.clineTan2()
 
     def ccirc(self):
         """Create a c-circle from center & radius or center & Pnt on circle"""
@@ -276,7 +457,7 @@ class M2D:
 
     def ccircC(self, shapeList, *args):
         """callback (collector) for ccirc"""
-        self.add_vertex_to_xyPtStack(shapeList)
+        self.add_vertex_to_xyPtStack(shapeList, *args)
         self.win.lineEdit.setFocus()
         if self.win.lineEditStack:
             self.processLineEdit()
@@ -310,7 +491,7 @@ class M2D:
 
     def lineC(self, shapeList, *args):
         """callback (collector) for line"""
-        self.add_vertex_to_xyPtStack(shapeList)
+        self.add_vertex_to_xyPtStack(shapeList, *args)
         self.win.lineEdit.setFocus()
         if self.win.lineEditStack:
             self.processLineEdit()
@@ -336,7 +517,7 @@ class M2D:
 
     def rectC(self, shapeList, *args):
         """callback (collector) for rect"""
-        self.add_vertex_to_xyPtStack(shapeList)
+        self.add_vertex_to_xyPtStack(shapeList, *args)
         self.win.lineEdit.setFocus()
         if self.win.lineEditStack:
             self.processLineEdit()
@@ -373,7 +554,7 @@ class M2D:
 
     def circleC(self, shapeList, *args):
         """callback (collector) for circle"""
-        self.add_vertex_to_xyPtStack(shapeList)
+        self.add_vertex_to_xyPtStack(shapeList, *args)
         self.win.lineEdit.setFocus()
         if self.win.lineEditStack:
             self.processLineEdit()
@@ -402,7 +583,7 @@ class M2D:
 
     def arcc2pC(self, shapeList, *args):
         """callback (collector) for arcc2p"""
-        self.add_vertex_to_xyPtStack(shapeList)
+        self.add_vertex_to_xyPtStack(shapeList, *args)
         self.win.lineEdit.setFocus()
         if self.win.lineEditStack:
             self.processLineEdit()
@@ -429,7 +610,7 @@ class M2D:
 
     def arc3pC(self, shapeList, *args):
         """Callback (collector) for arc3p"""
-        self.add_vertex_to_xyPtStack(shapeList)
+        self.add_vertex_to_xyPtStack(shapeList, *args)
         self.win.lineEdit.setFocus()
         if self.win.lineEditStack:
             self.processLineEdit()
@@ -439,6 +620,419 @@ class M2D:
     def geom(self):
         pass
 
+    #############################################
+    #
+    # 2d Profile pattern functions
+    #
+    #############################################
+
+    def add_edges_to_shapeStack(self, shapeList):
+        """Helper function to put picked (profile) edges on shapeStack."""
+        wp = self.win.activeWp
+        for shape in shapeList:
+            if isinstance(shape, TopoDS_Edge):  # Guard against wrong type
+                if wp.edgeReg.find(shape) is not None:  # not construction
+                    self.win.shapeStack.append(shape)
+
+    def arrayCount(self):
+        """Pop number of array instances from floatStack and return it.
+        Return None (and show why) unless it is a whole number >= 2."""
+        value = self.win.floatStack.pop()
+        if not value.is_integer() or value < 2:
+            statusText = (f"Number of instances must be a whole number >= 2"
+                          f" (not {value:g}). Enter it again.")
+            self.win.statusBar().showMessage(statusText)
+            return None
+        return int(value)
+
+    def linearArray(self):
+        """Create a linear array of selected profile elements."""
+        if self.win.shapeStack and self.win.xyPtStack and self.win.floatStack:
+            wp = self.win.activeWp
+            count = self.arrayCount()
+            if not count:
+                return
+            delta = self.win.xyPtStack.pop()
+            wp.linear_array(self.win.shapeStack, delta, count)
+            self.win.shapeStack = []
+            self.win.xyPtStack = []
+            self.win.floatStack = []
+            self.win.draw_wp(self.win.activeWpUID)
+        else:
+            self.win.registerCallback(self.linearArrayC)
+            self.display.SetSelectionModeEdge()
+            self.win.shapeStack = []
+            self.win.xyPtStack = []
+            self.win.floatStack = []
+            self.win.lineEditStack = []
+            self.win.lineEdit.setFocus()
+            statusText = "Select profile element(s), enter dx,dy spacing then number of instances."
+            self.win.statusBar().showMessage(statusText)
+
+    def linearArrayC(self, shapeList, *args):
+        """Callback (collector) for linearArray"""
+        self.add_edges_to_shapeStack(shapeList)
+        self.win.lineEdit.setFocus()
+        if self.win.lineEditStack:
+            self.processLineEdit()
+        if self.win.shapeStack and self.win.xyPtStack and self.win.floatStack:
+            self.linearArray()
+
+    def polarArray(self):
+        """Create a circular array of selected profile elements."""
+        if self.win.shapeStack and self.win.xyPtStack and self.win.floatStack:
+            wp = self.win.activeWp
+            count = self.arrayCount()
+            if not count:
+                return
+            ctr = self.win.xyPtStack.pop()
+            wp.polar_array(self.win.shapeStack, ctr, count)
+            self.win.shapeStack = []
+            self.win.xyPtStack = []
+            self.win.floatStack = []
+            self.win.draw_wp(self.win.activeWpUID)
+        else:
+            self.win.registerCallback(self.polarArrayC)
+            self.display.SetSelectionModeEdge()
+            self.win.shapeStack = []
+            self.win.xyPtStack = []
+            self.win.floatStack = []
+            self.win.lineEditStack = []
+            self.win.lineEdit.setFocus()
+            statusText = "Select profile element(s), pick (or enter x,y) center then enter number of instances."
+            self.win.statusBar().showMessage(statusText)
+
+    def polarArrayC(self, shapeList, *args):
+        """Callback (collector) for polarArray"""
+        self.add_edges_to_shapeStack(shapeList)
+        if not shapeList:  # pick in empty space snaps to center point
+            self.add_vertex_to_xyPtStack(shapeList, *args)
+        self.win.lineEdit.setFocus()
+        if self.win.lineEditStack:
+            self.processLineEdit()
+        if self.win.shapeStack and self.win.xyPtStack and self.win.floatStack:
+            self.polarArray()
+
+    def offsetProfile(self):
+        """Offset closed profile loops by distance (neg = inward).
+
+        Entering another distance replaces the previous offset, so values
+        can be tried until the result looks right."""
+        if self.win.floatStack:
+            wp = self.win.activeWp
+            dist = self.win.floatStack.pop() * self.win.unitscale
+            join = "arc"
+            if self.win.lineEditStack:
+                join = self.win.lineEditStack.pop()
+            for edge in self.offsetEdges:
+                wp.remove_edge(edge)
+            self.offsetEdges = wp.add_offset(dist, join)
+            if self.offsetEdges is None:
+                self.offsetEdges = []
+                statusText = "Offset failed. Try a smaller distance."
+            elif not self.offsetEdges:
+                statusText = "Unable to offset profile (no closed loops?)"
+            else:
+                statusText = ("Profile offset. Enter another distance "
+                              "to replace it.")
+            self.win.refresh_wp_edges(self.win.activeWpUID)
+            self.win.statusBar().showMessage(statusText)
+        else:
+            self.win.registerCallback(self.offsetProfileC)
+            self.offsetEdges = []
+            self.win.floatStack = []
+            self.win.lineEditStack = []
+            self.win.lineEdit.setFocus()
+            statusText = ("Enter offset distance (neg = inward), "
+                          "add ' s' for sharp corners.")
+            self.win.statusBar().showMessage(statusText)
+
+    def offsetProfileC(self, shapeList, *args):
+        """Callback (collector) for offsetProfile"""
+        self.win.lineEdit.setFocus()
+        if self.win.lineEditStack:
+            text = self.win.lineEditStack.pop()
+            fields = text.split()
+            try:
+                self.win.floatStack.append(float(fields[0]))
+            except (IndexError, ValueError) as e:
+                print(f"{e}")
+                return
+            if fields[1:] and fields[1].lower().startswith("s"):
+                self.win.lineEditStack.append("intersection")
+        if self.win.floatStack:
+            self.offsetProfile()
+
+    def pickRegion(self):
+        """Pick region of profile (by clicking inside it) to be used in
+        place of the profile loops by extrude, mill, etc. Clicking outside
+        all regions goes back to using the profile loops."""
+        self.win.registerCallback(self.pickRegionC)
+        self.display.SetSelectionModeNeutral()
+        statusText = "Click inside a region of the profile."
+        self.win.statusBar().showMessage(statusText)
+
+    def pickRegionC(self, shapeList, *args):
+        """Callback (collector) for pickRegion"""
+        wp = self.win.activeWp
+        if len(args) < 2 or not wp:
+            return
+        cursor, tol = self.cursor_to_wp(args[0], args[1])
+        if not cursor:
+            return
+        if wp.regionAt(cursor):
+            wp.regionPnt = cursor
+            statusText = "Region picked. It will be used as the profile."
+        else:
+            wp.regionPnt = None
+            statusText = "No region picked. Profile loops will be used."
+        self.win.draw_wp_region(self.win.activeWpUID)
+        self.display.Repaint()
+        self.win.statusBar().showMessage(statusText)
+
+    def pointsInView(self):
+        """Limit intersection points of active wp to the current view
+        extents (the box on the wp spanned by the view's corners)."""
+        wp = self.win.activeWp
+        if not wp:
+            return
+        w, h = self.win.canvas.width(), self.win.canvas.height()
+        corners = [self.cursor_to_wp(x, y)[0]
+                   for x, y in ((0, 0), (w, 0), (0, h), (w, h))]
+        if None in corners:
+            statusText = "View is edge-on to the workplane."
+        else:
+            xList = [x for x, y in corners]
+            yList = [y for x, y in corners]
+            wp.set_roi((min(xList), min(yList), max(xList), max(yList)))
+            self.win.draw_wp(self.win.activeWpUID)
+            statusText = "Intersection points limited to the view."
+        self.win.statusBar().showMessage(statusText)
+
+    def pointsInBorder(self):
+        """Limit intersection points of active wp to its border (default)."""
+        wp = self.win.activeWp
+        if wp:
+            wp.set_roi()
+            self.win.draw_wp(self.win.activeWpUID)
+            statusText = "Intersection points limited to the wp border."
+            self.win.statusBar().showMessage(statusText)
+
+    #############################################
+    #
+    # 2d Profile constraint functions
+    #
+    #############################################
+
+    def showSolveStatus(self):
+        """Redraw active wp and show solver stats on status bar."""
+        self.win.draw_wp(self.win.activeWpUID)
+        stats = self.win.activeWp.sketch.solveStats
+        if stats:
+            statusText = (f"Solved {stats['vars']} variables, "
+                          f"{stats['constraints']} constraints "
+                          f"in {stats['time'] * 1000:.1f} ms")
+            self.win.statusBar().showMessage(statusText)
+
+    def notProfilePoint(self):
+        """Redraw active wp and tell user a picked point isn't a profile
+        point (so it wasn't constrained)."""
+        self.win.draw_wp(self.win.activeWpUID)
+        statusText = "Picked point isn't a profile point. Not constrained."
+        self.win.statusBar().showMessage(statusText)
+
+    def constrHV(self, horizontal):
+        if self.win.shapeStack:
+            wp = self.win.activeWp
+            while self.win.shapeStack:
+                wp.constrain_hv(self.win.shapeStack.pop(), horizontal)
+            self.showSolveStatus()
+        else:
+            if horizontal:
+                self.win.registerCallback(self.constrHC)
+            else:
+                self.win.registerCallback(self.constrVC)
+            self.display.SetSelectionModeEdge()
+            self.win.shapeStack = []
+            statusText = "Select profile line(s) to constrain."
+            self.win.statusBar().showMessage(statusText)
+
+    def constrH(self):
+        """Constrain profile line(s) horizontal"""
+        self.constrHV(horizontal=True)
+
+    def constrHC(self, shapeList, *args):
+        """Callback (collector) for constrH"""
+        self.add_edges_to_shapeStack(shapeList)
+        if self.win.shapeStack:
+            self.constrH()
+
+    def constrV(self):
+        """Constrain profile line(s) vertical"""
+        self.constrHV(horizontal=False)
+
+    def constrVC(self, shapeList, *args):
+        """Callback (collector) for constrV"""
+        self.add_edges_to_shapeStack(shapeList)
+        if self.win.shapeStack:
+            self.constrV()
+
+    def constrSize(self):
+        """Constrain (or change) length of line or radius of circle / arc"""
+        if self.win.shapeStack and self.win.floatStack:
+            wp = self.win.activeWp
+            value = self.win.floatStack.pop() * self.win.unitscale
+            edge = self.win.shapeStack.pop()
+            self.win.shapeStack = []
+            if wp.constrain_size(edge, value) is None:
+                print("Selected element can't be constrained.")
+            self.showSolveStatus()
+        else:
+            self.win.registerCallback(self.constrSizeC)
+            self.display.SetSelectionModeEdge()
+            self.win.shapeStack = []
+            self.win.floatStack = []
+            self.win.lineEditStack = []
+            self.win.lineEdit.setFocus()
+            statusText = "Select line (or circle / arc) then enter length (or radius)."
+            self.win.statusBar().showMessage(statusText)
+
+    def constrSizeC(self, shapeList, *args):
+        """Callback (collector) for constrSize"""
+        self.add_edges_to_shapeStack(shapeList)
+        self.win.lineEdit.setFocus()
+        if self.win.lineEditStack:
+            self.processLineEdit()
+        if self.win.shapeStack and self.win.floatStack:
+            self.constrSize()
+
+    def constrAngle(self):
+        """Constrain (or change) angle between two profile lines"""
+        if len(self.win.shapeStack) >= 2 and self.win.floatStack:
+            wp = self.win.activeWp
+            angle = self.win.floatStack.pop()
+            edge2 = self.win.shapeStack.pop()
+            edge1 = self.win.shapeStack.pop()
+            self.win.shapeStack = []
+            wp.constrain_angle(edge1, edge2, angle)
+            self.showSolveStatus()
+        else:
+            self.win.registerCallback(self.constrAngleC)
+            self.display.SetSelectionModeEdge()
+            self.win.shapeStack = []
+            self.win.floatStack = []
+            self.win.lineEditStack = []
+            self.win.lineEdit.setFocus()
+            statusText = "Select 2 lines then enter angle (deg CCW) from 1st to 2nd."
+            self.win.statusBar().showMessage(statusText)
+
+    def constrAngleC(self, shapeList, *args):
+        """Callback (collector) for constrAngle"""
+        self.add_edges_to_shapeStack(shapeList)
+        self.win.lineEdit.setFocus()
+        if self.win.lineEditStack:
+            self.processLineEdit()
+        if len(self.win.shapeStack) >= 2 and self.win.floatStack:
+            self.constrAngle()
+
+    def constrTangent(self):
+        """Constrain profile line tangent to profile circle or arc"""
+        if len(self.win.shapeStack) >= 2:
+            wp = self.win.activeWp
+            edge2 = self.win.shapeStack.pop()
+            edge1 = self.win.shapeStack.pop()
+            self.win.shapeStack = []
+            wp.constrain_tangent(edge1, edge2)
+            self.showSolveStatus()
+        else:
+            self.win.registerCallback(self.constrTangentC)
+            self.display.SetSelectionModeEdge()
+            self.win.shapeStack = []
+            statusText = "Select a line and a circle (or arc)."
+            self.win.statusBar().showMessage(statusText)
+
+    def constrTangentC(self, shapeList, *args):
+        """Callback (collector) for constrTangent"""
+        self.add_edges_to_shapeStack(shapeList)
+        if len(self.win.shapeStack) >= 2:
+            self.constrTangent()
+
+    def constrCoinc(self):
+        """Constrain two profile points to be coincident"""
+        if len(self.win.xyPtStack) == 2:
+            wp = self.win.activeWp
+            p2 = self.win.xyPtStack.pop()
+            p1 = self.win.xyPtStack.pop()
+            if wp.constrain_points(p1, p2) is False:
+                self.notProfilePoint()
+            else:
+                self.showSolveStatus()
+        else:
+            self.win.registerCallback(self.constrCoincC)
+            self.display.SetSelectionModeVertex()
+            self.win.xyPtStack = []
+            statusText = "Select 2 profile points to make coincident."
+            self.win.statusBar().showMessage(statusText)
+
+    def constrCoincC(self, shapeList, *args):
+        """Callback (collector) for constrCoinc"""
+        self.add_vertex_to_xyPtStack(shapeList, *args)
+        if len(self.win.xyPtStack) == 2:
+            self.constrCoinc()
+
+    def constrDist(self):
+        """Constrain distance between two profile points"""
+        if len(self.win.xyPtStack) == 2 and self.win.floatStack:
+            wp = self.win.activeWp
+            dist = self.win.floatStack.pop() * self.win.unitscale
+            p2 = self.win.xyPtStack.pop()
+            p1 = self.win.xyPtStack.pop()
+            if wp.constrain_points(p1, p2, dist) is False:
+                self.notProfilePoint()
+            else:
+                self.showSolveStatus()
+        else:
+            self.win.registerCallback(self.constrDistC)
+            self.display.SetSelectionModeVertex()
+            self.win.xyPtStack = []
+            self.win.floatStack = []
+            self.win.lineEditStack = []
+            self.win.lineEdit.setFocus()
+            statusText = "Select 2 profile points then enter distance."
+            self.win.statusBar().showMessage(statusText)
+
+    def constrDistC(self, shapeList, *args):
+        """Callback (collector) for constrDist"""
+        if len(self.win.xyPtStack) < 2:
+            self.add_vertex_to_xyPtStack(shapeList, *args)
+        self.win.lineEdit.setFocus()
+        if self.win.lineEditStack:
+            self.processLineEdit()
+        if len(self.win.xyPtStack) == 2 and self.win.floatStack:
+            self.constrDist()
+
+    def constrFix(self):
+        """Fix profile point(s) at current location"""
+        if self.win.xyPtStack:
+            wp = self.win.activeWp
+            fixed = [wp.fix_point(pnt) for pnt in self.win.xyPtStack]
+            self.win.xyPtStack = []
+            if False in fixed:
+                self.notProfilePoint()
+            else:
+                self.showSolveStatus()
+        else:
+            self.win.registerCallback(self.constrFixC)
+            self.display.SetSelectionModeVertex()
+            statusText = "Select profile point(s) to fix in place."
+            self.win.statusBar().showMessage(statusText)
+
+    def constrFixC(self, shapeList, *args):
+        """Callback (collector) for constrFix"""
+        self.add_vertex_to_xyPtStack(shapeList, *args)
+        if self.win.xyPtStack:
+            self.constrFix()
+
     #############################################
     #
     # 2D Delete functions
@@ -474,9 +1068,8 @@ class M2D:
         if self.win.shapeStack:
             while self.win.shapeStack:
                 shape = self.win.shapeStack.pop()
-                if shape in wp.edgeList:
-                    wp.edgeList.remove(shape)
-            self.win.redraw()
+                wp.remove_edge(shape)
+            self.win.refresh_wp_edges(self.win.activeWpUID)
         else:
             self.win.registerCallback(self.delElC)
             self.display.SetSelectionModeEdge()
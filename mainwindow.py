@@ -23,26 +23,31 @@
 
 from collections import defaultdict
 import logging
-from PyQt5.QtCore import Qt, QPersistentModelIndex, QModelIndex
+from PyQt5.QtCore import (
+    Qt,
+    QAbstractItemModel,
+    QMimeData,
+    QModelIndex,
+    QPersistentModelIndex,
+    QTimer,
+    pyqtSignal,
+)
 from PyQt5.QtGui import QBrush, QColor
 from PyQt5.QtWidgets import (
     QLabel,
     QLineEdit,
     QMainWindow,
-    QTreeWidget,
+    QTreeView,
     QMenu,
     QDockWidget,
     QDesktopWidget,
     QToolButton,
-    QTreeWidgetItem,
     QAction,
     QFrame,
     QToolBar,
-    QAbstractItemView,
     QInputDialog,
-    QTreeWidgetItemIterator,
 )
-from OCC.Core.AIS import AIS_Shape, AIS_Line, AIS_Circle
+from OCC.Core.AIS import AIS_Shape
 from OCC.Core.BRep import BRep_Tool
 from OCC.Core.BRepAdaptor import BRepAdaptor_Curve
 from OCC.Core.CPnts import CPnts_AbscissaPoint_Length
@@ -54,6 +59,7 @@ from OCC.Core.Quantity import (
     Quantity_NOC_DARKGREEN,
     Quantity_NOC_MAGENTA1,
 )
+from OCC.Core.TopExp import TopExp_Explorer
 from OCC.Core.TopoDS import topods_Edge, topods_Vertex
 import OCC.Display.OCCViewer
 import OCC.Display.backend
@@ -66,6 +72,7 @@ from OCC import VERSION
 from OCC.Display import qtDisplay  # For pythonocc-7.5
 import rpnCalculator
 from docmodel import DocModel
+from optimer import format_record, op_timer
 from version import APP_VERSION
 
 print("OCC version: %s" % VERSION)
@@ -75,8 +82,457 @@ logger.setLevel(logging.ERROR)  # set to DEBUG | INFO | ERROR
 
 dm = DocModel()
 
+# Max number of hidden parts whose presentations are kept (for fast show)
+HIDDEN_AIS_MAX = 20
+
+
+# Items of the tree view at depth < TREE_EXPAND_DEPTH start out expanded
+# ('/' is at depth 0, '3D' at 1 and top level components at 2)
+TREE_EXPAND_DEPTH = 4
+
+# Max number of child items added to the tree view model at a time
+TREE_FETCH_BATCH = 500
+
+
+class VisibilityState:
+    """Set of uids of hidden (unchecked) parts & workplanes
+
+    Changes are also logged in self.changes {uid: hidden} until they are
+    taken (by whoever brings the display up to date), so the display only
+    needs to deal with the uids that have changed. A change that is undone
+    before being taken is dropped from the log."""
+
+    def __init__(self):
+        self.hidden = set()
+        self.changes = {}  # {uid: hidden} changes not yet taken
+
+    def __contains__(self, uid):
+        return uid in self.hidden
+
+    def __iter__(self):
+        return iter(self.hidden)
+
+    def __len__(self):
+        return len(self.hidden)
+
+    def set_hidden(self, uids, hidden=True):
+        """Hide (or show) uids."""
+        for uid in uids:
+            if (uid in self.hidden) == hidden:
+                continue
+            if hidden:
+                self.hidden.add(uid)
+            else:
+                self.hidden.discard(uid)
+            if self.changes.pop(uid, hidden) == hidden:
+                self.changes[uid] = hidden
+
+    def take_changes(self):
+        """Return (and clear) the log of changes {uid: hidden}."""
+        changes, self.changes = self.changes, {}
+        return changes
+
+
+class TreeNode:
+    """Node of TreeModel, for one tree view item (uid)."""
+
+    __slots__ = ("uid", "parent", "row", "children", "pending", "fetched")
+
+    def __init__(self, uid, parent, row, pending):
+        self.uid = uid
+        self.parent = parent  # parent TreeNode
+        self.row = row  # index in parent.children
+        self.children = []  # child nodes (fetched)
+        self.pending = pending  # uids of children not yet fetched
+        self.fetched = False  # True once fetchMore has been called
+
+
+class TreeModel(QAbstractItemModel):
+    """Part/Assy & workplane structure, for display by TreeView
+
+    The model reads the structure directly from (dm) label_dict and the
+    list of workplane uids. Only the items the view has asked for exist
+    in the model: the child items of an item are added (TREE_FETCH_BATCH
+    at a time) when it is expanded, through canFetchMore & fetchMore.
+
+    Check states are held in self.unchecked (part & wp uids). The check
+    state of an assy item is derived from the number of parts below it and
+    the number of them that are unchecked. Check state changes of part & wp
+    items are signalled by checksChanged(uids, unchecked)."""
+
+    checksChanged = pyqtSignal(list, bool)
+
+    ROOT_UID = "0"
+    WP_ROOT_UID = "wp0"
+    ASSY_ROOT_UID = "0:1:1.0"
+    ROOT_NAMES = {ROOT_UID: "/", WP_ROOT_UID: "WP", ASSY_ROOT_UID: "3D"}
+    ACTIVE_COLORS = {"part": "gold", "wp": "lightgreen", "assy": "lightblue"}
+    MIME_TYPE = "application/x-kodacad-uids"
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.label_dict = {}
+        self.part_dict = {}
+        self.wp_uids = set()
+        self.child_uid_dict = {}  # {uid: [child uids]}
+        self.unchecked = set()  # uids of unchecked part & wp items
+        self.part_count = {}  # {assy uid: number of parts below}
+        self.unchecked_count = {}  # {assy uid: number unchecked below}
+        self.active_dict = {}  # {item type: uid of active item}
+        self.root = TreeNode(None, None, 0, [])  # (invisible) root node
+        self.root.fetched = True
+        self.node_dict = {}  # {uid: TreeNode} of items in model
+        self.set_structure({}, {}, [])
+
+    # Structure
+
+    def set_structure(self, label_dict, part_dict, wp_uids):
+        """Update the model to label_dict, part_dict & wp_uids.
+
+        Only the items that have been added, removed, renamed or moved to
+        another parent are changed. The others keep their expansion state."""
+        self.label_dict = label_dict
+        self.part_dict = part_dict
+        child_uid_dict = defaultdict(list)
+        child_uid_dict[None] = [self.ROOT_UID]
+        child_uid_dict[self.ROOT_UID] = [self.WP_ROOT_UID, self.ASSY_ROOT_UID]
+        for uid, dic in label_dict.items():
+            parent_uid = dic["parent_uid"]
+            if parent_uid not in label_dict:
+                parent_uid = self.ASSY_ROOT_UID
+            child_uid_dict[parent_uid].append(uid)
+        self.child_uid_dict = dict(child_uid_dict)
+        self.count_parts()
+        self.set_wp_uids(wp_uids)
+        self.sync_node(self.root)
+
+    def set_wp_uids(self, wp_uids):
+        """Update the workplane items to wp_uids."""
+        self.wp_uids = set(wp_uids)
+        self.child_uid_dict[self.WP_ROOT_UID] = list(wp_uids)
+        node = self.node_dict.get(self.WP_ROOT_UID)
+        if node:
+            self.sync_node(node)
+
+    def sync_node(self, node):
+        """Bring the child items of node (recursively) up to date."""
+        uids = self.child_uid_dict.get(node.uid, [])
+        uid_set = set(uids)
+        parent = self.node_index(node)
+        # remove items that are gone (or have moved to another parent)
+        row = len(node.children)
+        while row:
+            if node.children[row - 1].uid in uid_set:
+                row -= 1
+                continue
+            last = row - 1
+            while row and node.children[row - 1].uid not in uid_set:
+                row -= 1
+            self.beginRemoveRows(parent, row, last)
+            for child in node.children[row:last + 1]:
+                self.forget_node(child)
+            del node.children[row:last + 1]
+            self.endRemoveRows()
+        self.renumber(node)
+        fetched = {child.uid for child in node.children}
+        node.pending = [uid for uid in uids if uid not in fetched]
+        if node.children:
+            # names or check states may have changed
+            self.dataChanged.emit(self.index(0, 0, parent),
+                                  self.index(len(node.children) - 1, 0,
+                                             parent))
+        for child in node.children:
+            self.sync_node(child)
+        if node.fetched and node.pending:
+            self.fetchMore(parent)
+
+    def forget_node(self, node):
+        """Drop node and the nodes below it from self.node_dict."""
+        if self.node_dict.get(node.uid) is node:
+            del self.node_dict[node.uid]
+        for child in node.children:
+            self.forget_node(child)
+
+    def renumber(self, node):
+        """Renumber rows of the children of node."""
+        for row, child in enumerate(node.children):
+            child.row = row
+
+    def count_parts(self):
+        """Count the parts (& unchecked parts) below each assy item."""
+        self.part_count = defaultdict(int)
+        self.unchecked_count = defaultdict(int)
+        for uid in self.label_dict:
+            if uid in self.part_dict:
+                unchecked = uid in self.unchecked
+                for assy_uid in self.ancestors(uid):
+                    self.part_count[assy_uid] += 1
+                    if unchecked:
+                        self.unchecked_count[assy_uid] += 1
+
+    def ancestors(self, uid):
+        """Generate uids of the label items above label uid."""
+        uid = self.label_dict[uid]["parent_uid"]
+        while uid in self.label_dict:
+            yield uid
+            uid = self.label_dict[uid]["parent_uid"]
+
+    def parts_below(self, uid):
+        """Return list of uids of the parts below item uid."""
+        uids = []
+        stack = list(self.child_uid_dict.get(uid, []))
+        while stack:
+            uid = stack.pop()
+            if uid in self.part_dict:
+                uids.append(uid)
+            stack.extend(self.child_uid_dict.get(uid, []))
+        return uids
+
+    def nodes(self):
+        """Generate all nodes in model (depth first)."""
+        stack = list(reversed(self.root.children))
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    # Items
+
+    def node(self, index):
+        """Return node of index."""
+        if index.isValid():
+            return index.internalPointer()
+        return self.root
+
+    def node_index(self, node):
+        """Return index of node."""
+        if node is self.root:
+            return QModelIndex()
+        return self.createIndex(node.row, 0, node)
+
+    def index_of(self, uid):
+        """Return index of item uid (None if not in model)."""
+        node = self.node_dict.get(uid)
+        if node:
+            return self.node_index(node)
+        return None
+
+    def uid(self, index):
+        """Return uid of item at index."""
+        return self.node(index).uid
+
+    def name(self, uid):
+        """Return name of item uid."""
+        if uid in self.ROOT_NAMES:
+            return self.ROOT_NAMES[uid]
+        if uid in self.label_dict:
+            return self.label_dict[uid]["name"]
+        return uid
+
+    def depth(self, index):
+        """Return depth of item at index ('/' is at depth 0)."""
+        depth = -1
+        node = self.node(index)
+        while node is not self.root:
+            depth += 1
+            node = node.parent
+        return depth
+
+    def item_type(self, uid):
+        """Return type ('part', 'assy' or 'wp') of item uid, or None if
+        there is no such item (or it is a root item)."""
+        if uid in self.label_dict:
+            if uid in self.part_dict:
+                return "part"
+            if self.label_dict[uid]["is_assy"]:
+                return "assy"
+        elif uid in self.wp_uids:
+            return "wp"
+        return None
+
+    def check_state(self, uid):
+        """Return check state of item uid (None if it has none)."""
+        itype = self.item_type(uid)
+        if itype == "assy":
+            nmbr = self.unchecked_count.get(uid, 0)
+            if not nmbr:
+                return Qt.Checked
+            if nmbr == self.part_count[uid]:
+                return Qt.Unchecked
+            return Qt.PartiallyChecked
+        if itype:
+            if uid in self.unchecked:
+                return Qt.Unchecked
+            return Qt.Checked
+        return None
+
+    def set_unchecked(self, uids, unchecked=True):
+        """Uncheck (or check) part & wp items uids."""
+        changed = set()
+        changed_uids = []
+        for uid in uids:
+            if (uid in self.unchecked) == unchecked:
+                continue
+            if unchecked:
+                self.unchecked.add(uid)
+            else:
+                self.unchecked.discard(uid)
+            changed.add(uid)
+            changed_uids.append(uid)
+            if uid in self.label_dict:
+                for assy_uid in self.ancestors(uid):
+                    if uid in self.part_dict:
+                        self.unchecked_count[assy_uid] += 1 if unchecked else -1
+                    changed.add(assy_uid)
+        for uid in changed:
+            index = self.index_of(uid)
+            if index:
+                self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        if changed_uids:
+            self.checksChanged.emit(changed_uids, unchecked)
+
+    def set_active(self, uid):
+        """Show item uid as the active one of its type."""
+        itype = self.item_type(uid)
+        if itype:
+            prev_uid = self.active_dict.get(itype)
+            self.active_dict[itype] = uid
+            for uid in (prev_uid, uid):
+                index = self.index_of(uid)
+                if index:
+                    self.dataChanged.emit(index, index, [Qt.BackgroundRole])
+
+    # QAbstractItemModel methods
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        return self.createIndex(row, column, self.node(parent).children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        return self.node_index(index.internalPointer().parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self.node(parent).children)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self.node(parent)
+        return bool(node.children or node.pending)
+
+    def canFetchMore(self, parent):
+        return bool(self.node(parent).pending)
+
+    def fetchMore(self, parent):
+        node = self.node(parent)
+        node.fetched = True
+        uids = node.pending[:TREE_FETCH_BATCH]
+        if uids:
+            first = len(node.children)
+            self.beginInsertRows(parent, first, first + len(uids) - 1)
+            del node.pending[:len(uids)]
+            for row, uid in enumerate(uids, first):
+                pending = list(self.child_uid_dict.get(uid, []))
+                child = TreeNode(uid, node, row, pending)
+                node.children.append(child)
+                self.node_dict[uid] = child
+            self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        uid = index.internalPointer().uid
+        if role == Qt.DisplayRole:
+            return self.name(uid)
+        if role == Qt.CheckStateRole:
+            return self.check_state(uid)
+        if role == Qt.BackgroundRole:
+            itype = self.item_type(uid)
+            if itype and self.active_dict.get(itype) == uid:
+                return QBrush(QColor(self.ACTIVE_COLORS[itype]))
+        if role == Qt.UserRole:
+            return uid
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or not index.isValid():
+            return False
+        uid = index.internalPointer().uid
+        itype = self.item_type(uid)
+        if not itype:
+            return False
+        unchecked = (value == Qt.Unchecked)
+        if itype == "assy":
+            self.set_unchecked(self.parts_below(uid), unchecked)
+        else:
+            self.set_unchecked([uid], unchecked)
+        return True
+
+    def flags(self, index):
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsDropEnabled
+        if index.isValid():
+            uid = index.internalPointer().uid
+            if uid not in self.ROOT_NAMES:
+                flags |= Qt.ItemIsDragEnabled
+            if self.item_type(uid):
+                flags |= Qt.ItemIsUserCheckable
+        return flags
+
+    # Drag & drop (moves items in tree view only, not in the doc)
+
+    def supportedDropActions(self):
+        return Qt.MoveAction
+
+    def mimeTypes(self):
+        return [self.MIME_TYPE]
+
+    def mimeData(self, indexes):
+        uids = [self.uid(index) for index in indexes if index.isValid()]
+        data = QMimeData()
+        data.setData(self.MIME_TYPE, "\n".join(uids).encode())
+        return data
+
+    def dropMimeData(self, data, action, row, column, parent):
+        if action != Qt.MoveAction or not data.hasFormat(self.MIME_TYPE):
+            return False
+        dest = self.node(parent)
+        if row < 0:
+            row = len(dest.children)
+        for uid in bytes(data.data(self.MIME_TYPE)).decode().split("\n"):
+            node = self.node_dict.get(uid)
+            if node is None or self.is_below(dest, node):
+                continue
+            source = node.parent
+            if not self.beginMoveRows(self.node_index(source), node.row,
+                                      node.row, parent, row):
+                continue
+            del source.children[node.row]
+            if source is dest and node.row < row:
+                row -= 1
+            dest.children.insert(row, node)
+            node.parent = dest
+            self.renumber(source)
+            self.renumber(dest)
+            self.endMoveRows()
+            row += 1
+        return True
+
+    def is_below(self, node, other):
+        """Return True if node is other or is below it."""
+        while node is not None:
+            if node is other:
+                return True
+            node = node.parent
+        return False
+
 
-class TreeView(QTreeWidget):
+class TreeView(QTreeView):
     """Part & Assembly structure display
 
     The Part/Assy treeView display is kept in sync with the XCAF data model
@@ -86,10 +542,13 @@ class TreeView(QTreeWidget):
     allowing some modifications to be made to the model. Although the treeView
     display currently permits the user to make 'drag & drop' modifications,
     those changes are currently not propagated to the data model.
+
+    The items are those of a TreeModel. New items at depth < self.expandDepth
+    are expanded, so deeper sub-assemblies start out collapsed.
     """
 
     def __init__(self, parent=None):
-        QTreeWidget.__init__(self, parent)
+        QTreeView.__init__(self, parent)
         self.header().setHidden(True)
         self.setSelectionMode(self.ExtendedSelection)
         self.setDragDropMode(self.InternalMove)
@@ -98,75 +557,51 @@ class TreeView(QTreeWidget):
         self.setContextMenuPolicy(Qt.CustomContextMenu)
         self.customContextMenuRequested.connect(self.contextMenu)
         self.popMenu = QMenu(self)
+        self.expandDepth = TREE_EXPAND_DEPTH
+        self._toExpand = []  # new items to be expanded
 
     def contextMenu(self, point):
         self.menu = QMenu()
         self.popMenu.exec_(self.mapToGlobal(point))
 
-    def dropEvent(self, event):
-        if event.source() == self:
-            QAbstractItemView.dropEvent(self, event)
-
-    def dropMimeData(self, parent, row, data, action):
-        if action == Qt.MoveAction:
-            return self.moveSelection(parent, row)
-        return False
-
-    def moveSelection(self, parent, position):
-        # save the selected items
-        selection = [QPersistentModelIndex(i) for i in self.selectedIndexes()]
-        parent_index = self.indexFromItem(parent)
-        if parent_index in selection:
-            return False
-        # save the drop location in case it gets moved
-        target = self.model().index(position, 0, parent_index).row()
-        if target < 0:
-            target = position
-        # remove the selected items
-        taken = []
-        for index in reversed(selection):
-            item = self.itemFromIndex(QModelIndex(index))
-            if item is None or item.parent() is None:
-                taken.append(self.takeTopLevelItem(index.row()))
-            else:
-                taken.append(item.parent().takeChild(index.row()))
-        # insert the selected items at their new positions
-        while taken:
-            if position == -1:
-                # append the items if position not specified
-                if parent_index.isValid():
-                    parent.insertChild(parent.childCount(), taken.pop(0))
-                else:
-                    self.insertTopLevelItem(
-                        self.topLevelItemCount(), taken.pop(0))
-            else:
-                # insert the items at the specified position
-                if parent_index.isValid():
-                    parent.insertChild(
-                        min(target, parent.childCount()), taken.pop(0))
-                else:
-                    self.insertTopLevelItem(
-                        min(target, self.topLevelItemCount()), taken.pop(0)
-                    )
-        return True
+    def setModel(self, model):
+        QTreeView.setModel(self, model)
+        model.rowsInserted.connect(self.expandNewRows)
+        if model.rowCount():
+            self.expandNewRows(QModelIndex(), 0, model.rowCount() - 1)
+
+    def expandNewRows(self, parent, first, last):
+        """Expand new items at depth < self.expandDepth (once the model is
+        done inserting them)."""
+        model = self.model()
+        if model.depth(parent) + 1 < self.expandDepth:
+            for row in range(first, last + 1):
+                index = model.index(row, 0, parent)
+                if model.hasChildren(index):
+                    self._toExpand.append(QPersistentModelIndex(index))
+            QTimer.singleShot(0, self.expandPending)
+
+    def expandPending(self):
+        toExpand, self._toExpand = self._toExpand, []
+        for index in toExpand:
+            if index.isValid():
+                self.expand(QModelIndex(index))
 
 
 class MainWindow(QMainWindow):
     """Main GUI window containing an assy tree view and a 3D display view
 
     The User controls whether parts displayed in the 3D display view are drawn
-    or hidden through the use of check boxes on the tree view display. The list
-    of the uid's of all the items currently hidden is held in self.hide_list.
-    When tree view items are checked or unchecked, a list of unchecked items is
-    compared to self.hide_list. That comparison results in two new lists:
-    a list of items to be erased and a list of items to be drawn. The items to
-    be erased are erased and the items to be drawn are drawn, and the hide_list
-    is then updated.
+    or hidden through the use of check boxes on the tree view display. The
+    uid's of all the items currently hidden are held in self.hidden (a
+    VisibilityState). When tree view items are checked or unchecked, the tree
+    view model signals which ones, self.hidden is updated and logs them as
+    changed. The display is then updated for just the uid's changed: the items
+    hidden are erased and the items shown are drawn.
 
     When a part is newly created or loaded (step), the doc model (dm) is changed and
-    this results in the regeneration of the tree view. As the new tree view
-    items are generated, they are shown checked except for the ones that are
-    contained in the hide_list. """
+    this results in an update of the tree view. New tree view items are shown
+    checked except for the ones that are contained in self.hidden. """
 
     def __init__(self, *args):
         super().__init__()
@@ -195,8 +630,7 @@ class MainWindow(QMainWindow):
 
         self.calculator = None
 
-        self.assy_root, self.wp_root = self.create_root_items()
-        self.itemClicked = None  # TreeView item that has been mouse clicked
+        self.uidClicked = None  # uid of treeView item mouse clicked
 
         # Internally, everything is always in mm
         # scale user input and output values
@@ -208,12 +642,17 @@ class MainWindow(QMainWindow):
         self.unitsLabel = QLabel()
         self.unitsLabel.setText("Units: %s " % self.units)
         self.unitsLabel.setFrameStyle(QFrame.StyledPanel | QFrame.Sunken)
+        # Timing (in ms) of phases of last operation
+        self.timingLabel = QLabel()
+        self.timingLabel.setFrameStyle(QFrame.StyledPanel | QFrame.Sunken)
+        op_timer.listeners.append(self.showOpTiming)
 
         self.endOpButton = QToolButton()
         self.endOpButton.setText("End Operation")
         self.endOpButton.clicked.connect(self.clearCallback)
         self.currOpLabel = QLabel()
         self.registeredCallback = None
+        self.timedCallback = None  # registeredCallback timed as operation
         self.currOpLabel.setText("Current Operation: %s " %
                                  self.registeredCallback)
 
@@ -225,16 +664,19 @@ class MainWindow(QMainWindow):
         status.addPermanentWidget(self.lineEdit)
         status.addPermanentWidget(self.currOpLabel)
         status.addPermanentWidget(self.endOpButton)
+        status.addPermanentWidget(self.timingLabel)
         status.addPermanentWidget(self.unitsLabel)
         status.showMessage("Ready", 5000)
 
-        self.hide_list = []  # list of part uid's to be hidden (not displayed)
+        self.hidden = VisibilityState()  # uid's hidden (not displayed)
         self.floatStack = []  # storage stack for floating point values
         self.xyPtStack = []  # storage stack for 2d points (x, y)
         self.ptStack = []  # storage stack for gp_Pnts
         self.edgeStack = []  # storage stack for edge picks
         self.faceStack = []  # storage stack for face picks
         self.shapeStack = []  # storage stack for shape picks
+        self.clineStack = []  # storage stack for cline picks
+        self.ccircStack = []  # storage stack for ccirc picks
         self.lineEditStack = []  # list of user inputs
 
         self.activePart = None  # <TopoDS_Shape> object
@@ -243,10 +685,14 @@ class MainWindow(QMainWindow):
         # {uid: [list of ancestor shapes]}
         self.ancestor_dict = defaultdict(list)
         self.ais_shape_dict = {}  # {uid: <AIS_Shape> object}
+        self.ais_style_dict = {}  # {uid: (rgb, transparency) displayed}
+        self.hidden_ais_dict = {}  # {uid: None} erased parts, oldest first
 
         self.activeWp = None  # WorkPlane object
         self.activeWpUID = 0
         self.wp_dict = {}  # k = uid, v = wpObject
+        self.wp_ais_dict = {}  # {uid: [AIS objects of displayed wp]}
+        self.wp_drawn_dict = {}  # {uid: (wp, wp.displayKey()) when drawn}
         self._wpNmbr = 1
 
         self.activeAsyUID = 0
@@ -265,8 +711,11 @@ class MainWindow(QMainWindow):
         self.treeDockWidget.setAllowedAreas(
             Qt.LeftDockWidgetArea | Qt.RightDockWidgetArea
         )
+        self.treeModel = TreeModel(self)  # Assy/Part structure
         self.treeView = TreeView()  # Assy/Part structure (display)
-        self.treeView.itemClicked.connect(self.treeViewItemClicked)
+        self.treeView.setModel(self.treeModel)
+        self.treeView.clicked.connect(self.treeViewItemClicked)
+        self.treeModel.checksChanged.connect(self.treeViewItemsChecked)
         self.treeDockWidget.setWidget(self.treeView)
         self.addDockWidget(Qt.LeftDockWidgetArea, self.treeDockWidget)
 
@@ -294,11 +743,16 @@ class MainWindow(QMainWindow):
             # if not, the "exit" action is now shown...
             # Qt is trying so hard to be native cocoa'ish that its a nuisance
             _action.setMenuRole(QAction.NoRole)
-            _action.triggered.connect(_callable)
+            timed = op_timer.timed_op(text, _callable)
+            _action.triggered.connect(lambda checked=False: timed())
             self._menus[menu_name].addAction(_action)
         except KeyError:
             raise ValueError("the menu item %s does not exist" % (menu_name))
 
+    def showOpTiming(self, record):
+        """Show timing of last operation (record) in status bar."""
+        self.timingLabel.setText(format_record(record, sep=" | "))
+
     def closeEvent(self, event):  # things that need to happen on exit
         try:
             self.calculator.close()
@@ -308,182 +762,103 @@ class MainWindow(QMainWindow):
 
     #############################################
     #
-    # treeView (QTreeWidget) building methods:
+    # treeView (TreeModel) building methods:
     #
     #############################################
 
+    @op_timer.timed("tree")
     def build_tree(self):
-        """Build new tree view from dm.label_dict.
+        """Bring tree view up to date with dm.label_dict (and self.wp_dict).
 
         This method is called whenever dm.doc is modified in a way that would
         result in a change in the tree view. The tree view represents the
-        hierarchical structure of the top assembly and its components."""
-        self.clearTree()
-        self.assy_list = []
-        parent_item_dict = {}  # {uid: tree view item}
-        for uid, dic in dm.label_dict.items():
-            # dic: {keys: 'entry', 'name', 'parent_uid', 'ref_entry'}
-            entry = dic["entry"]
-            name = dic["name"]
-            parent_uid = dic["parent_uid"]
-            if parent_uid not in parent_item_dict:
-                parent_item = self.assy_root
-            else:
-                parent_item = parent_item_dict[parent_uid]
-
-            # create node in tree view
-            item_name = [name, uid]
-            item = QTreeWidgetItem(parent_item, item_name)
-            item.setFlags(item.flags() | Qt.ItemIsTristate |
-                          Qt.ItemIsUserCheckable)
-            if uid in self.hide_list:
-                item.setCheckState(0, Qt.Unchecked)
-            else:
-                item.setCheckState(0, Qt.Checked)
-            self.treeView.expandItem(item)
-            parent_item_dict[uid] = item
-            # build assy_list
-            if dic["is_assy"]:
-                self.assy_list.append(uid)
+        hierarchical structure of the top assembly and its components.
+        The tree view model reads label_dict directly and only the items of
+        labels that have been added, removed, renamed or moved to another
+        parent are changed (see TreeModel.set_structure). The other items
+        keep their check state & expansion."""
+        self.treeModel.set_structure(dm.label_dict, dm.part_dict,
+                                     list(self.wp_dict))
+        self.assy_list = [uid for uid, dic in dm.label_dict.items()
+                          if dic["is_assy"]]
         self.sync_treeview_to_active()
         # self.syncCheckedToDrawList()
 
-    def clearTree(self):
-        """Remove all tree view widget items and replace root item"""
-        self.treeView.clear()
-        self.assy_root, self.wp_root = self.create_root_items()
-        self.repopulate_2D_tree_view()
-
-    def create_root_items(self):
-        """Create '2D' & '3D' root items in treeView."""
-        root_item = ["/", "0"]  # [name, uid]
-        tree_view_root = QTreeWidgetItem(self.treeView, root_item)
-        self.treeView.expandItem(tree_view_root)
-        wp_root = QTreeWidgetItem(tree_view_root, ["WP", "wp0"])
-        self.treeView.expandItem(wp_root)
-        ay_root = QTreeWidgetItem(tree_view_root, ["3D", "0:1:1.0"])
-        self.treeView.expandItem(ay_root)
-        return (ay_root, wp_root)
-
-    def repopulate_2D_tree_view(self):
-        """Add all workplanes to 2D section of tree view."""
-
-        # add items to treeView
-        for uid in self.wp_dict:
-            itemName = [uid, uid]
-            item = QTreeWidgetItem(self.wp_root, itemName)
-            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
-            item.setCheckState(0, Qt.Checked)
-
     #############################################
     #
     # treeView item action methods:
     #
     #############################################
 
-    def treeViewItemClicked(self, item):
+    def treeViewItemClicked(self, index):
         """Called when treeView item is clicked"""
 
-        self.itemClicked = item  # store item
-        if not self.inSync():  # click may have been on checkmark.
-            self.adjust_draw_hide()
+        self.uidClicked = self.treeModel.uid(index)  # store item uid
+
+    def treeViewItemsChecked(self, uids, unchecked):
+        """Called when treeView items (uids) are checked or unchecked"""
+
+        self.hidden.set_hidden(uids, unchecked)
+        if not self.inSync():
+            with op_timer.operation("Show/Hide"):
+                self.adjust_draw_hide()
 
     def inSync(self):
-        """Return True if unchecked items are in sync with hide_list."""
-        return set(self.uncheckedToList()) == set(self.hide_list)
-
-    def uncheckedToList(self):
-        """Return list of uid's of unchecked (part & wp) items in treeView."""
-        dl = []
-        for item in self.treeView.findItems("", Qt.MatchContains | Qt.MatchRecursive):
-            if item.checkState(0) == Qt.Unchecked:
-                uid = item.text(1)
-                if (uid in dm.part_dict) or (uid in self.wp_dict):
-                    dl.append(uid)
-        return dl
+        """Return True if the display is in sync with self.hidden."""
+        return not self.hidden.changes
 
+    @op_timer.timed("display")
     def adjust_draw_hide(self):
         """Erase from 3D display any item that gets unchecked, draw when checked.
 
-        An item is a treeView widget item. It may be a part, assy or workplane.
+        An item is a treeView item. It may be a part, assy or workplane.
         For our purpose here, we only care if it is a part or wp because those
-        are the only types that are displayed in the 3D view window. For parts,
-        the display is adjusted incrementally. A newly checked part is drawn and
-        a newly unchecked part is erased. However, because workplanes have a
-        great many ais_shapes, ais lines, ais_circles and topoDS_shapes (edges &
-        border) as well, it isn't practical to keep track of them all just so
-        they can be removed incrementally. Also, when a new workplane is created,
-        it is set active, so the old active workplane needs to be redrawn with a
-        duller border color. Therefore, if there is a change in the hide_list
-        involving a workplane, it is best to just clear the display and redraw
-        all the workplanes that are not in the hide_list.
+        are the only types that are displayed in the 3D view window. The
+        display is adjusted incrementally. Only the uid's logged as changed
+        in self.hidden are dealt with: a newly checked part or workplane is
+        drawn and a newly unchecked one is erased. The AIS objects of each
+        workplane are kept track of (see draw_wp), so hiding or showing one
+        doesn't touch anything else in the display.
         """
 
-        unchecked = self.uncheckedToList()
-        unchecked_set = set(unchecked)
-        hide_list = list(self.hide_list)
-        hide_set = set(hide_list)
-        newly_unchecked = unchecked_set - hide_set
-        newly_checked = hide_set - unchecked_set
-        for uid in newly_unchecked:
-            # If a workplane is newly unchecked, redraw is needed
+        for uid, hidden in self.hidden.take_changes().items():
             if uid in self.wp_dict:
-                self.hide_list.append(uid)
-                self.redraw()
-            # Otherwise, we can do an incremental change in the display
+                if hidden:
+                    self.hide_wp(uid)  # Erase the workplane
+                else:
+                    self.show_wp(uid)  # Draw the workplane
             elif uid in dm.part_dict:
-                self.erase_shape(uid)  # Erase the shape
-        for uid in newly_checked:
-            if uid in dm.part_dict:
-                self.draw_shape(uid)  # Draw the shape
-            elif uid in self.wp_dict:
-                self.draw_wp(uid)  # Draw the workplane
-        self.hide_list = unchecked
+                if hidden:
+                    self.erase_shape(uid, update=False)  # Erase the shape
+                else:
+                    self.draw_shape(uid, update=False)  # Draw the shape
+        self.canvas._display.Context.UpdateCurrentViewer()
 
     def syncUncheckedToHideList(self):
-        """Use this method after building a new treeView to make sure items
-        that were previously hidden are still unchecked in new treeView."""
-        for item in self.treeView.findItems("", Qt.MatchContains | Qt.MatchRecursive):
-            uid = item.text(1)
-            if (uid in dm.part_dict) or (uid in self.wp_dict):
-                if uid in self.hide_list:
-                    item.setCheckState(0, Qt.Unchecked)
-                else:
-                    item.setCheckState(0, Qt.Checked)
-
-    def sortViewItems(self):
-        """Return dicts of tree view items sorted by type: (prt, ay, wp)"""
-        # Traverse all treeView widget items
-        iterator = QTreeWidgetItemIterator(self.treeView)
-        pdict = {}  # part-types    {uid: item}
-        adict = {}  # asy-types     {uid: item}
-        wdict = {}  # wp-types      {uid: item}
-        while iterator.value():
-            item = iterator.value()
-            name = item.text(0)
-            uid = item.text(1)
-            if uid in dm.part_dict:
-                pdict[uid] = item
-            elif uid in self.assy_list:
-                adict[uid] = item
-            elif uid in self.wp_dict:
-                wdict[uid] = item
-            iterator += 1
-        return (pdict, adict, wdict)
+        """Make sure check states of all treeView items agree with
+        self.hidden. (Not needed after build_tree, which keeps the check
+        states.)"""
+        model = self.treeModel
+        model.set_unchecked(model.unchecked - self.hidden.hidden, False)
+        model.set_unchecked(self.hidden.hidden - model.unchecked, True)
+
+    def item_type(self, uid):
+        """Return type ('part', 'assy' or 'wp') of treeView item uid, or None
+        if there is no such item."""
+        return self.treeModel.item_type(uid)
 
     def showClickedInfo(self):
         """Show info for item clicked in treeView."""
-        item = self.itemClicked
-        if item:
-            self.showItemInfo(item)
+        uid = self.uidClicked
+        if uid:
+            self.showItemInfo(uid)
         else:
             print("No item selected. Try first left clicking item then right clicking.")
 
-    def showItemInfo(self, item):
-        """Show info for item clicked in treeView."""
-        if item:
-            name = item.text(0)
-            uid = item.text(1)
+    def showItemInfo(self, uid):
+        """Show info for treeView item uid."""
+        if uid:
+            name = self.treeModel.name(uid)
             if name in ["/", "WP", "3D"]:
                 print(f"Root ({name}) tree view item")
             elif uid.startswith("wp"):
@@ -503,29 +878,27 @@ class MainWindow(QMainWindow):
 
     def setClickedActive(self):
         """Set item clicked in treeView Active."""
-        item = self.itemClicked
-        if item:
-            self.setItemActive(item)
+        uid = self.uidClicked
+        if uid:
+            self.setItemActive(uid)
             self.treeView.clearSelection()
-            self.itemClicked = None
+            self.uidClicked = None
         else:
             print("No item selected. Try first left clicking item then right clicking.")
 
-    def setItemActive(self, item):
-        """Set (part, wp or assy) represented by treeView item to be active."""
-        if item:
-            name = item.text(0)
-            uid = item.text(1)
+    def setItemActive(self, uid):
+        """Set (part, wp or assy) of treeView item uid to be active."""
+        if uid:
+            name = self.treeModel.name(uid)
             print(f"Part selected: {name}, UID: {uid}")
-            pd, ad, wd = self.sortViewItems()
-            if uid in pd:
+            itype = self.item_type(uid)
+            if itype == "part":
                 self.setActivePart(uid)
                 sbText = f"{name} [uid={uid}] is now the active part"
-            elif uid in wd:
+            elif itype == "wp":
                 self.setActiveWp(uid)
                 sbText = f"{name} [uid={uid}] is now the active workplane"
-                self.redraw()  # update color of new active wp
-            elif uid in ad:
+            elif itype == "assy":
                 self.setActiveAsy(uid)
                 sbText = f"{name} [uid={uid}] is now the active assembly"
             else:
@@ -534,25 +907,7 @@ class MainWindow(QMainWindow):
 
     def showItemActive(self, uid):
         """Update tree view to show active status of (uid)."""
-        pd, ad, wd = self.sortViewItems()
-        if uid in pd:
-            # Clear BG color of all part items
-            for itm in pd.values():
-                itm.setBackground(0, QBrush(QColor(255, 255, 255, 0)))
-            # Set BG color of new active part
-            pd[uid].setBackground(0, QBrush(QColor("gold")))
-        elif uid in wd:
-            # Clear BG color of all wp items
-            for itm in wd.values():
-                itm.setBackground(0, QBrush(QColor(255, 255, 255, 0)))
-            # Set BG color of new active wp
-            wd[uid].setBackground(0, QBrush(QColor("lightgreen")))
-        elif uid in ad:
-            # Clear BG color of all asy items
-            for itm in ad.values():
-                itm.setBackground(0, QBrush(QColor(255, 255, 255, 0)))
-            # Set BG color of new active asy
-            ad[uid].setBackground(0, QBrush(QColor("lightblue")))
+        self.treeModel.set_active(uid)
 
     def sync_treeview_to_active(self):
         for uid in (self.activePartUID, self.activeAsyUID, self.activeWpUID):
@@ -561,14 +916,14 @@ class MainWindow(QMainWindow):
 
     def deleteItem(self):
         """Delete item clicked."""
-        item = self.itemClicked
-        if item:
-            name = item.text(0)
-            uid = item.text(1)
+        uid = self.uidClicked
+        if uid:
+            name = self.treeModel.name(uid)
             if uid in self.wp_dict:
                 del self.wp_dict[uid]
                 self.build_tree()
-                self.redraw()
+                self.erase_wp(uid)
+                self.canvas._display.Repaint()
                 print(f"Workplane {name} deleted.")
                 if uid == self.activeWpUID:
                     self.activeWp = None
@@ -578,46 +933,69 @@ class MainWindow(QMainWindow):
         else:
             print("No item selected. Try first left clicking item then right clicking.")
 
+    def part_uid_of_shape(self, shape):
+        """Return uid of displayed part containing (picked) sub-shape, such
+        as a face, else None. The active part is searched first."""
+        uids = [uid for uid in self.ais_shape_dict
+                if uid not in self.hidden_ais_dict]
+        if self.activePartUID in uids:
+            uids.remove(self.activePartUID)
+            uids.insert(0, self.activePartUID)
+        for uid in uids:
+            if uid not in dm.part_dict:
+                continue
+            exp = TopExp_Explorer(dm.part_dict[uid]["shape"], shape.ShapeType())
+            while exp.More():
+                if exp.Current().IsSame(shape):
+                    return uid
+                exp.Next()
+        return None
+
+    def selectedUIDs(self):
+        """Return list of uids of treeView items selected (including item
+        clicked)."""
+        indexes = self.treeView.selectionModel().selectedRows()
+        uids = [self.treeModel.uid(index) for index in indexes]
+        if self.uidClicked and self.uidClicked not in uids:
+            uids.append(self.uidClicked)
+        return uids
+
     def setTransparent(self):
-        """Set treeView item clicked transparent"""
-        item = self.itemClicked
-        if item:
-            uid = item.text(1)
-            if uid in dm.part_dict:
+        """Set treeView items selected (or clicked) transparent"""
+        uids = self.selectedUIDs()
+        if uids:
+            uids = [uid for uid in uids if uid in dm.part_dict]
+            for uid in uids:
                 self.transparency_dict[uid] = 0.6
-                self.erase_shape(uid)
-                self.draw_shape(uid)
-            self.itemClicked = None
+            self.restyle_shapes(uids)
+            self.uidClicked = None
         else:
             print("No item selected. Try first left clicking item then right clicking.")
 
     def setOpaque(self):
-        """Set treeView item clicked opaque"""
-        item = self.itemClicked
-        if item:
-            uid = item.text(1)
-            if uid in dm.part_dict:
-                self.transparency_dict.pop(uid)
-                self.erase_shape(uid)
-                self.draw_shape(uid)
-            self.itemClicked = None
+        """Set treeView items selected (or clicked) opaque"""
+        uids = self.selectedUIDs()
+        if uids:
+            uids = [uid for uid in uids if uid in dm.part_dict]
+            for uid in uids:
+                self.transparency_dict.pop(uid, None)
+            self.restyle_shapes(uids)
+            self.uidClicked = None
         else:
             print("No item selected. Try first left clicking item then right clicking.")
 
     def editName(self):
         """Edit name of treeView item clicked"""
-        item = self.itemClicked
-        if item:
-            name = item.text(0)
-            uid = item.text(1)
+        uid = self.uidClicked
+        if uid:
+            name = self.treeModel.name(uid)
             prompt = "Enter new name for part %s" % name
             newName, OK = QInputDialog.getText(
                 self, "Input Dialog", prompt, text=name)
             if OK:
-                item.setText(0, newName)
                 print(f"UID= {uid}, name = {newName}")
                 self.treeView.clearSelection()
-                self.itemClicked = None
+                self.uidClicked = None
                 dm.change_label_name(uid, newName)
                 self.build_tree()
         else:
@@ -639,21 +1017,32 @@ class MainWindow(QMainWindow):
         self._wpNmbr += 1
         self.wp_dict[uid] = wp_objct
         # Add treeView item
-        itemName = [uid, uid]
-        item = QTreeWidgetItem(self.wp_root, itemName)
-        item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
-        item.setCheckState(0, Qt.Checked)
+        self.treeModel.set_wp_uids(list(self.wp_dict))
         # Make new workplane active
         self.setActiveWp(uid)
         return uid
 
+    def load_wp_dict(self, wp_dict):
+        """Replace all workplanes with those in wp_dict {uid: wp}.
+
+        Used after loading workplanes from file. Call build_tree afterward
+        to show them in the treeView."""
+        self.wp_dict = dict(wp_dict)
+        nmbrs = [int(uid[2:]) for uid in self.wp_dict if uid[2:].isdigit()]
+        self._wpNmbr = max(nmbrs, default=0) + 1
+        self.activeWp = None
+        self.activeWpUID = 0
+        if self.wp_dict:
+            self.setActiveWp(list(self.wp_dict)[-1])
+
     def appendToStack(self):
         """Called when <ret> is pressed on line edit"""
         self.lineEditStack.append(self.lineEdit.text())
         self.lineEdit.clear()
         cb = self.registeredCallback
         if cb:
-            cb([])  # call self.registeredCallback with arg=empty_list
+            with op_timer.operation(cb.__name__[:-1]):
+                cb([])  # call self.registeredCallback with arg=empty_list
         else:
             self.lineEditStack.pop()
 
@@ -671,10 +1060,16 @@ class MainWindow(QMainWindow):
     def setActiveWp(self, uid):
         """Change active workplane status in coordinated manner."""
         # modify status in self
+        prev_uid = self.activeWpUID
         self.activeWpUID = uid
         self.activeWp = self.wp_dict[uid]
         # show as active in treeView
         self.showItemActive(uid)
+        # show border colors of previous & new active wp (if displayed)
+        for wp_uid in (prev_uid, uid):
+            if wp_uid in self.wp_ais_dict:
+                self.color_wp_border(wp_uid)
+        self.canvas._display.Context.UpdateCurrentViewer()
 
     def setActiveAsy(self, uid):
         """Change active assembly status in coordinated manner."""
@@ -704,20 +1099,25 @@ class MainWindow(QMainWindow):
         self.edgeStack = []
         self.faceStack = []
         self.ptStack = []
+        self.clineStack = []
+        self.ccircStack = []
 
     def registerCallback(self, callback):
         currCallback = self.registeredCallback
         if currCallback:  # Make sure a callback isn't already registered
             self.clearCallback()
-        self.canvas._display.register_select_callback(callback)
+        self.timedCallback = op_timer.timed_op(callback.__name__[:-1],
+                                               callback)
+        self.canvas._display.register_select_callback(self.timedCallback)
         self.registeredCallback = callback
         self.currOpLabel.setText("Current Operation: %s " %
                                  callback.__name__[:-1])
 
     def clearCallback(self):
         if self.registeredCallback:
-            self.canvas._display.unregister_callback(self.registeredCallback)
+            self.canvas._display.unregister_callback(self.timedCallback)
             self.registeredCallback = None
+            self.timedCallback = None
             self.clearAllStacks()
             self.currOpLabel.setText("Current Operation: None ")
             self.statusBar().showMessage("")
@@ -733,76 +1133,219 @@ class MainWindow(QMainWindow):
         """Fit all displayed parts and wp's to the screen"""
         self.canvas._display.FitAll()
 
+    @op_timer.timed("display")
     def redraw(self):
-        """Erase & redraw all parts & workplanes except those in hide_list."""
+        """Bring the 3D display up to date with the parts & workplanes.
+
+        Rather than clearing the display and rebuilding everything, the
+        objects displayed are compared with those that should be. Parts &
+        workplanes that are gone are removed, hidden ones are erased, new or
+        modified ones are displayed and color (or transparency) changes are
+        made in place.
+        Unchanged presentations are left alone, so they aren't tessellated
+        again."""
         context = self.canvas._display.Context
         if not self.registeredCallback:
             self.canvas._display.SetSelectionModeNeutral()
             context.SetAutoActivateSelection(True)
-        context.RemoveAll(True)
-        # Redraw all parts except those hidden
+        self.hidden.take_changes()  # (all dealt with below)
+        for uid in list(self.ais_shape_dict):
+            if uid not in dm.part_dict:
+                self.remove_shape(uid)
+            elif uid in self.hidden:
+                self.erase_shape(uid, update=False)
         for uid in dm.part_dict:
-            if uid not in self.hide_list:
-                self.draw_shape(uid)
-        # Redraw workplanes except those hidden
+            if uid not in self.hidden:
+                self.draw_shape(uid, update=False)
         self.redraw_workplanes()
 
+    @op_timer.timed("display")
     def redraw_workplanes(self):
-        """Redraw all workplanes except those in self.hide_list"""
-
+        """Bring display of workplanes up to date (see redraw)."""
+        for uid in list(self.wp_ais_dict):
+            if uid not in self.wp_dict:
+                self.erase_wp(uid)
+            elif uid in self.hidden:
+                self.hide_wp(uid)
         for uid in self.wp_dict:
-            if uid not in self.hide_list:
-                self.draw_wp(uid)
+            if uid not in self.hidden:
+                self.show_wp(uid)
+        self.canvas._display.Context.UpdateCurrentViewer()
+
+    def wp_ais_objects(self, uid):
+        """Return list of all AIS objects of drawn workplane uid."""
+        wp, key = self.wp_drawn_dict[uid]
+        aisList = list(self.wp_ais_dict[uid])
+        aisList += [entry[2] for entry in wp.edgeReg.entries.values()
+                    if entry[2]]
+        if wp.regionAis:
+            aisList.append(wp.regionAis)
+        return aisList
+
+    @op_timer.timed("display")
+    def hide_wp(self, uid):
+        """Erase workplane uid from the display, keeping its AIS objects
+        (see show_wp)."""
+        context = self.canvas._display.Context
+        if (uid in self.wp_ais_dict and
+                context.IsDisplayed(self.wp_ais_dict[uid][0])):
+            for ais in self.wp_ais_objects(uid):
+                context.Erase(ais, False)
+
+    @op_timer.timed("display")
+    def show_wp(self, uid):
+        """Display workplane uid. If it was hidden and hasn't changed
+        since, just display its AIS objects again, else draw it."""
+        wp = self.wp_dict[uid]
+        if self.wp_drawn_dict.get(uid) != (wp, wp.displayKey()):
+            self.draw_wp(uid, update=False)
+            return
+        context = self.canvas._display.Context
+        if not context.IsDisplayed(self.wp_ais_dict[uid][0]):
+            for ais in self.wp_ais_objects(uid):
+                context.Display(ais, False)
+            # Display activates selection again
+            self.canvas._display.SetUnselectable(self.wp_ais_dict[uid][2])
+        self.color_wp_border(uid)
+
+    def color_wp_border(self, uid):
+        """Set border color of displayed workplane uid (active or not)."""
+        if uid == self.activeWpUID:
+            borderColor = Quantity_Color(Quantity_NOC_DARKGREEN)
+        else:
+            borderColor = Quantity_Color(Quantity_NOC_GRAY)
+        aisBorder = self.wp_ais_dict[uid][0]
+        self.canvas._display.Context.SetColor(aisBorder, borderColor, False)
 
-    def draw_wp(self, uid):
-        """Draw the workplane with uid."""
+    @op_timer.timed("display")
+    def erase_wp(self, uid):
+        """Remove all displayed objects of workplane uid."""
+        context = self.canvas._display.Context
+        for ais in self.wp_ais_dict.pop(uid, []):
+            self.canvas._display.SetUnselectable(ais, False)
+            context.Remove(ais, False)
+        wp, key = self.wp_drawn_dict.pop(uid, (None, None))
+        if wp:  # (may no longer be in self.wp_dict)
+            for entry in wp.edgeReg.entries.values():
+                if entry[2]:
+                    context.Remove(entry[2], False)
+                    entry[2] = None
+            if wp.regionAis:
+                context.Remove(wp.regionAis, False)
+                wp.regionAis = None
+            self.remove_stale_ais(wp)
+
+    @op_timer.timed("display")
+    def draw_wp(self, uid, update=True):
+        """Draw the workplane with uid (replacing it, if displayed).
+
+        Its AIS objects are kept in self.wp_ais_dict (border first) and
+        the edges' in its edge registry, so they can be removed later."""
         context = self.canvas._display.Context
         if uid:
+            self.erase_wp(uid)
             wp = self.wp_dict[uid]
             border = wp.border
-            if uid == self.activeWpUID:
-                borderColor = Quantity_Color(Quantity_NOC_DARKGREEN)
-            else:
-                borderColor = Quantity_Color(Quantity_NOC_GRAY)
             aisBorder = AIS_Shape(border)
-            context.Display(aisBorder, True)
-            context.SetColor(aisBorder, borderColor, True)
+            aisList = self.wp_ais_dict[uid] = [aisBorder]
+            context.Display(aisBorder, False)
+            self.color_wp_border(uid)
             transp = 0.8  # 0.0 <= transparency <= 1.0
-            context.SetTransparency(aisBorder, transp, True)
+            context.SetTransparency(aisBorder, transp, False)
             drawer = aisBorder.DynamicHilightAttributes()
-            context.HilightWithColor(aisBorder, drawer, True)
+            context.HilightWithColor(aisBorder, drawer, False)
+            # all clines & ccircs are drawn as one object, and so are all
+            # the intersection points. The points aren't selectable: picks
+            # are snapped to them with wp.snap (see M2D.add_vertex_to_xyPtStack)
             clClr = Quantity_Color(Quantity_NOC_MAGENTA1)
-            for cline in wp.clines:
-                geomline = wp.geomLineBldr(cline)
-                aisline = AIS_Line(geomline)
-                aisline.SetOwner(geomline)
-                drawer = aisline.Attributes()
-                # asp parameters: (color, type, width)
-                asp = Prs3d_LineAspect(clClr, 2, 1.0)
-                drawer.SetLineAspect(asp)
-                aisline.SetAttributes(drawer)
-                context.Display(aisline, False)  # (see comment below)
-                # 'False' above enables 'context' mode display & selection
-            pntlist = wp.intersectPts()  # type <gp_Pnt>
-            for point in pntlist:
-                self.canvas._display.DisplayShape(point)
-            for ccirc in wp.ccircs:
-                aiscirc = AIS_Circle(wp.convert_circ_to_geomCirc(ccirc))
-                drawer = aisline.Attributes()
-                # asp parameters: (color, type, width)
-                asp = Prs3d_LineAspect(clClr, 2, 1.0)
-                drawer.SetLineAspect(asp)
-                aiscirc.SetAttributes(drawer)
-                context.Display(aiscirc, False)  # (see comment below)
-                # 'False' above enables 'context' mode display & selection
-            for edge in wp.edgeList:
-                self.canvas._display.DisplayShape(edge, color="WHITE")
-            self.canvas._display.Repaint()
-
-    def draw_shape(self, uid):
-        """Draw the part (shape) with uid."""
+            aisConstr = AIS_Shape(wp.constructionShape())
+            aisConstr.SetInfiniteState(True)  # (ignored by FitAll)
+            drawer = aisConstr.Attributes()
+            # asp parameters: (color, type, width)
+            asp = Prs3d_LineAspect(clClr, 2, 1.0)
+            drawer.SetWireAspect(asp)
+            aisConstr.SetAttributes(drawer)
+            context.Display(aisConstr, False)
+            aisPnts = AIS_Shape(wp.intersectPtsShape())
+            context.Display(aisPnts, False)
+            self.canvas._display.SetUnselectable(aisPnts)
+            aisList += [aisConstr, aisPnts]
+            for entry in wp.edgeReg.entries.values():
+                self.display_wp_edge(wp, entry)
+            self.draw_wp_region(uid)
+            self.wp_drawn_dict[uid] = (wp, wp.displayKey())
+            if update:
+                self.canvas._display.Repaint()
+
+    @op_timer.timed("display")
+    def draw_wp_region(self, uid):
+        """Show picked region (if any) of workplane uid as a shaded face."""
+        wp = self.wp_dict[uid]
+        if wp.regionAis:
+            self.canvas._display.Context.Remove(wp.regionAis, False)
+            wp.regionAis = None
+        if wp.regionPnt and uid not in self.hidden:
+            face = wp.makeRegionFace(wp.regionPnt)
+            if face:
+                wp.regionAis = self.canvas._display.DisplayShape(
+                    face, color="YELLOW", transparency=0.6)
+        if uid in self.wp_drawn_dict and uid not in self.hidden:
+            self.wp_drawn_dict[uid] = (wp, wp.displayKey())
+
+    def display_wp_edge(self, wp, entry):
+        """Display profile edge of registry entry [edge, eid, ais] of wp."""
+        edge = entry[0]
+        color = "RED" if edge in wp.badEdges else "WHITE"
+        entry[2] = self.canvas._display.DisplayShape(edge, color=color)
+
+    def remove_stale_ais(self, wp):
+        """Remove AIS objects of edges no longer in wp's profile."""
         context = self.canvas._display.Context
-        if uid:
+        for ais in wp.staleAis:
+            context.Remove(ais, False)
+        wp.staleAis = []
+
+    @op_timer.timed("display")
+    def refresh_wp_edges(self, uid):
+        """Bring display of profile edges of workplane uid up to date.
+
+        Only edges removed or added since the wp was drawn are erased or
+        displayed. Parts and other workplane objects are left untouched."""
+        wp = self.wp_dict[uid]
+        self.remove_stale_ais(wp)
+        if uid in self.wp_ais_dict and uid not in self.hidden:
+            for entry in wp.edgeReg.entries.values():
+                if entry[2] is None:
+                    self.display_wp_edge(wp, entry)
+            self.wp_drawn_dict[uid] = (wp, wp.displayKey())
+        self.canvas._display.Repaint()
+
+    def part_style(self, uid):
+        """Return (color, transparency) part uid should be displayed with."""
+        color = dm.part_dict[uid]["color"]
+        transp = self.transparency_dict.get(uid, 0.0)
+        return ((color.Red(), color.Green(), color.Blue()), transp)
+
+    @op_timer.timed("display")
+    def draw_shape(self, uid, update=True):
+        """Draw the part (shape) with uid.
+
+        If its presentation is already displayed, or was erased (hidden)
+        and the part's shape hasn't changed since, it is reused and only its
+        color & transparency are updated (if changed). Otherwise, a new
+        presentation replaces it."""
+        context = self.canvas._display.Context
+        aisShape = self.ais_shape_dict.get(uid)
+        if aisShape and aisShape.Shape().IsEqual(dm.part_dict[uid]["shape"]):
+            if uid in self.hidden_ais_dict:
+                del self.hidden_ais_dict[uid]
+                context.Display(aisShape, False)
+            self.restyle_shape(uid)
+            if update:
+                context.UpdateCurrentViewer()
+        elif uid:
+            if aisShape:
+                self.remove_shape(uid)  # shape modified
             if uid in self.transparency_dict:
                 transp = self.transparency_dict[uid]
             else:
@@ -813,24 +1356,60 @@ class MainWindow(QMainWindow):
             try:
                 aisShape = AIS_Shape(shape)
                 self.ais_shape_dict[uid] = aisShape
-                context.Display(aisShape, True)
-                context.SetColor(aisShape, color, True)
+                with op_timer.phase("tessellate"):
+                    context.Display(aisShape, False)
+                context.SetColor(aisShape, color, False)
                 # Set shape transparency, a float from 0.0 to 1.0
-                context.SetTransparency(aisShape, transp, True)
+                context.SetTransparency(aisShape, transp, False)
                 drawer = aisShape.DynamicHilightAttributes()
-                context.HilightWithColor(aisShape, drawer, True)
+                context.HilightWithColor(aisShape, drawer, update)
+                self.ais_style_dict[uid] = self.part_style(uid)
             except AttributeError as e:
                 print(e)
 
-    def erase_shape(self, uid):
-        """Erase the part (shape) with uid."""
-        if uid in self.ais_shape_dict:
+    def restyle_shape(self, uid):
+        """Update color & transparency of the presentation of part uid in
+        place (if changed). The viewer isn't updated."""
+        aisShape = self.ais_shape_dict.get(uid)
+        style = self.part_style(uid)
+        if aisShape and self.ais_style_dict.get(uid) != style:
             context = self.canvas._display.Context
-            aisShape = self.ais_shape_dict[uid]
-            # This did the job prior to PyOCC 7.6
-            context.Remove(aisShape, True)
-            # Added to get 'hide' working in PyOCC 7.6
-            context.Erase(aisShape, True)
+            rgb, transp = style
+            if self.ais_style_dict[uid][0] != rgb:
+                context.SetColor(aisShape, dm.part_dict[uid]["color"], False)
+            context.SetTransparency(aisShape, transp, False)
+            self.ais_style_dict[uid] = style
+
+    @op_timer.timed("display")
+    def restyle_shapes(self, uids):
+        """Update color & transparency of parts uids in place, then update
+        the viewer once."""
+        for uid in uids:
+            self.restyle_shape(uid)
+        self.canvas._display.Context.UpdateCurrentViewer()
+
+    @op_timer.timed("display")
+    def erase_shape(self, uid, update=True):
+        """Erase the part (shape) with uid.
+
+        Its presentation is kept (see draw_shape), so it can be shown again
+        without being tessellated again. Only the HIDDEN_AIS_MAX most
+        recently erased ones are kept."""
+        if uid in self.ais_shape_dict and uid not in self.hidden_ais_dict:
+            self.canvas._display.Context.Erase(self.ais_shape_dict[uid],
+                                               update)
+            self.hidden_ais_dict[uid] = None
+            while len(self.hidden_ais_dict) > HIDDEN_AIS_MAX:
+                self.remove_shape(next(iter(self.hidden_ais_dict)))
+
+    @op_timer.timed("display")
+    def remove_shape(self, uid):
+        """Remove the part (shape) with uid and its presentation."""
+        if uid in self.ais_shape_dict:
+            aisShape = self.ais_shape_dict.pop(uid)
+            self.ais_style_dict.pop(uid, None)
+            self.hidden_ais_dict.pop(uid, None)
+            self.canvas._display.Context.Remove(aisShape, False)
 
     #############################################
     #
@@ -136,6 +136,7 @@ class Viewer3d(Display3d):
         self.selected_shapes = []
         self._select_callbacks = []
         self._overlay_items = []
+        self.unselectable = []  # AIS objects kept out of selection
 
     def get_parent(self):
         return self._parent
@@ -578,8 +579,21 @@ class Viewer3d(Display3d):
             self.Context.Activate(AIS_Shape_SelectionMode(topo_level), True)
         else:
             self.Context.Activate(AIS_Shape_SelectionMode(mode), True)
+        for ais in self.unselectable:
+            self.Context.Deactivate(ais)
         self.Context.UpdateSelected(True)
 
+    def SetUnselectable(self, ais, unselectable=True):
+        """Keep displayed object ais out of selection (in all modes),
+        or let it be selected again."""
+        if unselectable:
+            self.Context.Deactivate(ais)
+            if not any(obj is ais for obj in self.unselectable):
+                self.unselectable.append(ais)
+        else:
+            self.unselectable = [obj for obj in self.unselectable
+                                 if obj is not ais]
+
     def SetSelectionModeVertex(self):
         self.SetSelectionMode(TopAbs_VERTEX)
 
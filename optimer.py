@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+#
+# Copyright 2022 Doug Blanding (dblanding@gmail.com)
+#
+# This file is part of kodacad.
+# The latest  version of this file can be found at:
+# //https://github.com/dblanding/kodacad
+#
+# kodacad is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# kodacad is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# if not, write to the Free Software Foundation, Inc.
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+"""Timing of the phases of user operations.
+
+A user operation (a menu command, a pick or an entry in the line edit) is
+timed by running it inside op_timer.operation(name). The time spent in
+each phase (kernel op, doc update, lint, parse, tree rebuild, tessellation
+and display) is measured by running the code of that phase inside
+op_timer.phase(phase), or by decorating the function doing it with
+op_timer.timed(phase). Phases may be nested. The time of an inner phase is
+not counted in the outer one. Phases outside of an operation aren't timed.
+
+When an operation ends, its record (name, total secs, {phase: secs}) is
+added to op_timer.history and passed to each of op_timer.listeners.
+"""
+
+from collections import defaultdict, deque
+from contextlib import contextmanager
+import functools
+import time
+
+PHASES = ("kernel", "doc", "lint", "parse", "tree", "tessellate", "display")
+HISTORY_SIZE = 100  # Number of operation records kept
+
+
+class OpTimer:
+    """Time the phases of user operations (see module docstring)."""
+
+    def __init__(self, size=HISTORY_SIZE):
+        self.history = deque(maxlen=size)  # [(name, secs, {phase: secs})]
+        self.listeners = []  # called with the record of each operation
+        self._op = None  # (name, start time, {phase: secs}) in progress
+        self._depth = 0  # nesting depth of operations
+        self._phases = []  # [[phase, start time], ...] innermost last
+
+    @contextmanager
+    def operation(self, name):
+        """Time the operation name (nested operations are part of it)."""
+        self._depth += 1
+        if self._depth == 1:
+            self._op = (name, time.perf_counter(), defaultdict(float))
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if not self._depth:
+                name, t0, times = self._op
+                self._op = None
+                record = (name, time.perf_counter() - t0, dict(times))
+                self.history.append(record)
+                for listener in self.listeners:
+                    listener(record)
+
+    @contextmanager
+    def phase(self, phase):
+        """Time phase of the operation in progress."""
+        now = time.perf_counter()
+        if self._phases:
+            outer = self._phases[-1]
+            self._charge(outer[0], now - outer[1])
+        entry = [phase, now]
+        self._phases.append(entry)
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self._phases.pop()
+            self._charge(phase, now - entry[1])
+            if self._phases:
+                self._phases[-1][1] = now  # outer phase resumes
+
+    def _charge(self, phase, secs):
+        if self._op:
+            self._op[2][phase] += secs
+
+    def timed(self, phase):
+        """Return decorator timing calls of a function as phase."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.phase(phase):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def timed_op(self, name, func):
+        """Return func wrapped to be timed as operation name."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.operation(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def dump(self):
+        """Return list of text lines of history (oldest first)."""
+        return [format_record(record) for record in self.history]
+
+
+def format_record(record, sep=", "):
+    """Return text of operation record: its name, total time and the time
+    of each phase measured (all in ms)."""
+    name, secs, times = record
+    phases = [f"{phase} {times[phase] * 1000:.0f}"
+              for phase in PHASES if phase in times]
+    text = f"{name}: {secs * 1000:.0f} ms"
+    if phases:
+        text += f" ({sep.join(phases)})"
+    return text
+
+
+op_timer = OpTimer()
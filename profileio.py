@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+#
+# Copyright 2022 Doug Blanding (dblanding@gmail.com)
+#
+# This file is part of kodacad.
+# The latest  version of this file can be found at:
+# //https://github.com/dblanding/kodacad
+#
+# kodacad is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# kodacad is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# if not, write to the Free Software Foundation, Inc.
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+"""Exchange of 2D workplane geometry with other tools (CSV, DXF & SVG).
+
+Geometry is passed around as a list of edge records (type, params), the
+same as produced by WorkPlane.edgeRecord and consumed by
+WorkPlane.add_records:
+    EDGE_LINE (x1, y1, x2, y2)
+    EDGE_CIRC (cx, cy, r)
+    EDGE_ARC  (x1, y1, xm, ym, x2, y2)  (start, mid & end pts)
+All params are lengths, so a list of records is scaled by scaling them all.
+"""
+
+import math
+
+from workplane import EDGE_ARC, EDGE_CIRC, EDGE_LINE, cr_from_3p
+
+
+def scale_records(records, scale):
+    """Return list of records with all params multiplied by scale."""
+    if scale == 1:
+        return list(records)
+    return [(typ, tuple(v * scale for v in params))
+            for typ, params in records]
+
+
+def mirror_record(record):
+    """Return record mirrored in x (x -> -x)."""
+    typ, params = record
+    if typ == EDGE_CIRC:
+        cx, cy, r = params
+        return (typ, (-cx, cy, r))
+    return (typ, tuple(-v if i % 2 == 0 else v for i, v in enumerate(params)))
+
+
+def polyline_records(pts, bulges=None, closed=False):
+    """Return list of records of polyline through pts.
+
+    bulges (if any) are DXF bulge factors, one per vertex, of the segment
+    that starts at that vertex. Bulge = tan(included angle / 4), positive
+    for an arc running CCW. Zero length segments are skipped."""
+    if closed and len(pts) >= 2:
+        pts = list(pts) + [pts[0]]
+    bulges = bulges or [0] * len(pts)
+    records = []
+    for (x1, y1), (x2, y2), b in zip(pts, pts[1:], bulges):
+        if (x1, y1) == (x2, y2):
+            continue
+        if b:
+            # mid pt of arc is off the mid pt of the chord by the sagitta
+            dx, dy = x2 - x1, y2 - y1
+            s = b / 2  # sagitta / chord length
+            xm = (x1 + x2) / 2 + s * dy
+            ym = (y1 + y2) / 2 - s * dx
+            records.append((EDGE_ARC, (x1, y1, xm, ym, x2, y2)))
+        else:
+            records.append((EDGE_LINE, (x1, y1, x2, y2)))
+    return records
+
+
+# ===========================================================================
+#
+# CSV (and pasted text)
+# One row per point: "x, y" (comma, tab or space separated). Consecutive
+# points are joined by lines into a polyline. A blank (or non numeric) row
+# ends the polyline. A polyline of a single point is returned as a point.
+# A row of 3 numbers "x, y, r" is a circle.
+#
+# ===========================================================================
+
+
+def csv_records(lines):
+    """Return (records, points) from an iterable of CSV text lines."""
+    records = []
+    points = []
+    polyline = []
+
+    def end_polyline():
+        if len(polyline) == 1:
+            points.append(polyline[0])
+        else:
+            records.extend(polyline_records(polyline))
+        polyline.clear()
+
+    for line in lines:
+        fields = line.replace(",", " ").split()
+        try:
+            vals = [float(field) for field in fields]
+        except ValueError:
+            vals = []  # header or comment
+        if len(vals) == 2:
+            polyline.append(tuple(vals))
+        else:
+            end_polyline()
+            if len(vals) == 3:
+                records.append((EDGE_CIRC, tuple(vals)))
+    end_polyline()
+    return records, points
+
+
+def read_csv(fname):
+    """Return (records, points) read from CSV file fname."""
+    with open(fname) as f:
+        return csv_records(f)
+
+
+# ===========================================================================
+#
+# DXF
+# A DXF file is a long list of (group code, value) pairs, each on 2 lines.
+# The file is streamed one pair at a time and only the entity being read
+# is held in memory, so large files are read in a single pass.
+#
+# ===========================================================================
+
+DXF_ENTITY_TYPES = {"LINE", "ARC", "CIRCLE", "LWPOLYLINE"}
+
+
+def dxf_pairs(f):
+    """Generate (group code, value) pairs from open DXF text file f.
+
+    Blank lines where a group code is expected (such as trailing lines at
+    the end of the file) are skipped. Raise ValueError if a group code
+    isn't an integer."""
+    lineNbr = 0
+    for code in f:
+        lineNbr += 1
+        if not code.strip():
+            continue
+        try:
+            code = int(code)
+        except ValueError:
+            raise ValueError(f"Bad DXF group code {code.strip()!r} "
+                             f"at line {lineNbr}") from None
+        value = next(f, "").strip()
+        lineNbr += 1
+        yield code, value
+
+
+def dxf_entities(f):
+    """Generate (entity type, [(code, value), ...]) for the supported
+    entities in the ENTITIES section of open DXF text file f."""
+    inEntities = False
+    etype = None
+    data = []
+    for code, value in dxf_pairs(f):
+        if code == 0:
+            if etype:
+                yield etype, data
+            etype = None
+            if value == "ENDSEC":
+                if inEntities:
+                    return
+            elif inEntities and value in DXF_ENTITY_TYPES:
+                etype = value
+                data = []
+        elif code == 2 and value == "ENTITIES":
+            inEntities = True
+        elif etype:
+            data.append((code, value))
+
+
+def dxf_entity_records(etype, data):
+    """Return list of records of one DXF entity."""
+    vals = {}
+    for code, value in data:
+        if code in (10, 20) and etype == "LWPOLYLINE":
+            continue  # vertices are collected in order below
+        vals[code] = value
+    if etype == "LINE":
+        x1, y1, x2, y2 = [float(vals.get(code, 0))
+                          for code in (10, 20, 11, 21)]
+        records = polyline_records([(x1, y1), (x2, y2)])
+    elif etype == "CIRCLE":
+        cx, cy, r = [float(vals.get(code, 0)) for code in (10, 20, 40)]
+        records = [(EDGE_CIRC, (cx, cy, r))]
+    elif etype == "ARC":
+        cx, cy, r, a1, a2 = [float(vals.get(code, 0))
+                             for code in (10, 20, 40, 50, 51)]
+        span = (a2 - a1) % 360 or 360  # arcs run CCW from a1 to a2
+        angs = [math.radians(a) for a in (a1, a1 + span / 2, a1 + span)]
+        pts = [(cx + r * math.cos(a), cy + r * math.sin(a)) for a in angs]
+        records = [(EDGE_ARC, pts[0] + pts[1] + pts[2])]
+    else:  # LWPOLYLINE
+        pts = []
+        bulges = []
+        for code, value in data:
+            if code == 10:
+                pts.append([float(value), 0.0])
+                bulges.append(0.0)
+            elif code == 20 and pts:
+                pts[-1][1] = float(value)
+            elif code == 42 and bulges:
+                bulges[-1] = float(value)
+        closed = int(vals.get(70, 0)) & 1
+        records = polyline_records([tuple(p) for p in pts], bulges, closed)
+    if float(vals.get(230, 1)) < 0:
+        # extrusion direction -Z: entity coords (OCS) are mirrored in x
+        records = [mirror_record(record) for record in records]
+    return records
+
+
+def read_dxf(fname):
+    """Return list of records of LINE, ARC, CIRCLE and LWPOLYLINE entities
+    read from DXF file fname."""
+    records = []
+    with open(fname, errors="replace") as f:
+        for etype, data in dxf_entities(f):
+            records.extend(dxf_entity_records(etype, data))
+    return records
+
+
+def arc_params(record):
+    """Return (cx, cy, r, a1, a2) of arc record, running CCW from angle a1
+    to angle a2 (radians, a1 < a2)."""
+    typ, (x1, y1, xm, ym, x2, y2) = record
+    (cx, cy), r = cr_from_3p((x1, y1), (xm, ym), (x2, y2))
+    a1, am, a2 = [math.atan2(y - cy, x - cx)
+                  for x, y in ((x1, y1), (xm, ym), (x2, y2))]
+    span = (a2 - a1) % (2 * math.pi)
+    if (am - a1) % (2 * math.pi) < span:  # CCW from start to end
+        return (cx, cy, r, a1, a1 + span)
+    return (cx, cy, r, a2, a2 + 2 * math.pi - span)  # CCW from end
+
+
+def dxf_entity_lines(record, layer):
+    """Return list of DXF text lines of the entity of one record."""
+    typ, params = record
+    lines = ["0"]
+    if typ == EDGE_LINE:
+        x1, y1, x2, y2 = params
+        lines += ["LINE", "8", layer, "10", repr(x1), "20", repr(y1),
+                  "11", repr(x2), "21", repr(y2)]
+    elif typ == EDGE_CIRC:
+        cx, cy, r = params
+        lines += ["CIRCLE", "8", layer, "10", repr(cx), "20", repr(cy),
+                  "40", repr(r)]
+    else:
+        cx, cy, r, a1, a2 = arc_params(record)
+        lines += ["ARC", "8", layer, "10", repr(cx), "20", repr(cy),
+                  "40", repr(r), "50", repr(math.degrees(a1) % 360),
+                  "51", repr(math.degrees(a2) % 360)]
+    return lines
+
+
+def write_dxf(fname, profile, construction=()):
+    """Write records of profile (& construction) geometry to DXF file fname.
+
+    Coordinates are in mm. Profile and construction geometry are put on
+    layers PROFILE and CONSTRUCTION."""
+    with open(fname, "w") as f:
+        f.write("0\nSECTION\n2\nHEADER\n9\n$INSUNITS\n70\n4\n0\nENDSEC\n")
+        f.write("0\nSECTION\n2\nENTITIES\n")
+        for layer, records in (("PROFILE", profile),
+                               ("CONSTRUCTION", construction)):
+            for record in records:
+                f.write("\n".join(dxf_entity_lines(record, layer)) + "\n")
+        f.write("0\nENDSEC\n0\nEOF\n")
+
+
+# ===========================================================================
+#
+# SVG
+# SVG's y axis points down, so geometry is drawn inside a group which
+# flips y. Arc flags are then in the (unflipped) wp coords: a sweep flag
+# of 1 means CCW.
+#
+# ===========================================================================
+
+
+def svg_element(record):
+    """Return SVG element (text) of one record."""
+    typ, params = record
+    if typ == EDGE_LINE:
+        x1, y1, x2, y2 = params
+        return f'<line x1="{x1:g}" y1="{y1:g}" x2="{x2:g}" y2="{y2:g}"/>'
+    if typ == EDGE_CIRC:
+        cx, cy, r = params
+        return f'<circle cx="{cx:g}" cy="{cy:g}" r="{r:g}"/>'
+    cx, cy, r, a1, a2 = arc_params(record)
+    x1, y1 = cx + r * math.cos(a1), cy + r * math.sin(a1)
+    x2, y2 = cx + r * math.cos(a2), cy + r * math.sin(a2)
+    large = int(a2 - a1 > math.pi)
+    return (f'<path d="M {x1:g} {y1:g} A {r:g} {r:g} 0 {large} 1 '
+            f'{x2:g} {y2:g}"/>')
+
+
+def records_bounds(records):
+    """Return bounding box (x1, y1, x2, y2) of records (None if empty)."""
+    xs = []
+    ys = []
+    for typ, params in records:
+        if typ == EDGE_CIRC:
+            cx, cy, r = params
+            xs += [cx - r, cx + r]
+            ys += [cy - r, cy + r]
+        else:
+            xs += params[0::2]
+            ys += params[1::2]
+    if xs:
+        return (min(xs), min(ys), max(xs), max(ys))
+    return None
+
+
+def write_svg(fname, profile, construction=()):
+    """Write records of profile (& construction) geometry to SVG file fname.
+
+    Coordinates are in mm. Profile is drawn black, construction magenta."""
+    x1, y1, x2, y2 = (records_bounds(list(profile) + list(construction)) or
+                      (0, 0, 1, 1))
+    m = max(x2 - x1, y2 - y1) * 0.02  # margin
+    x1, y1, x2, y2 = x1 - m, y1 - m, x2 + m, y2 + m
+    w, h = x2 - x1, y2 - y1
+    with open(fname, "w") as f:
+        f.write(f'<svg xmlns="http://www.w3.org/2000/svg" '
+                f'width="{w:g}mm" height="{h:g}mm" '
+                f'viewBox="{x1:g} {-y2:g} {w:g} {h:g}">\n')
+        f.write('<g transform="scale(1,-1)" fill="none">\n')
+        for color, records in (("black", profile),
+                               ("magenta", construction)):
+            if records:
+                f.write(f'<g stroke="{color}" stroke-width="{m / 10:g}">\n')
+                for record in records:
+                    f.write(svg_element(record) + "\n")
+                f.write('</g>\n')
+        f.write('</g>\n</svg>\n')
@@ -0,0 +1,530 @@
+#!/usr/bin/env python
+#
+# Copyright 2022 Doug Blanding (dblanding@gmail.com)
+#
+# This file is part of kodacad.
+# The latest  version of this file can be found at:
+# //https://github.com/dblanding/kodacad
+#
+# kodacad is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# kodacad is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# if not, write to the Free Software Foundation, Inc.
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+#
+
+"""2D geometric constraint solver for workplane profiles.
+
+A Sketch holds the parametric description of profile elements (points,
+lines, circles & arcs) as a flat list of variables, along with constraints
+among them. Each constraint contributes one or more residuals which are
+driven to zero by a damped (Levenberg-Marquardt) Newton solver. The Jacobian
+is kept sparse (each constraint only touches a few variables) and each step
+is solved by a sparse (envelope) Cholesky factorization, so no dense
+matrices are formed.
+
+Constraints link variables into a graph. When a constraint is added or its
+value is changed, only the connected component of the graph containing it
+is re-solved.
+"""
+
+from collections import defaultdict
+import math
+import time
+
+SOLVE_TOL = 1e-9  # max residual at convergence
+MAX_ITER = 50  # max number of Newton iterations
+
+
+def _wrap(ang):
+    """Return angle (radians) wrapped to range [-pi, pi)."""
+    return (ang + math.pi) % (2 * math.pi) - math.pi
+
+
+class Constraint():
+    """Base class of constraints.
+
+    Subclasses set self.vars (indexes of the variables they depend on) and
+    implement residuals(x), returning a list of residuals for the values in
+    x. Derivatives are found by finite differences, only over self.vars."""
+
+    name = "constraint"
+
+    def __init__(self, varIds, value=None):
+        self.vars = list(varIds)
+        self.value = value
+
+    def residuals(self, x):
+        raise NotImplementedError
+
+    def jacobian(self, x):
+        """Return list of sparse rows {var: d(residual)/d(var)}."""
+        rows = [dict() for __ in self.residuals(x)]
+        for v in set(self.vars):
+            h = 1e-7 * max(1.0, abs(x[v]))
+            save = x[v]
+            x[v] = save + h
+            rp = self.residuals(x)
+            x[v] = save - h
+            rm = self.residuals(x)
+            x[v] = save
+            for row, a, b in zip(rows, rp, rm):
+                d = (a - b) / (2 * h)
+                if d:
+                    row[v] = d
+        return rows
+
+
+class Coincident(Constraint):
+    name = "coincident"
+
+    def __init__(self, p, q):
+        super().__init__(p + q)
+
+    def residuals(self, x):
+        xp, yp, xq, yq = self.vars
+        return [x[xq] - x[xp], x[yq] - x[yp]]
+
+
+class Distance(Constraint):
+    name = "distance"
+
+    def __init__(self, p, q, dist):
+        super().__init__(p + q, dist)
+
+    def residuals(self, x):
+        xp, yp, xq, yq = self.vars
+        return [math.hypot(x[xq] - x[xp], x[yq] - x[yp]) - self.value]
+
+
+class Horizontal(Constraint):
+    name = "horizontal"
+
+    def __init__(self, p, q):
+        super().__init__(p + q)
+
+    def residuals(self, x):
+        xp, yp, xq, yq = self.vars
+        return [x[yq] - x[yp]]
+
+
+class Vertical(Constraint):
+    name = "vertical"
+
+    def __init__(self, p, q):
+        super().__init__(p + q)
+
+    def residuals(self, x):
+        xp, yp, xq, yq = self.vars
+        return [x[xq] - x[xp]]
+
+
+class Angle(Constraint):
+    """Angle (degrees, CCW) from line (p1, q1) to line (p2, q2)."""
+    name = "angle"
+
+    def __init__(self, p1, q1, p2, q2, angle):
+        super().__init__(p1 + q1 + p2 + q2, angle)
+
+    def residuals(self, x):
+        a, b, c, d, e, f, g, h = [x[v] for v in self.vars]
+        phi = math.atan2(h - f, g - e) - math.atan2(d - b, c - a)
+        return [_wrap(phi - math.radians(self.value))]
+
+
+class Tangent(Constraint):
+    """Line (p, q) tangent to circle (center c, radius var r)."""
+    name = "tangent"
+
+    def __init__(self, p, q, c, r):
+        super().__init__(p + q + c + [r])
+
+    def residuals(self, x):
+        xp, yp, xq, yq, xc, yc, r = [x[v] for v in self.vars]
+        length = math.hypot(xq - xp, yq - yp) or 1.0
+        cross = (xq - xp) * (yc - yp) - (yq - yp) * (xc - xp)
+        return [abs(cross) / length - r]
+
+
+class OnCircle(Constraint):
+    """Point p lies on circle (center c, radius var r)."""
+    name = "on circle"
+
+    def __init__(self, p, c, r):
+        super().__init__(p + c + [r])
+
+    def residuals(self, x):
+        xp, yp, xc, yc, r = [x[v] for v in self.vars]
+        return [math.hypot(xp - xc, yp - yc) - r]
+
+
+class Radius(Constraint):
+    name = "radius"
+
+    def __init__(self, r, rad):
+        super().__init__([r], rad)
+
+    def residuals(self, x):
+        return [x[self.vars[0]] - self.value]
+
+
+class Fix(Constraint):
+    """Point p is fixed at its current location."""
+    name = "fix"
+
+    def __init__(self, p, pnt):
+        super().__init__(p, pnt)
+
+    def residuals(self, x):
+        xp, yp = self.vars
+        return [x[xp] - self.value[0], x[yp] - self.value[1]]
+
+
+class Sketch():
+    """Parametric 2D profile elements and the constraints among them.
+
+    Points are pairs of variable indexes [ix, iy] (so they can be used
+    directly in constraints). Entities are held in self.entities as
+    {eid: (type, data)} where type is 'line' (p, q), 'circ' (c, r) or
+    'arc' (c, r, ps, pe) (CCW from ps to pe) and r is a variable index."""
+
+    def __init__(self, accuracy=1e-6):
+        self.x = []  # variable values
+        self.accuracy = accuracy
+        self.points = []  # all points
+        self.pointDict = {}  # {hash key: point} used to merge points
+        self.entities = {}  # {eid: (type, data)}
+        self.constraints = {}  # {cid: <Constraint>}
+        self.varRefs = defaultdict(int)  # {var: nmbr of entities using it}
+        self.varConstraints = defaultdict(set)  # {var: {cids using it}}
+        self._nextId = 1
+        self._components = None  # {var: component nmbr}, built when needed
+        self.solveStats = {}  # stats of most recent solve (incl. 'time')
+
+    def _newId(self):
+        nid = self._nextId
+        self._nextId += 1
+        return nid
+
+    def _var(self, value):
+        self.x.append(float(value))
+        return len(self.x) - 1
+
+    # =======================================================================
+    # Entities
+    # =======================================================================
+
+    def _key(self, pnt):
+        return (round(pnt[0] / self.accuracy), round(pnt[1] / self.accuracy))
+
+    def _pointDict(self):
+        if self.pointDict is None:  # points have moved since last built
+            self.pointDict = {self._key(self.pnt(p)): p for p in self.points}
+        return self.pointDict
+
+    def point(self, pnt):
+        """Return point at pnt (x, y), reusing an existing coincident one."""
+        self._pointDict()
+        key = self._key(pnt)
+        if key not in self.pointDict:
+            p = [self._var(pnt[0]), self._var(pnt[1])]
+            self.points.append(p)
+            self.pointDict[key] = p
+        return self.pointDict[key]
+
+    def find_point(self, pnt):
+        """Return existing point within accuracy of pnt (x, y), else None."""
+        kx, ky = self._key(pnt)
+        pointDict = self._pointDict()
+        for dx in (0, -1, 1):  # (pnt may be near the edge of its cell)
+            for dy in (0, -1, 1):
+                p = pointDict.get((kx + dx, ky + dy))
+                if p:
+                    x, y = self.pnt(p)
+                    if math.hypot(x - pnt[0], y - pnt[1]) <= self.accuracy:
+                        return p
+        return None
+
+    def pnt(self, p):
+        """Return (x, y) value of point p."""
+        return (self.x[p[0]], self.x[p[1]])
+
+    def _add_entity(self, eid, typ, data):
+        self.entities[eid] = (typ, data)
+        for v in set(self.entity_vars(eid)):
+            self.varRefs[v] += 1
+
+    def add_line(self, pnt1, pnt2):
+        eid = self._newId()
+        self._add_entity(eid, 'line', (self.point(pnt1), self.point(pnt2)))
+        return eid
+
+    def add_circ(self, cntr, rad):
+        eid = self._newId()
+        self._add_entity(eid, 'circ', (self.point(cntr), self._var(rad)))
+        return eid
+
+    def add_arc(self, cntr, ps, pe):
+        """Add arc (CCW from ps to pe) with center cntr."""
+        eid = self._newId()
+        c = self.point(cntr)
+        r = self._var(math.hypot(ps[0] - cntr[0], ps[1] - cntr[1]))
+        p, q = self.point(ps), self.point(pe)
+        self._add_entity(eid, 'arc', (c, r, p, q))
+        # keep arc end points on its circle
+        self.add_constraint(OnCircle(p, c, r), solve=False)
+        self.add_constraint(OnCircle(q, c, r), solve=False)
+        return eid
+
+    def remove_entity(self, eid):
+        """Remove entity and any constraints on variables no other entity
+        uses. Only the entity's own variables are visited."""
+        typ, data = self.entities.pop(eid)
+        for v in set(self.entity_vars(eid, data=(typ, data))):
+            self.varRefs[v] -= 1
+            if not self.varRefs[v]:
+                del self.varRefs[v]
+                for cid in list(self.varConstraints.get(v, ())):
+                    self.remove_constraint(cid)
+        self._components = None
+
+    def entity_vars(self, eid, data=None):
+        """Return list of variable indexes of entity eid."""
+        typ, data = data or self.entities[eid]
+        if typ == 'line':
+            p, q = data
+            return p + q
+        if typ == 'circ':
+            c, r = data
+            return c + [r]
+        c, r, p, q = data
+        return c + [r] + p + q
+
+    def entity_values(self, eid):
+        """Return (type, current values) of entity eid.
+
+        line: (p1, p2), circ: (cntr, rad), arc: (cntr, ps, pe)"""
+        typ, data = self.entities[eid]
+        if typ == 'line':
+            p, q = data
+            return typ, (self.pnt(p), self.pnt(q))
+        if typ == 'circ':
+            c, r = data
+            return typ, (self.pnt(c), self.x[r])
+        c, r, p, q = data
+        return typ, (self.pnt(c), self.pnt(p), self.pnt(q))
+
+    # =======================================================================
+    # Constraints
+    # =======================================================================
+
+    def add_constraint(self, constraint, solve=True):
+        """Add constraint. Return (cid, set of eids changed by solving)."""
+        cid = self._newId()
+        self.constraints[cid] = constraint
+        for v in constraint.vars:
+            self.varConstraints[v].add(cid)
+        self._components = None
+        changed = self.solve(constraint.vars) if solve else set()
+        return cid, changed
+
+    def remove_constraint(self, cid):
+        constraint = self.constraints.pop(cid, None)
+        if constraint:
+            for v in constraint.vars:
+                cids = self.varConstraints[v]
+                cids.discard(cid)
+                if not cids:
+                    del self.varConstraints[v]
+        self._components = None
+
+    def set_value(self, cid, value):
+        """Change value of constraint cid (such as a distance) and re-solve
+        its component. Return set of eids changed."""
+        constraint = self.constraints[cid]
+        constraint.value = value
+        return self.solve(constraint.vars)
+
+    def find_constraint(self, cls, varIds):
+        """Return cid of constraint of class cls on varIds, if any."""
+        varIds = list(varIds)
+        for cid in self.varConstraints.get(varIds[0], ()):
+            constraint = self.constraints[cid]
+            if isinstance(constraint, cls) and constraint.vars == varIds:
+                return cid
+
+    # =======================================================================
+    # Solver
+    # =======================================================================
+
+    def components(self):
+        """Return {var: component nmbr} of constraint graph (union-find)."""
+        if self._components is None:
+            parent = list(range(len(self.x)))
+
+            def find(v):
+                while parent[v] != v:
+                    parent[v] = parent[parent[v]]
+                    v = parent[v]
+                return v
+
+            for constraint in self.constraints.values():
+                v0 = find(constraint.vars[0])
+                for v in constraint.vars[1:]:
+                    parent[find(v)] = v0
+            self._components = {v: find(v) for v in range(len(self.x))}
+        return self._components
+
+    def solve(self, varIds=None):
+        """Solve the component(s) containing varIds (all if None).
+
+        Return set of eids of entities whose values changed."""
+        t0 = time.perf_counter()
+        comps = self.components()
+        if varIds is None:
+            active = set(comps.values())
+        else:
+            active = {comps[v] for v in varIds}
+        constraints = [c for c in self.constraints.values()
+                       if comps[c.vars[0]] in active]
+        solveVars = sorted({v for c in constraints for v in c.vars})
+        before = [self.x[v] for v in solveVars]
+        iterations, error = self._newton(constraints, solveVars)
+        changedVars = {v for v, b in zip(solveVars, before)
+                       if abs(self.x[v] - b) > self.accuracy / 10}
+        changed = {eid for eid in self.entities
+                   if changedVars.intersection(self.entity_vars(eid))}
+        if changedVars:
+            self.pointDict = None
+        self.solveStats = {'vars': len(solveVars),
+                           'constraints': len(constraints),
+                           'iterations': iterations,
+                           'error': error,
+                           'time': time.perf_counter() - t0}
+        return changed
+
+    def _newton(self, constraints, solveVars):
+        """Damped Newton (Levenberg-Marquardt) iterations on solveVars.
+
+        Return (iterations, residual norm)."""
+        x = self.x
+        local = {v: i for i, v in enumerate(solveVars)}
+        n = len(solveVars)
+        lam = 1e-3
+
+        def evaluate():
+            res = []
+            for c in constraints:
+                res.extend(c.residuals(x))
+            return res
+
+        res = evaluate()
+        err = math.sqrt(sum(r*r for r in res))
+        iterations = 0
+        while err > SOLVE_TOL and iterations < MAX_ITER:
+            iterations += 1
+            rows = []  # sparse jacobian [{local var: deriv}]
+            for c in constraints:
+                for row in c.jacobian(x):
+                    rows.append({local[v]: d for v, d in row.items()})
+            grad = [0.0] * n  # J' r
+            for row, r in zip(rows, res):
+                for i, d in row.items():
+                    grad[i] += d * r
+            improved = False
+            while lam < 1e12:
+                step = _solve_normal(rows, grad, lam, n)
+                save = [x[v] for v in solveVars]
+                for v, s in zip(solveVars, step):
+                    x[v] -= s
+                newRes = evaluate()
+                newErr = math.sqrt(sum(r*r for r in newRes))
+                if newErr < err:
+                    res, err = newRes, newErr
+                    lam = max(lam / 10, 1e-12)
+                    improved = True
+                    break
+                for v, s in zip(solveVars, save):
+                    x[v] = s
+                lam *= 10
+            if not improved:
+                break  # can't reduce error further (over-constrained?)
+        return iterations, err
+
+
+def _solve_normal(rows, b, lam, n):
+    """Solve (J'J + lam*I) s = b, J given as sparse rows [{col: value}].
+
+    The (sparse, symmetric positive definite) matrix is reordered by
+    reverse Cuthill-McKee to keep its profile narrow, then factored by
+    envelope Cholesky. For sketches, where each variable only interacts
+    with a few neighbors, this is close to linear in n. Return s."""
+    A = [dict() for __ in range(n)]
+    for row in rows:
+        for i, di in row.items():
+            Ai = A[i]
+            for j, dj in row.items():
+                Ai[j] = Ai.get(j, 0.0) + di * dj
+    for i in range(n):
+        A[i][i] = A[i].get(i, 0.0) * (1 + lam) + lam
+
+    # reverse Cuthill-McKee ordering
+    order = []
+    seen = [False] * n
+    for start in sorted(range(n), key=lambda i: len(A[i])):
+        if seen[start]:
+            continue
+        seen[start] = True
+        queue = [start]
+        for i in queue:
+            order.append(i)
+            nbrs = [j for j in A[i] if not seen[j]]
+            nbrs.sort(key=lambda j: len(A[j]))
+            for j in nbrs:
+                seen[j] = True
+            queue.extend(nbrs)
+    order.reverse()
+    new = [0] * n  # {old index: new index}
+    for k, i in enumerate(order):
+        new[i] = k
+
+    # envelope Cholesky factorization (L L' = A)
+    first = [min(new[j] for j in A[i]) for i in order]
+    L = []
+    for i in range(n):
+        Ai = {new[j]: v for j, v in A[order[i]].items()}
+        fi = first[i]
+        Li = [0.0] * (i - fi + 1)
+        for j in range(fi, i + 1):
+            fj = first[j]
+            Lj = L[j] if j < i else Li
+            lo = max(fi, fj)
+            t = Ai.get(j, 0.0) - sum(Li[c - fi] * Lj[c - fj]
+                                     for c in range(lo, j))
+            if j < i:
+                Li[j - fi] = t / Lj[j - fj]
+            else:
+                Li[i - fi] = math.sqrt(max(t, 1e-30))
+        L.append(Li)
+
+    # forward & back substitution
+    y = [b[i] for i in order]
+    for i in range(n):
+        fi = first[i]
+        Li = L[i]
+        y[i] = (y[i] - sum(Li[c - fi] * y[c] for c in range(fi, i))) / Li[-1]
+    for i in reversed(range(n)):
+        y[i] /= L[i][-1]
+        fi = first[i]
+        Li = L[i]
+        for c in range(fi, i):
+            y[c] -= Li[c - fi] * y[i]
+    return [y[new[i]] for i in range(n)]
@@ -21,24 +21,49 @@
 # 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 #
 
+from collections import defaultdict
+import heapq
 import math
+import os.path
+import struct
 
+from OCC.Core.BRep import BRep_Builder
+from OCC.Core.BRepAdaptor import BRepAdaptor_Curve, BRepAdaptor_Surface
 from OCC.Core.BRepBuilderAPI import (BRepBuilderAPI_MakeEdge,
                                      BRepBuilderAPI_MakeFace,
+                                     BRepBuilderAPI_MakeVertex,
                                      BRepBuilderAPI_MakeWire)
 from OCC.Core.BRepGProp import brepgprop_SurfaceProperties
+from OCC.Core.BRepOffsetAPI import BRepOffsetAPI_MakeOffset
+from OCC.Core.BRepTools import breptools_UVBounds
 from OCC.Core.GC import GC_MakeArcOfCircle, GC_MakeSegment
 from OCC.Core.Geom import Geom_Circle, Geom_Line, Geom_Plane
 from OCC.Core.Geom2d import Geom2d_Circle, Geom2d_Line
 from OCC.Core.Geom2dAPI import Geom2dAPI_InterCurveCurve
-from OCC.Core.gp import (gp_Ax2, gp_Ax2d, gp_Ax3, gp_Circ2d, gp_Dir, gp_Dir2d,
-                         gp_Lin2d, gp_Pln, gp_Pnt, gp_Pnt2d, gp_Trsf, gp_Vec)
+from OCC.Core.GeomAbs import (GeomAbs_Arc, GeomAbs_Circle,
+                              GeomAbs_Intersection, GeomAbs_Line,
+                              GeomAbs_Plane, GeomAbs_Tangent)
+from OCC.Core.gp import (gp_Ax1, gp_Ax2, gp_Ax2d, gp_Ax3, gp_Circ2d, gp_Dir,
+                         gp_Dir2d, gp_Lin2d, gp_Pln, gp_Pnt, gp_Pnt2d, gp_Trsf,
+                         gp_Vec)
 from OCC.Core.GProp import GProp_GProps
-from OCC.Core.TopTools import TopTools_ListOfShape
+from OCC.Core.ShapeFix import ShapeFix_Face
+from OCC.Core.TopAbs import TopAbs_FORWARD, TopAbs_REVERSED
+from OCC.Core.TopLoc import TopLoc_Location
+from OCC.Core.TopoDS import TopoDS_Compound
 
 from OCCUtils.Construct import face_normal
+from OCCUtils.Topology import Topo
+import sketchsolver
 
 INFINITY = 1e+10  # mm (on the order of Earth's diameter)
+CLINE_EXTENT = 5e+5  # mm, clines are displayed clipped to +/- this
+WP_FILE_MAGIC = b"KWP1"  # first bytes of workplane file
+WP_FILE_EXT = ".kwp"  # workplane file extension
+EDGE_LINE, EDGE_CIRC, EDGE_ARC = 0, 1, 2  # profile edge record types
+EDGE_NBR_PARAMS = {EDGE_LINE: 4, EDGE_CIRC: 3, EDGE_ARC: 6}
+OFFSET_JOINS = {"arc": GeomAbs_Arc, "tangent": GeomAbs_Tangent,
+                "intersection": GeomAbs_Intersection}  # offset corner types
 
 # ===========================================================================
 #
@@ -89,6 +114,32 @@ def pnt_in_box_p(pnt, box):
         return True
 
 
+def cline_in_box_p(cline, box):
+    """Return True if cline passes through box.
+
+    The line misses the box only if all 4 corners lie on the same side."""
+    a, b, c = cline
+    x1, y1, x2, y2 = box
+    sides = [a*x + b*y + c for x, y in ((x1, y1), (x2, y1), (x2, y2), (x1, y2))]
+    if min(sides) <= 0 <= max(sides):
+        return True
+
+
+def circ_in_box_p(circ, box):
+    """Return True if bounding box of circ overlaps box."""
+    (xc, yc), r = circ
+    x1, y1, x2, y2 = box
+    if xc + r >= x1 and xc - r <= x2 and yc + r >= y1 and yc - r <= y2:
+        return True
+
+
+def cline_circ_dist(cline, circ):
+    """Return distance from cline to center of circ."""
+    a, b, c = cline
+    (xc, yc), r = circ
+    return abs(a*xc + b*yc + c) / math.sqrt(a**2 + b**2)
+
+
 def midpoint(p1, p2, f=.5):
     """Return point part way (f=.5 by def) between points p1 and p2."""
     return (((p2[0]-p1[0])*f)+p1[0], ((p2[1]-p1[1])*f)+p1[1])
@@ -368,6 +419,70 @@ def line_tan_to_2circs(circ1, circ2):
     return (p1, p2)
 
 
+def cline_key(cline, tol):
+    """Return hashable key of cline, the same for all (scaled) clines
+    which coincide within tol."""
+    a, b, c = cline
+    n = math.hypot(a, b)
+    a, b, c = a/n, b/n, c/n
+    if a < -tol or (a <= tol and b < 0):
+        a, b, c = -a, -b, -c
+    return (round(a / tol), round(b / tol), round(c / tol))
+
+
+def para_clines(cline, dists):
+    """Return list of clines parallel to cline, straddling it at each of
+    the offset distances in dists."""
+    a, b, c = cline
+    n = math.hypot(a, b)
+    return [(a, b, c + s*n*d) for d in dists for s in (1, -1)]
+
+
+def perp_clines(cline, pts):
+    """Return list of clines perpendicular to cline through each of pts."""
+    a, b, c = cline
+    return [(b, -a, a*y - b*x) for x, y in pts]
+
+
+def tan_clines(circs, pts):
+    """Return list of clines through each of pts tangent to each of circs.
+
+    Points inside a circle have no tangent lines to it."""
+    clines = []
+    for circ in circs:
+        (cx, cy), r = circ
+        for p in pts:
+            if p2p_dist(p, (cx, cy)) > r:
+                for tp in line_tan_to_circ(circ, p):
+                    clines.append(cnvrt_2pts_to_coef(p, tp))
+    return clines
+
+
+def tan2_clines(circs):
+    """Return list of clines tangent to every pair of circs.
+
+    Each pair of circles has up to 4 common tangent lines (2 outer and
+    2 inner). With (a, b) a unit vector, a tangent line ax + by + c = 0 is
+    at signed distances r1 and s*r2 from the 2 centers, so (a, b) is at
+    angle acos((s*r2 - r1)/d) to the line of centers (d apart)."""
+    clines = []
+    for i, ((x1, y1), r1) in enumerate(circs):
+        for (x2, y2), r2 in circs[i+1:]:
+            d = p2p_dist((x1, y1), (x2, y2))
+            if not d:
+                continue  # concentric
+            phi = math.atan2(y2 - y1, x2 - x1)
+            for s in (1, -1):
+                k = (s*r2 - r1) / d
+                if abs(k) > 1:
+                    continue  # one circle inside (or overlapping) the other
+                alpha = math.acos(k)
+                for theta in (phi + alpha, phi - alpha):
+                    a, b = math.cos(theta), math.sin(theta)
+                    clines.append((a, b, r1 - a*x1 - b*y1))
+    return clines
+
+
 def angled_cline(pt, angle):
     """Return cline through pt at angle (degrees)"""
     ang = angle * math.pi / 180
@@ -403,6 +518,25 @@ def pt_on_RHS_p(pt, p0, p1):
             return True
 
 
+def polygon_area(pts):
+    """Return signed area of closed polygon pts (positive if CCW)."""
+    area = 0
+    for (x1, y1), (x2, y2) in zip(pts, pts[1:] + pts[:1]):
+        area += x1*y2 - x2*y1
+    return area / 2
+
+
+def pnt_in_polygon_p(pnt, pts):
+    """Return True if pnt is inside closed polygon pts (ray casting)."""
+    x, y = pnt
+    inside = False
+    for (x1, y1), (x2, y2) in zip(pts, pts[1:] + pts[:1]):
+        if (y1 > y) != (y2 > y):
+            if x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+    return inside
+
+
 def rotate_pt(pt, ang, ctr):
     """Return coordinates of pt rotated ang (deg) CCW about ctr.
     This is a 3-step process:
@@ -415,9 +549,836 @@ def rotate_pt(pt, ang, ctr):
     v = y * math.cos(A) + x * math.sin(A)
     return add_pt((u, v), ctr)
 
+
+# ===========================================================================
+#
+# Profile validation
+# Profile edges are split into x-monotone 'pieces' (line segments and arcs
+# no more than a half circle, split at their leftmost & rightmost points).
+# A piece is a tuple (x1, y1, x2, y2, idx, circ, upper) with x1 <= x2, where
+# idx is the index of the edge it came from and circ is None for a line
+# or (cx, cy, r) for an arc on the upper (or lower) half of its circle.
+# Crossings are then found by sweeping a vertical line across the pieces
+# (Bentley-Ottmann), only ever testing pieces which are adjacent along the
+# sweep line, so the test takes O((n+k) log n) for n pieces & k crossings.
+#
 # ===========================================================================
 
 
+def edge_pieces(record, idx):
+    """Return list of x-monotone pieces of edge record (type, params)."""
+    typ, params = record
+    if typ == EDGE_LINE:
+        x1, y1, x2, y2 = params
+        if x1 > x2:
+            x1, y1, x2, y2 = x2, y2, x1, y1
+        return [(x1, y1, x2, y2, idx, None, False)]
+    if typ == EDGE_CIRC:
+        cx, cy, r = params
+        a1, a2 = 0, 2 * math.pi
+    else:
+        ps, pm, pe = params[:2], params[2:4], params[4:]
+        (cx, cy), r = cr_from_3p(ps, pm, pe)
+        angS, angM, angE = [math.atan2(y - cy, x - cx)
+                            for x, y in (ps, pm, pe)]
+        spanE = (angE - angS) % (2 * math.pi)
+        if (angM - angS) % (2 * math.pi) < spanE:  # CCW from start to end
+            a1, a2 = angS, angS + spanE
+        else:  # CCW from end to start
+            a1, a2 = angE, angE + 2 * math.pi - spanE
+    # split at multiples of pi (leftmost & rightmost points)
+    angs = [a1]
+    k = math.floor(a1 / math.pi) + 1
+    while k * math.pi < a2:
+        angs.append(k * math.pi)
+        k += 1
+    angs.append(a2)
+    pieces = []
+    for b1, b2 in zip(angs, angs[1:]):
+        if b2 - b1 < 1e-12:
+            continue
+        upper = math.sin((b1 + b2) / 2) > 0
+        pts = sorted((cx + r * math.cos(b), cy + r * math.sin(b))
+                     for b in (b1, b2))
+        (x1, y1), (x2, y2) = pts
+        pieces.append((x1, y1, x2, y2, idx, (cx, cy, r), upper))
+    return pieces
+
+
+def piece_y(piece, x):
+    """Return y value of piece at x (clamped to the x range of piece)."""
+    x1, y1, x2, y2, idx, circ, upper = piece
+    x = min(max(x, x1), x2)
+    if circ is None:
+        if x2 == x1:
+            return y1
+        return y1 + (y2 - y1) * (x - x1) / (x2 - x1)
+    cx, cy, r = circ
+    h = math.sqrt(max(r*r - (x - cx)**2, 0))
+    return cy + h if upper else cy - h
+
+
+def pnt_on_piece_p(pnt, piece, tol):
+    """Return True if pnt lies on piece (within tol)."""
+    x, y = pnt
+    x1, y1, x2, y2, idx, circ, upper = piece
+    if not x1 - tol <= x <= x2 + tol:
+        return False
+    if circ is None:
+        dx, dy = x2 - x1, y2 - y1
+        lsq = dx*dx + dy*dy
+        u = ((x - x1)*dx + (y - y1)*dy) / lsq if lsq else 0
+        u = min(max(u, 0), 1)
+        return p2p_dist(pnt, (x1 + u*dx, y1 + u*dy)) <= tol
+    cx, cy, r = circ
+    if abs(p2p_dist(pnt, (cx, cy)) - r) > tol:
+        return False
+    return y >= cy - tol if upper else y <= cy + tol
+
+
+def seg_seg_inters(p1, p2, p3, p4, tol):
+    """Return list of intersection pts of segments p1-p2 and p3-p4.
+
+    If the segments are collinear, return the end points of their overlap."""
+    d1 = sub_pt(p2, p1)
+    d2 = sub_pt(p4, p3)
+    denom = d1[0]*d2[1] - d1[1]*d2[0]
+    len1, len2 = p2p_dist(p1, p2), p2p_dist(p3, p4)
+    if abs(denom) <= tol * max(len1 * len2, tol):  # parallel
+        line = cnvrt_2pts_to_coef(p1, p2)
+        if len1 and p2p_dist(proj_pt_on_line(line, p3), p3) > tol:
+            return []
+        return [p1, p2, p3, p4]  # caller keeps those on both
+    d3 = sub_pt(p3, p1)
+    u = (d3[0]*d2[1] - d3[1]*d2[0]) / denom
+    return [(p1[0] + u*d1[0], p1[1] + u*d1[1])]
+
+
+def piece_inters(pc1, pc2, tol):
+    """Return list of pts (within tol) where pieces pc1 & pc2 intersect."""
+    if pc1[5] is not None and pc2[5] is None:
+        pc1, pc2 = pc2, pc1  # line first
+    xa1, ya1, xa2, ya2, idx1, circ1, upper1 = pc1
+    xb1, yb1, xb2, yb2, idx2, circ2, upper2 = pc2
+    if circ1 is None and circ2 is None:
+        pts = seg_seg_inters((xa1, ya1), (xa2, ya2), (xb1, yb1), (xb2, yb2),
+                             tol)
+    elif circ1 is None:
+        cx, cy, r = circ2
+        pts = seg_circ_inters(xa1, ya1, xa2, ya2, cx, cy, r) or []
+    else:
+        (cx1, cy1, r1), (cx2, cy2, r2) = circ1, circ2
+        if (p2p_dist((cx1, cy1), (cx2, cy2)) <= tol and
+                abs(r1 - r2) <= tol):  # same circle: overlap end points
+            pts = [(xa1, ya1), (xa2, ya2), (xb1, yb1), (xb2, yb2)]
+        else:
+            pts = circ_circ_inters(((cx1, cy1), r1), ((cx2, cy2), r2))
+    return [p for p in pts
+            if pnt_on_piece_p(p, pc1, tol) and pnt_on_piece_p(p, pc2, tol)]
+
+
+def profile_crossings(records, tol):
+    """Find where profile edges cross or touch each other.
+
+    records is a list of edge records (type, params) (see edgeRecord).
+    Edges may only meet at end points they share with each other.
+    Return list of (i, j, (x, y)) with i < j indexes into records."""
+    jointTol = tol * 1000  # ignore 'crossings' this close to shared joints
+    ends = []  # [[(x, y)]] end points of each edge (none for circles)
+    pieces = []
+    for idx, record in enumerate(records):
+        typ, params = record
+        if typ == EDGE_LINE:
+            ends.append([params[:2], params[2:]])
+        elif typ == EDGE_ARC:
+            ends.append([params[:2], params[4:]])
+        else:
+            ends.append([])
+        pieces.extend(edge_pieces(record, idx))
+
+    crossings = {}  # {(i, j, (x, y) rounded): (x, y)}
+    intersDict = {}  # {(pid1, pid2): [(x, y)]} memo of piece_inters
+
+    def joint_p(pnt, i, j):
+        for p in ends[i]:
+            for q in ends[j]:
+                if (p2p_dist(p, q) <= tol and
+                        p2p_dist(p, pnt) <= jointTol):
+                    return True
+        return False
+
+    def inters(pid1, pid2):
+        key = (min(pid1, pid2), max(pid1, pid2))
+        if key not in intersDict:
+            pc1, pc2 = pieces[pid1], pieces[pid2]
+            i, j = sorted((pc1[4], pc2[4]))
+            pts = []
+            if i != j:
+                pts = [p for p in piece_inters(pc1, pc2, tol)
+                       if not joint_p(p, i, j)]
+                for p in pts:
+                    k = (round(p[0] / jointTol), round(p[1] / jointTol))
+                    crossings.setdefault((i, j, k), p)
+            intersDict[key] = pts
+        return intersDict[key]
+
+    # Events within tol of each other in x are ordered so that pieces which
+    # meet are all in status together: start, then vertical, then end.
+    events = []  # heap of (x, kind, pid or (pid, pid))
+    INTERS, START, VERT, END = range(4)  # order of events at same x
+    for pid, (x1, y1, x2, y2, idx, circ, upper) in enumerate(pieces):
+        if circ is None and x2 - x1 <= tol:
+            events.append((x1 + tol / 2, VERT, (min(y1, y2), pid)))
+        else:
+            events.append((x1, START, pid))
+            events.append((x2 + tol, END, pid))
+    heapq.heapify(events)
+    status = []  # active pids, ordered by y just to the right of sweep
+    h = tol * 10  # look-ahead distance for ordering pieces along sweep
+
+    def key(pid, x):
+        return piece_y(pieces[pid], x + h)
+
+    def bisect_y(y, x, yfunc):
+        lo, hi = 0, len(status)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if yfunc(status[mid], x) < y:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def position(pid, x):
+        i = bisect_y(key(pid, x), x, key)
+        for k in (i, i - 1, i + 1, i - 2, i + 2):
+            if 0 <= k < len(status) and status[k] == pid:
+                return k
+        return status.index(pid)
+
+    def check(k, x):
+        """Test the pieces at status[k] & status[k+1]."""
+        if 0 <= k and k + 1 < len(status):
+            pid1, pid2 = status[k], status[k+1]
+            for p in inters(pid1, pid2):
+                if p[0] > x - 2*h:  # (just behind sweep: re-check order now)
+                    event = (max(p[0] + h, x), INTERS, (pid1, pid2) + p)
+                    heapq.heappush(events, event)
+
+    def spanning(x, ylo, yhi):
+        """Return active pids with y values at x in range ylo to yhi."""
+        k = bisect_y(ylo, x, lambda pid, x: piece_y(pieces[pid], x))
+        pids = []
+        while k < len(status) and piece_y(pieces[status[k]], x) <= yhi:
+            pids.append(status[k])
+            k += 1
+        return pids
+
+    def check_point(pids, pnt):
+        """Test pids against all active pieces passing through pnt.
+
+        Where more than two pieces meet at a point, some of them may never
+        be adjacent along the sweep line."""
+        x, y = pnt
+        for other in spanning(x, y - jointTol, y + jointTol):
+            for pid in pids:
+                if other != pid:
+                    inters(pid, other)
+
+    verts = []  # [(x, yhi, pid)] vertical pieces which may overlap the next
+    while events:
+        x, kind, data = heapq.heappop(events)
+        if kind == START:
+            k = bisect_y(key(data, x), x, key)
+            status.insert(k, data)
+            check(k - 1, x)
+            check(k, x)
+            check_point([data], pieces[data][:2])
+        elif kind == END:
+            check_point([data], pieces[data][2:4])
+            k = position(data, x)
+            del status[k]
+            check(k - 1, x)
+        elif kind == INTERS:
+            pid1, pid2, px, py = data
+            if pid1 not in status or pid2 not in status:
+                continue
+            k = position(pid1, x)
+            if k and status[k-1] == pid2:
+                k -= 1
+            elif k + 1 == len(status) or status[k+1] != pid2:
+                continue  # no longer adjacent
+            check_point([pid1, pid2], (px, py))
+            lower, upper = status[k], status[k+1]
+            if key(lower, x) > key(upper, x):
+                status[k], status[k+1] = upper, lower
+                check(k - 1, x)
+                check(k + 1, x)
+        else:  # vertical piece: test all pieces it spans
+            ylo, vid = data
+            x1, y1, x2, y2 = pieces[vid][:4]
+            yhi = max(y1, y2)
+            for pid in spanning(x1, ylo - tol, yhi + tol):
+                inters(vid, pid)
+            # verticals at the same x arrive in order of ylo
+            verts = [v for v in verts
+                     if x1 - v[0] <= tol and v[1] >= ylo - tol]
+            for v in verts:
+                inters(vid, v[2])
+            verts.append((x1, yhi, vid))
+    return [(i, j, p) for (i, j, k), p in crossings.items()]
+
+
+# ===========================================================================
+#
+# Planar arrangement
+# Profile edges are split at every point where they meet, giving a planar
+# graph of 'sub-edges'. Tracing round the graph, always turning onto the
+# next sub-edge clockwise at each node, gives closed cycles. CCW cycles
+# bound the regions enclosed by the profile. Each CW cycle runs round the
+# outside of a connected group of edges, which is a hole in the smallest
+# region around it. Intersections are found as each edge is added (against
+# the edges already there), so only the graph tracing is redone when the
+# regions are next needed.
+# A curve is a line (x1, y1, x2, y2) with param t from 0 to 1, or an arc
+# (cx, cy, r, a1, span, closed) with param t (angle CCW from a1) from 0 to
+# span. A sub-edge is (curve, t1, t2, node1, node2).
+#
+# ===========================================================================
+
+
+def record_curve(record):
+    """Return curve of edge record (type, params), else None."""
+    typ, params = record
+    if typ == EDGE_LINE:
+        return tuple(params)
+    if typ == EDGE_CIRC:
+        cx, cy, r = params
+        return (cx, cy, r, 0.0, 2 * math.pi, True)
+    ps, pm, pe = params[:2], params[2:4], params[4:]
+    cr = cr_from_3p(ps, pm, pe)
+    if not cr:
+        return None
+    (cx, cy), r = cr
+    angS, angM, angE = [math.atan2(y - cy, x - cx) for x, y in (ps, pm, pe)]
+    span = (angE - angS) % (2 * math.pi)
+    if (angM - angS) % (2 * math.pi) < span:  # CCW from start to end
+        return (cx, cy, r, angS, span, False)
+    return (cx, cy, r, angE, 2 * math.pi - span, False)
+
+
+def curve_point(curve, t):
+    """Return point (x, y) at param t of curve."""
+    if len(curve) == 4:
+        x1, y1, x2, y2 = curve
+        return (x1 + (x2 - x1) * t, y1 + (y2 - y1) * t)
+    cx, cy, r, a1 = curve[:4]
+    return (cx + r * math.cos(a1 + t), cy + r * math.sin(a1 + t))
+
+
+def curve_param(curve, pnt):
+    """Return param of pnt (on curve), clamped to the ends of curve."""
+    x, y = pnt
+    if len(curve) == 4:
+        x1, y1, x2, y2 = curve
+        dx, dy = x2 - x1, y2 - y1
+        t = ((x - x1) * dx + (y - y1) * dy) / (dx*dx + dy*dy)
+        return min(max(t, 0.0), 1.0)
+    cx, cy, r, a1, span, closed = curve
+    t = (math.atan2(y - cy, x - cx) - a1) % (2 * math.pi)
+    if t > span:  # just off one end of arc
+        return span if t - span < 2 * math.pi - t else 0.0
+    return t
+
+
+def curve_scale(curve):
+    """Return length of curve per unit param."""
+    if len(curve) == 4:
+        x1, y1, x2, y2 = curve
+        return math.hypot(x2 - x1, y2 - y1)
+    return curve[2]
+
+
+def curve_box(curve):
+    """Return bounding box (x1, y1, x2, y2) of curve (of its full circle
+    if an arc)."""
+    if len(curve) == 4:
+        x1, y1, x2, y2 = curve
+        return (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+    cx, cy, r = curve[:3]
+    return (cx - r, cy - r, cx + r, cy + r)
+
+
+def sub_edge_pts(subEdge, reverse=False):
+    """Return list of pts along sub-edge (not including its last pt)."""
+    curve, t1, t2 = subEdge[:3]
+    if reverse:
+        t1, t2 = t2, t1
+    if len(curve) == 4:
+        return [curve_point(curve, t1)]
+    n = max(2, math.ceil(abs(t2 - t1) / (math.pi / 18)))
+    return [curve_point(curve, t1 + (t2 - t1) * i / n) for i in range(n)]
+
+
+def sub_edge_record(subEdge, reverse=False):
+    """Return edge record (type, params) of sub-edge."""
+    curve, t1, t2, n1, n2 = subEdge
+    if reverse:
+        t1, t2 = t2, t1
+    ps, pe = curve_point(curve, t1), curve_point(curve, t2)
+    if len(curve) == 4:
+        return (EDGE_LINE, ps + pe)
+    if n1 == n2:  # full circle
+        return (EDGE_CIRC, curve[:3])
+    return (EDGE_ARC, ps + curve_point(curve, (t1 + t2) / 2) + pe)
+
+
+class Arrangement():
+    """Planar arrangement of profile edges (see above).
+
+    Edges are added & removed by key. The regions are traced when next
+    needed after a change."""
+
+    def __init__(self, tol):
+        self.tol = tol
+        self.curves = {}  # {key: curve}
+        self.pieces = {}  # {key: [x-monotone pieces (see edge_pieces)]}
+        self.boxes = {}  # {key: bounding box}
+        self.cuts = {}  # {key: {other key: [params on curve of key]}}
+        self.subEdges = []
+        self.nodePts = []  # [(x, y)] indexed by node nmbr
+        self.cycles = []  # [[half-edge, ...]] half-edge = 2*sub-edge(+1)
+        self.regions = None  # [(cycle, [hole cycles])], None if stale
+        self.faces = []  # [(box, area, polygon, component)] of regions
+        self.faceGrid = {}  # {(i, j): [face nmbrs]} of face boxes
+        self.cell = 1.0  # size of faceGrid cells
+
+    def add(self, key, record):
+        """Add edge record (type, params) with key."""
+        curve = record_curve(record)
+        if not curve or curve_scale(curve) <= self.tol:
+            return
+        tol = self.tol
+        pieces = edge_pieces(record, key)
+        box = curve_box(curve)
+        cuts = {}
+        for other, obox in self.boxes.items():
+            if (box[0] > obox[2] + tol or obox[0] > box[2] + tol or
+                    box[1] > obox[3] + tol or obox[1] > box[3] + tol):
+                continue
+            pts = [pnt for pc1 in pieces for pc2 in self.pieces[other]
+                   for pnt in piece_inters(pc1, pc2, tol)]
+            if pts:
+                cuts[other] = [curve_param(curve, pnt) for pnt in pts]
+                self.cuts[other][key] = [curve_param(self.curves[other], pnt)
+                                         for pnt in pts]
+        self.curves[key] = curve
+        self.pieces[key] = pieces
+        self.boxes[key] = box
+        self.cuts[key] = cuts
+        self.regions = None
+
+    def remove(self, key):
+        """Remove edge with key (if present)."""
+        if key not in self.curves:
+            return
+        for other in self.cuts.pop(key):
+            del self.cuts[other][key]
+        del self.curves[key], self.pieces[key], self.boxes[key]
+        self.regions = None
+
+    def split(self):
+        """Split curves at their cuts into sub-edges (merging end points
+        into nodes). Duplicate (overlapping) sub-edges are dropped."""
+        tol = self.tol
+        nodeDict = {}  # {hash key: node nmbr}
+        self.nodePts = nodePts = []
+
+        def node(pnt):
+            i, j = (round(pnt[0] / tol), round(pnt[1] / tol))
+            for key in ((i+m, j+n) for m in (0, -1, 1) for n in (0, -1, 1)):
+                if key in nodeDict:
+                    return nodeDict[key]
+            nodeDict[(i, j)] = len(nodePts)
+            nodePts.append(pnt)
+            return nodeDict[(i, j)]
+
+        subEdges = []
+        seen = set()
+        for key, curve in self.curves.items():
+            scale = curve_scale(curve)
+            closed = len(curve) == 6 and curve[5]
+            end = 1.0 if len(curve) == 4 else curve[4]
+            params = sorted(t for ts in self.cuts[key].values() for t in ts)
+            ts = [params[0] if closed and params else 0.0]
+            for t in params:
+                if (t - ts[-1]) * scale > tol:
+                    ts.append(t)
+            if closed:
+                if len(ts) > 1 and (ts[0] + end - ts[-1]) * scale <= tol:
+                    ts.pop()
+                ts.append(ts[0] + end)
+            elif (end - ts[-1]) * scale > tol:
+                ts.append(end)
+            else:
+                ts[-1] = end
+            for t1, t2 in zip(ts, ts[1:]):
+                n1 = node(curve_point(curve, t1))
+                n2 = node(curve_point(curve, t2))
+                if n1 == n2 and len(ts) > 2:
+                    continue  # degenerate
+                xm, ym = curve_point(curve, (t1 + t2) / 2)
+                dupKey = (min(n1, n2), max(n1, n2),
+                          round(xm / tol / 1000), round(ym / tol / 1000))
+                if dupKey not in seen:
+                    seen.add(dupKey)
+                    subEdges.append((curve, t1, t2, n1, n2))
+        # prune sub-edges hanging from nodes where only one sub-edge ends
+        edgesAtNode = defaultdict(set)
+        degree = defaultdict(int)
+        for k, (curve, t1, t2, n1, n2) in enumerate(subEdges):
+            for n in (n1, n2):
+                edgesAtNode[n].add(k)
+                degree[n] += 1
+        hanging = [n for n, d in degree.items() if d == 1]
+        pruned = set()
+        while hanging:
+            n = hanging.pop()
+            if degree[n] != 1:
+                continue
+            k = edgesAtNode[n].pop()
+            pruned.add(k)
+            for m in subEdges[k][3:]:
+                edgesAtNode[m].discard(k)
+                degree[m] -= 1
+                if degree[m] == 1:
+                    hanging.append(m)
+        self.subEdges = [subEdge for k, subEdge in enumerate(subEdges)
+                         if k not in pruned]
+
+    def half_edge_angle(self, h):
+        """Return direction (angle) in which half-edge h leaves its node.
+
+        Found from a point a short, fixed distance along the sub-edge, so
+        tangent arcs are ordered by curvature."""
+        curve, t1, t2, n1, n2 = self.subEdges[h // 2]
+        d = min(self.tol * 1000 / curve_scale(curve), (t2 - t1) / 2)
+        if h % 2:
+            p0, p1 = curve_point(curve, t2), curve_point(curve, t2 - d)
+        else:
+            p0, p1 = curve_point(curve, t1), curve_point(curve, t1 + d)
+        return math.atan2(p1[1] - p0[1], p1[0] - p0[0])
+
+    def build(self):
+        """Trace the cycles of the sub-edge graph and find the regions."""
+        self.split()
+        subEdges = self.subEdges
+        nbrHalfEdges = 2 * len(subEdges)
+        outgoing = defaultdict(list)  # {node: [half-edges leaving node]}
+        for h in range(nbrHalfEdges):
+            outgoing[subEdges[h // 2][3 + h % 2]].append(h)
+        position = {}  # {half-edge: position in CCW order round its node}
+        for hs in outgoing.values():
+            hs.sort(key=self.half_edge_angle)
+            for i, h in enumerate(hs):
+                position[h] = i
+
+        def dest(h):
+            return subEdges[h // 2][4 - h % 2]
+
+        # connected components (for finding which cycles are holes)
+        comp = list(range(len(self.nodePts)))
+
+        def find(n):
+            while comp[n] != n:
+                comp[n] = comp[comp[n]]
+                n = comp[n]
+            return n
+
+        for curve, t1, t2, n1, n2 in subEdges:
+            comp[find(n1)] = find(n2)
+
+        # trace cycles, turning onto the next half-edge clockwise each time
+        self.cycles = []
+        self.faces = []  # [(box, area, polygon, component)] of CCW cycles
+        faceCycles = []  # [cycle nmbr] of self.faces
+        outsides = []  # [(cycle nmbr, component)] of CW cycles
+        used = set()
+        for h0 in range(nbrHalfEdges):
+            if h0 in used:
+                continue
+            cycle = []
+            h = h0
+            while h not in used:
+                used.add(h)
+                cycle.append(h)
+                hs = outgoing[dest(h)]
+                h = hs[position[h ^ 1] - 1]
+            poly = [pnt for h in cycle
+                    for pnt in sub_edge_pts(subEdges[h // 2], h % 2)]
+            area = polygon_area(poly)
+            length = sum(p2p_dist(p1, p2)
+                         for p1, p2 in zip(poly, poly[1:] + poly[:1]))
+            if abs(area) <= self.tol * length:
+                continue  # sliver
+            self.cycles.append(cycle)
+            if area > 0:
+                xs = [x for x, y in poly]
+                ys = [y for x, y in poly]
+                box = (min(xs), min(ys), max(xs), max(ys))
+                self.faces.append((box, area, poly, find(dest(h0))))
+                faceCycles.append(len(self.cycles) - 1)
+            else:
+                outsides.append((len(self.cycles) - 1, find(dest(h0))))
+        self.grid_faces()
+        holes = defaultdict(list)  # {face nmbr: [hole cycles]}
+        for c, component in outsides:
+            pnt = self.nodePts[dest(self.cycles[c][0])]
+            i = self.face_at(pnt, component)
+            if i is not None:
+                holes[i].append(self.cycles[c])
+        self.regions = [(self.cycles[c], holes[i])
+                        for i, c in enumerate(faceCycles)]
+
+    def grid_faces(self):
+        """Bin faces by their bounding boxes into a uniform grid, with
+        cells the size of an average face box."""
+        self.faceGrid = defaultdict(list)
+        if not self.faces:
+            return
+        boxArea = sum((x2 - x1) * (y2 - y1)
+                      for (x1, y1, x2, y2), *rest in self.faces)
+        self.cell = math.sqrt(boxArea / len(self.faces)) or 1.0
+        for i, ((x1, y1, x2, y2), *rest) in enumerate(self.faces):
+            for m in range(math.floor(x1 / self.cell),
+                           math.floor(x2 / self.cell) + 1):
+                for n in range(math.floor(y1 / self.cell),
+                               math.floor(y2 / self.cell) + 1):
+                    self.faceGrid[(m, n)].append(i)
+
+    def face_at(self, pnt, component=None):
+        """Return nmbr of smallest face containing pnt, else None.
+
+        Faces of component are skipped (pnt is on them, not in them)."""
+        x, y = pnt
+        best = None
+        bestArea = None
+        key = (math.floor(x / self.cell), math.floor(y / self.cell))
+        for i in self.faceGrid.get(key, ()):
+            (x1, y1, x2, y2), area, poly, comp = self.faces[i]
+            if not (x1 <= x <= x2 and y1 <= y <= y2):
+                continue
+            if comp == component or (best is not None and area >= bestArea):
+                continue
+            if pnt_in_polygon_p(pnt, poly):
+                best, bestArea = i, area
+        return best
+
+    def get_regions(self):
+        """Return list of regions [(cycle, [hole cycles])] (up to date)."""
+        if self.regions is None:
+            self.build()
+        return self.regions
+
+    def region_at(self, pnt):
+        """Return index of region containing pnt (x, y), else None."""
+        self.get_regions()
+        return self.face_at(pnt)
+
+    def region_records(self, idx):
+        """Return (outer records, [hole records]) of region idx."""
+        outer, holes = self.get_regions()[idx]
+        records = [[sub_edge_record(self.subEdges[h // 2], h % 2)
+                    for h in cycle] for cycle in [outer] + holes]
+        return records[0], records[1:]
+
+# ===========================================================================
+
+
+class SnapIndex():
+    """Uniform grid index of 2D points, for fast nearest point (snap) queries.
+
+    Points are binned into square cells of size self.cell. A query only
+    needs to look at the few cells within snap tolerance of the cursor."""
+
+    def __init__(self, points, cell=None):
+        self.points = list(points)
+        if not cell:
+            # size cells so that (on average) each holds about one point
+            if len(self.points) > 1:
+                xs = [x for x, y in self.points]
+                ys = [y for x, y in self.points]
+                area = (max(xs) - min(xs)) * (max(ys) - min(ys))
+                cell = math.sqrt(area / len(self.points))
+            cell = cell or 1.0
+        self.cell = cell
+        self.cells = defaultdict(list)  # {(i, j): [(x, y), ...]}
+        for pnt in self.points:
+            self.cells[self.key(pnt)].append(pnt)
+
+    def key(self, pnt):
+        """Return (i, j) key of cell containing pnt."""
+        return (math.floor(pnt[0] / self.cell), math.floor(pnt[1] / self.cell))
+
+    def nearest(self, pnt, tol):
+        """Return indexed point nearest to pnt and within distance tol.
+
+        Return None if there is no point within tol."""
+        i0, j0 = self.key(pnt)
+        n = math.ceil(tol / self.cell)
+        if (2*n + 1)**2 > len(self.cells):
+            candidates = self.points  # cheaper to just check them all
+        else:
+            candidates = [p for i in range(i0 - n, i0 + n + 1)
+                          for j in range(j0 - n, j0 + n + 1)
+                          for p in self.cells.get((i, j), ())]
+        best = None
+        for p in candidates:
+            d = p2p_dist(pnt, p)
+            if d <= tol:
+                tol = d
+                best = p
+        return best
+
+
+class EdgeRegistry():
+    """Profile edges (in the order added) indexed for lookup by shape.
+
+    A shape picked in the viewer is matched by its hash (of TShape &
+    location) and then IsSame, so finding (or removing) an edge costs the
+    same however big the profile gets. Each entry also holds the sketch eid
+    the edge was built from (if any) and the AIS object displaying it (set
+    by MainWindow.draw_wp)."""
+
+    def __init__(self):
+        self.entries = {}  # {serial: [edge, eid, ais]} in order added
+        self.index = defaultdict(list)  # {hash(edge): [serial, ...]}
+        self.serial = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def edges(self):
+        """Return list of edges in the order added."""
+        return [entry[0] for entry in self.entries.values()]
+
+    def add(self, edge, eid=None):
+        """Add edge (of sketch entity eid). Return its serial."""
+        self.serial += 1
+        self.entries[self.serial] = [edge, eid, None]
+        self.index[hash(edge)].append(self.serial)
+        return self.serial
+
+    def find(self, shape):
+        """Return serial of edge which IsSame as shape, else None."""
+        for serial in self.index.get(hash(shape), ()):
+            if self.entries[serial][0].IsSame(shape):
+                return serial
+        return None
+
+    def remove(self, serial):
+        """Remove edge serial. Return its entry [edge, eid, ais]."""
+        entry = self.entries.pop(serial)
+        key = hash(entry[0])
+        self.index[key].remove(serial)
+        if not self.index[key]:
+            del self.index[key]
+        return entry
+
+    def replace(self, serial, edge):
+        """Replace edge serial by edge (keeping its place and eid).
+
+        Return the AIS object of the old edge (which is now out of date)."""
+        entry = self.entries[serial]
+        key = hash(entry[0])
+        self.index[key].remove(serial)
+        if not self.index[key]:
+            del self.index[key]
+        self.index[hash(edge)].append(serial)
+        ais = entry[2]
+        entry[0], entry[2] = edge, None
+        return ais
+
+
+# ===========================================================================
+#
+# Face placement
+# Putting a workplane on a face needs the face's centroid & normal. These
+# are cached by part uid & TShape, in the face's own (unlocated) coords,
+# so every located instance of a face shares one entry. A part's entries
+# are dropped when its shape is replaced (see DocModel.replace_shape).
+# Faces of no known part (uid None) aren't cached.
+#
+# ===========================================================================
+
+facePlacements = {}  # {uid: {hash: (bare face, centroid, normal, isPlanar)}}
+
+
+def plane_normal(surf):
+    """Return normal of planar surface (type <BRepAdaptor_Surface>), reversed
+    if its plane's axis is indirect, so it agrees with D1U x D1V."""
+    position = surf.Plane().Position()
+    normal = position.Direction()
+    if not position.Direct():
+        normal = normal.Reversed()
+    return normal
+
+
+def face_direction(face):
+    """Return normal (type <gp_Dir>) of face, such as the face giving the
+    U direction of a workplane. Only the normal is computed."""
+    surf = BRepAdaptor_Surface(face)
+    if surf.GetType() != GeomAbs_Plane:
+        return face_normal(face)  # (takes face orientation into account)
+    normal = plane_normal(surf)
+    if face.Orientation() == TopAbs_REVERSED:
+        normal = normal.Reversed()
+    return normal
+
+
+def face_placement_bldr(face):
+    """Return (centroid, normal, isPlanar) of unlocated forward face.
+
+    A planar face is placed without integrating its surface properties:
+    its normal is read from its plane and its centroid is taken at the
+    middle of its UV bounds. Other faces use their centre of mass."""
+    surf = BRepAdaptor_Surface(face)
+    if surf.GetType() == GeomAbs_Plane:
+        umin, umax, vmin, vmax = breptools_UVBounds(face)
+        centroid = surf.Value((umin + umax) / 2, (vmin + vmax) / 2)
+        return centroid, plane_normal(surf), True
+    props = GProp_GProps()
+    brepgprop_SurfaceProperties(face, props)
+    return props.CentreOfMass(), face_normal(face), False
+
+
+def face_placement(face, uid=None):
+    """Return (cached) (centroid, normal, isPlanar) of face.
+
+    uid is the uid of the part the face belongs to."""
+    bare = face.Located(TopLoc_Location()).Oriented(TopAbs_FORWARD)
+    if uid is None:
+        entry = (bare,) + face_placement_bldr(bare)
+    else:
+        entries = facePlacements.setdefault(uid, {})
+        key = hash(bare)  # hash of TShape (bare has no location)
+        entry = entries.get(key)
+        if entry is None or not entry[0].IsSame(bare):
+            entry = entries[key] = (bare,) + face_placement_bldr(bare)
+    bare, centroid, normal, isPlanar = entry
+    trsf = face.Location().Transformation()
+    centroid = centroid.Transformed(trsf)
+    normal = normal.Transformed(trsf)
+    if face.Orientation() == TopAbs_REVERSED:
+        normal = normal.Reversed()
+    return centroid, normal, isPlanar
+
+
+def forget_face_placements(uid):
+    """Drop cached face placements of part uid (its shape has changed)."""
+    facePlacements.pop(uid, None)
+
+
 class WorkPlane():
     """A 2D plane for creating 2D 'Profiles' for building or modifying 3D geometry.
 
@@ -430,7 +1391,7 @@ class WorkPlane():
     3- Default (located with U,V,W aligned with X,Y,Z)
     """
 
-    def __init__(self, size, face=None, faceU=None, ax3=None):
+    def __init__(self, size, face=None, faceU=None, ax3=None, uid=None):
         # gp_Ax3 of XYZ coord system
         origin = gp_Pnt(0, 0, 0)
         wDir = gp_Dir(0, 0, 1)
@@ -443,11 +1404,9 @@ class WorkPlane():
             self.gpPlane = gpPlane              # type: gp_Pln
             self.plane = Geom_Plane(gpPlane)    # type: Geom_Plane
         elif face:  # create workplane on face, uDir defined by faceU
-            wDir = face_normal(face)  # from OCCUtils.Construct module
-            props = GProp_GProps()
-            brepgprop_SurfaceProperties(face, props)
-            origin = props.CentreOfMass()
-            uDir = face_normal(faceU)  # from OCCUtils.Construct module
+            # uid (of part owning faces) is the key of cached placements
+            origin, wDir, __ = face_placement(face, uid)
+            uDir = face_direction(faceU)
             axis3 = gp_Ax3(origin, wDir, uDir)
             vDir = axis3.YDirection()
             self.gpPlane = gp_Pln(axis3)
@@ -473,12 +1432,40 @@ class WorkPlane():
         self.size = size
         self.border = self.makeWpBorder(self.size)
         self.clines = set()  # set of c-lines with (a, b, c) coefficients
+        self.clineKeys = {}  # {cline_key: cline} for dedupe of clines
         self.ccircs = set()  # set of c-circs with (pc, r) coefficients
-        self.edgeList = []  # List of profile lines type: <TopoDS_Edge>
+        self.geomLineDict = {}  # {cline: <Geom_Line>} for display
+        self.geomCircDict = {}  # {ccirc: <Geom_Circle>} for display
+        self.constrShape = (None, None)  # (constructionKey, compound)
+        self.edgeReg = EdgeRegistry()  # profile edges type: <TopoDS_Edge>
+        self.staleAis = []  # AIS objects of removed edges, still displayed
         self.wire = None
+        self.wires = []  # [(outer <TopoDS_Wire>, [hole wires])]
+        self.openPts = []  # [(x, y)] open end points found by makeWire
+        self.badEdges = []  # edges found crossing by validateProfile
         self.accuracy = 1e-6   # min distance between two points
+        self.sketch = sketchsolver.Sketch(self.accuracy)  # profile params
+        self.entityEdges = {}  # {sketch eid: <TopoDS_Edge>}
+        self.roi = None  # region of interest (x1, y1, x2, y2), None => border
+        self.snapIndex = None  # type: SnapIndex (built when needed)
+        self.offsetCache = {}  # {(profileKey, dist, join): [offset edges]}
+        self.arrangement = Arrangement(self.accuracy)  # profile regions
+        self.arrangedEdges = {}  # {edge serial: edge} in self.arrangement
+        self.regionPnt = None  # (x, y) in picked region, used as profile
+        self.regionAis = None  # AIS object showing picked region
         self.hvcl((0, 0))    # Make H-V clines through origin
 
+    def constructionKey(self):
+        """Return key which changes whenever the clines or ccircs change."""
+        return (frozenset(self.clines), frozenset(self.ccircs))
+
+    def displayKey(self):
+        """Return key which changes whenever what is displayed of the wp
+        (construction & profile geometry, picked region) changes."""
+        return self.constructionKey() + (self.roi,
+                self.edgeReg.serial, len(self.edgeReg), len(self.staleAis),
+                tuple(hash(edge) for edge in self.badEdges), self.regionPnt)
+
     def makeSqProfile(self, size):
         # points and segments need to be in CW sequence to get W pointing along Z
         p1 = gp_Pnt(-size, size, 0).Transformed(self.Trsf)
@@ -516,27 +1503,42 @@ class WorkPlane():
     # construction lines (clines) are "infinite" length lines
     # described by the equation:        ax + by + c = 0
     # defined by coefficients:          (a, b, c)
-    # In order to have a nice display of a cline, an 'AIS_Line' is used.
-    # To create an 'AIS_Line', type 'Geom_Line' is needed.
+    # For display, all clines (trimmed to +/- CLINE_EXTENT) and ccircs of
+    # the workplane are put together in one compound of edges (see
+    # constructionShape). Type 'Geom_Line' of a cline is also available.
     #
     # circles are defined by coordinates:   (pc, r)
-    # In order to have a nice display of a ccirc, an 'AIS_Circle' is used.
-    # To create an 'AIS_Circle', type 'Geom_Circle' is needed.
+    # Type 'Geom_Circle' of a ccirc is also available.
     # In order to find intersection points (x, y), 'Geom2d_Circle' is needed.
     # Methods are provided to generate all the various types needed.
     # =======================================================================
 
     def cline_gen(self, cline):
-        a, b, c = cline
-        unique = True
-        for d, e, f in self.clines:
-            if (abs(a-d) < self.accuracy and
-                abs(b-e) < self.accuracy and
-                    abs(c-f) < self.accuracy):
-                unique = False
-                break
-        if unique:
+        self.add_clines([cline])
+
+    def add_clines(self, clines):
+        """Add a batch of clines, skipping any which duplicate a cline
+        already on the workplane. Return number of clines added.
+
+        Duplicates are found by hashing (see cline_key). A cline lying
+        close to a hash cell boundary is also checked in the neighboring
+        cells (rounded up & down)."""
+        tol = self.accuracy
+        steps = [(di, dj, dk) for di in (0, -1, 1) for dj in (0, -1, 1)
+                 for dk in (0, -1, 1)]
+        nbrAdded = 0
+        for cline in clines:
+            key = cline_key(cline, tol)
+            i, j, k = key
+            if any((i+di, j+dj, k+dk) in self.clineKeys
+                   for di, dj, dk in steps):
+                continue
+            self.clineKeys[key] = cline
             self.clines.add(cline)
+            nbrAdded += 1
+        if nbrAdded:
+            self.snapIndex = None
+        return nbrAdded
 
     def geom2dLines(self):
         """Return self.clines as list of type: <Geom2d_Line>."""
@@ -552,9 +1554,27 @@ class WorkPlane():
         gpDir = gp_Dir(gpDir2d.X(), gpDir2d.Y(), 0).Transformed(self.Trsf)
         return Geom_Line(gpPnt, gpDir)
 
+    def geomLine(self, cline):
+        """Return (cached) type: <Geom_Line> of cline.
+
+        self.Trsf never changes, so a cline's Geom_Line is built only once
+        and reused on every redraw until the cline is deleted."""
+        try:
+            return self.geomLineDict[cline]
+        except KeyError:
+            geomLine = self.geomLineDict[cline] = self.geomLineBldr(cline)
+            return geomLine
+
     def geomLines(self):
         """Return self.clines as list of type: <Geom_Line>."""
-        return [self.geomLineBldr(cline) for cline in self.clines]
+        return [self.geomLine(cline) for cline in self.clines]
+
+    def remove_cline(self, cline):
+        """Delete cline (and its cached Geom_Line)."""
+        self.clines.discard(cline)
+        self.clineKeys.pop(cline_key(cline, self.accuracy), None)
+        self.geomLineDict.pop(cline, None)
+        self.snapIndex = None
 
     def hcl(self, pnt=None):
         """Create horizontal construction line from a point (x,y)."""
@@ -591,6 +1611,49 @@ class WorkPlane():
         newline = perp_line(baseline, p0)
         self.cline_gen(newline)
 
+    def parcl(self, cline, dists=None, pts=None):
+        """Create construction lines parallel to cline, at each of
+        offset distances dists (both sides) and through each of pts."""
+        clines = para_clines(cline, dists or [])
+        clines.extend(para_line(cline, pt) for pt in pts or [])
+        return self.add_clines(clines)
+
+    def perpcl(self, cline, pts):
+        """Create construction lines perpendicular to cline through pts."""
+        return self.add_clines(perp_clines(cline, pts))
+
+    def tancl1(self, circs, pts):
+        """Create construction lines through each of pts tangent to each
+        of circs."""
+        return self.add_clines(tan_clines(circs, pts))
+
+    def tancl2(self, circs):
+        """Create construction lines tangent to every pair of circs."""
+        return self.add_clines(tan2_clines(circs))
+
+    def nearest_cline(self, pnt, tol):
+        """Return cline nearest pnt (x, y) and within tol, else None."""
+        x, y = pnt
+        best = None
+        for cline in self.clines:
+            a, b, c = cline
+            d = abs(a*x + b*y + c) / math.hypot(a, b)
+            if d <= tol:
+                tol = d
+                best = cline
+        return best
+
+    def nearest_ccirc(self, pnt, tol):
+        """Return ccirc nearest pnt (x, y) and within tol, else None."""
+        best = None
+        for ccirc in self.ccircs:
+            pc, r = ccirc
+            d = abs(p2p_dist(pnt, pc) - r)
+            if d <= tol:
+                tol = d
+                best = ccirc
+        return best
+
     def unique(self, point, points):
         """boolean test for uniqueness within collection."""
         x0, y0 = point
@@ -601,62 +1664,122 @@ class WorkPlane():
                 break
         return unique
 
+    def roi_box(self):
+        """Return region of interest (x1, y1, x2, y2) for intersection points.
+
+        Unless set otherwise (with set_roi), this is the workplane border.
+        The box is padded by self.accuracy so points lying exactly on the
+        border are kept."""
+        if self.roi:
+            x1, y1, x2, y2 = self.roi
+        else:
+            x1, y1, x2, y2 = (-self.size, -self.size, self.size, self.size)
+        d = self.accuracy
+        return (x1 - d, y1 - d, x2 + d, y2 + d)
+
+    def set_roi(self, box=None):
+        """Set region of interest (x1, y1, x2, y2) such as the current view
+        extents. With box=None, revert to the workplane border."""
+        if box:
+            x1, y1, x2, y2 = box
+            box = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+        self.roi = box
+        self.snapIndex = None
+
     def intersectPts(self):
-        """List of intersection points among c-lines & c-circs"""
+        """List of intersection points (type <gp_Pnt>) among c-lines & c-circs
+        """
+
+        # convert 2d points to 3d
+        pntList = []
+        for x, y in self.intersectPts2d():
+            pnt = gp_Pnt(x, y, 0)
+            pnt.Transform(self.Trsf)
+            pntList.append(pnt)
+        return pntList
+
+    def intersectPtsShape(self):
+        """Return compound of vertices at self.intersectPts (for display).
+
+        Displayed as a single object, kept out of selection. Picks are
+        snapped to the points with self.snap instead."""
+        return self.makeCompound(BRepBuilderAPI_MakeVertex(pnt).Vertex()
+                                 for pnt in self.intersectPts())
+
+    def constructionShape(self):
+        """Return (cached) compound of edges of clines and ccircs (for
+        display), built on their cached Geom_Line & Geom_Circle.
+
+        A cline's edge spans +/- CLINE_EXTENT from its point nearest the
+        origin. Clines farther than CLINE_EXTENT from the origin are left
+        out. The compound is rebuilt only when the clines or ccircs change."""
+        key, compound = self.constrShape
+        if key != self.constructionKey():
+            edges = [BRepBuilderAPI_MakeEdge(self.geomLine(cline),
+                                             -CLINE_EXTENT, CLINE_EXTENT).Edge()
+                     for cline in self.clines
+                     if abs(cline[2]) <= CLINE_EXTENT * math.hypot(*cline[:2])]
+            edges += [BRepBuilderAPI_MakeEdge(self.geomCirc(ccirc)).Edge()
+                      for ccirc in self.ccircs]
+            compound = self.makeCompound(edges)
+            self.constrShape = (self.constructionKey(), compound)
+        return compound
+
+    def intersectPts2d(self):
+        """Set of intersection points (x, y) among c-lines & c-circs
+
+        Only points inside the region of interest (self.roi_box()) are kept.
+        Elements which don't reach into that region are culled (and pairs
+        which can't intersect are skipped) before any intersection is solved.
+        """
 
         points = set()  # set of intersections as (x, y) 2d points
+        box = self.roi_box()
+
+        # cull elements that lie entirely outside the region of interest
+        clList = [cline for cline in self.clines if cline_in_box_p(cline, box)]
+        ccList = [circ for circ in self.ccircs if circ_in_box_p(circ, box)]
 
         # find intersection points of clines with ccircs
-        for ccirc in self.geom2dCircs():  # type Geom2d_Circle
-            for cline in self.geom2dLines():  # type Geom2d_Line
+        for circ in ccList:
+            ccirc = self.convert_circ_to_geom2dCirc(circ)  # type Geom2d_Circle
+            r = circ[1]
+            for line in clList:
+                if cline_circ_dist(line, circ) > r + self.accuracy:
+                    continue  # line misses circle
+                cline = Geom2d_Line(gp_Lin2d(*line))  # type Geom2d_Line
                 inters = Geom2dAPI_InterCurveCurve(ccirc, cline)
-                if inters.NbPoints():
-                    candidates = []
-                    for i in range(inters.NbPoints()):
-                        pnt2d = inters.Point(i+1)  # OCC type 2d point
-                        point = (pnt2d.X(), pnt2d.Y())  # simple (x, y) point
-                        candidates.append(point)
-                    for pnt in candidates:
-                        if self.unique(pnt, points):
-                            points.add(pnt)
+                for i in range(inters.NbPoints()):
+                    pnt2d = inters.Point(i+1)  # OCC type 2d point
+                    pnt = (pnt2d.X(), pnt2d.Y())  # simple (x, y) point
+                    if pnt_in_box_p(pnt, box) and self.unique(pnt, points):
+                        points.add(pnt)
 
         # find intersection points among ccircs
-        ccirc2dList = list(self.ccircs)  # copy list
-        for i in range(len(self.ccircs)):
-            circ0 = ccirc2dList.pop()
-            for circ in ccirc2dList:
-                inters = circ_circ_inters(circ0, circ)
-                for pnt in inters:
-                    if self.unique(pnt, points):
+        for i in range(len(ccList)):
+            circ0 = ccList[i]
+            (x0, y0), r0 = circ0
+            for circ in ccList[i+1:]:
+                (x, y), r = circ
+                if abs(x - x0) > r0 + r or abs(y - y0) > r0 + r:
+                    continue  # bounding boxes don't overlap
+                for pnt in circ_circ_inters(circ0, circ):
+                    if pnt_in_box_p(pnt, box) and self.unique(pnt, points):
                         points.add(pnt)
 
         # find intersection points among clines
-        clList = list(self.clines)  # list of (a, b, c) 2d lines
-        newpoints = []  # new finite points
+        newpoints = []  # new points in region of interest
         for i in range(len(clList)):
-            line0 = clList.pop()
-            for line in clList:
+            line0 = clList[i]
+            for line in clList[i+1:]:
                 P = intersection(line0, line)
-                if P:  # P is not None
-                    if (not points and abs(P[0]) < INFINITY and
-                            abs(P[1]) < INFINITY):
-                        points.add(P)  # first point, (not at inf.)
-                    else:
-                        if abs(P[0]) < INFINITY and abs(P[1]) < INFINITY:
-                            newpoints.append(P)
+                if P and pnt_in_box_p(P, box):  # excludes points near inf.
+                    newpoints.append(P)
         for pnt in newpoints:
             if self.unique(pnt, points):
                 points.add(pnt)
 
-        # convert 2d points to 3d
-        pntList = []
-        for point in points:
-            if point:  # exclude 'None' types
-                x, y = point
-                pnt = gp_Pnt(x, y, 0)
-                pnt.Transform(self.Trsf)
-                pntList.append(pnt)
-        return pntList
+        return points
 
     # =======================================================================
     # Profile Geometry
@@ -666,17 +1789,110 @@ class WorkPlane():
     # to extrude or cut a solid body.
     # =======================================================================
 
-    def line(self, pnt1, pnt2):
-        """Create a line between two end points."""
-        # Two 2d end points
+    @property
+    def edgeList(self):
+        """List of profile edges type: <TopoDS_Edge> (in order added)."""
+        return self.edgeReg.edges()
+
+    def add_edge(self, edge, eid=None):
+        """Add edge (type <TopoDS_Edge>) to profile."""
+        self.edgeReg.add(edge, eid)
+        self.snapIndex = None
+
+    def add_edges(self, edges):
+        """Add a batch of edges to profile."""
+        for edge in edges:
+            self.edgeReg.add(edge)
+        self.snapIndex = None
+
+    def remove_edge(self, edge):
+        """Remove edge from profile. Return True if it was found.
+
+        The AIS object displaying the edge (if any) is put on
+        self.staleAis, to be erased by MainWindow.refresh_wp_edges."""
+        serial = self.edgeReg.find(edge)
+        if serial is None:
+            return False
+        edge, eid, ais = self.edgeReg.remove(serial)
+        if ais:
+            self.staleAis.append(ais)
+        if eid:
+            del self.entityEdges[eid]
+            self.sketch.remove_entity(eid)
+        self.snapIndex = None
+        return True
+
+    def make_line_edge(self, pnt1, pnt2):
+        """Return edge (type <TopoDS_Edge>) between two 2d end points."""
         x1, y1 = pnt1
         x2, y2 = pnt2
         p1 = gp_Pnt(x1, y1, 0).Transformed(self.Trsf)
         p2 = gp_Pnt(x2, y2, 0).Transformed(self.Trsf)
         seg = GC_MakeSegment(p1, p2).Value()  # Geom_TrimmedCurve
         # Build the edge
-        edge = BRepBuilderAPI_MakeEdge(seg).Edge()  # TopoDS_Edge
-        self.edgeList.append(edge)
+        return BRepBuilderAPI_MakeEdge(seg).Edge()  # TopoDS_Edge
+
+    def make_circ_edge(self, cntr, rad):
+        """Return edge (type <TopoDS_Edge>) of circle."""
+        return BRepBuilderAPI_MakeEdge(
+            self.convert_circ_to_geomCirc((cntr, rad))).Edge()
+
+    def make_arc_edge(self, pc, ps, pe):
+        """Return edge (type <TopoDS_Edge>) of arc (CCW from ps to pe)."""
+        rad = p2p_dist(pc, ps)
+        circ2d = (pc, rad)
+        geom_circ = self.convert_circ_to_geomCirc(circ2d)
+        gp_circ = geom_circ.Circ()
+        gp_ps = gp_Pnt(ps[0], ps[1], 0).Transformed(self.Trsf)
+        gp_pe = gp_Pnt(pe[0], pe[1], 0).Transformed(self.Trsf)
+        geom_arc = GC_MakeArcOfCircle(gp_circ, gp_ps, gp_pe, True).Value()
+        return BRepBuilderAPI_MakeEdge(geom_arc).Edge()
+
+    def add_entity_edge(self, eid, edge):
+        """Add edge to profile, built from sketch entity eid."""
+        self.entityEdges[eid] = edge
+        self.add_edge(edge, eid)
+
+    def line(self, pnt1, pnt2):
+        """Create a line between two end points."""
+        eid = self.sketch.add_line(pnt1, pnt2)
+        self.add_entity_edge(eid, self.make_line_edge(pnt1, pnt2))
+
+    def add_records(self, records, constr=False):
+        """Create a batch of profile edges from edge records (type, params)
+        in wp 2d coords (see edgeRecord). If constr, create construction
+        geometry instead: clines through lines and ccircs of circles & arcs.
+        Degenerate records (zero length lines & radii) are skipped."""
+        clines = []
+        ccircs = set()
+        for typ, params in records:
+            if typ == EDGE_LINE:
+                ps, pe = params[:2], params[2:]
+                if same_pt_p(ps, pe):
+                    continue
+                if constr:
+                    clines.append(cnvrt_2pts_to_coef(ps, pe))
+                else:
+                    self.line(ps, pe)
+            elif typ == EDGE_CIRC:
+                if params[2] <= self.accuracy:
+                    continue
+                if constr:
+                    ccircs.add((params[:2], params[2]))
+                else:
+                    self.circle(params[:2], params[2])
+            elif typ == EDGE_ARC:
+                cr = cr_from_3p(params[:2], params[2:4], params[4:])
+                if not cr:
+                    continue  # 3 pts in line
+                if constr:
+                    ccircs.add(cr)
+                else:
+                    self.arc3p(params[:2], params[2:4], params[4:])
+        if constr:
+            self.add_clines(clines)
+            self.ccircs.update(ccircs)
+            self.snapIndex = None
 
     def rect(self, pnt1, pnt2):
         """Create a rectangle from two diagonally opposite corners."""
@@ -684,34 +1900,24 @@ class WorkPlane():
         x1, y1 = pnt1
         x2, y2 = pnt2
         # 4 corners of rectangle
-        p1 = gp_Pnt(x1, y1, 0).Transformed(self.Trsf)
-        p2 = gp_Pnt(x2, y1, 0).Transformed(self.Trsf)
-        p3 = gp_Pnt(x2, y2, 0).Transformed(self.Trsf)
-        p4 = gp_Pnt(x1, y2, 0).Transformed(self.Trsf)
-        # 4 sides (segments) of rectangle
-        seg1 = GC_MakeSegment(p1, p2).Value()  # Geom_TrimmedCurve
-        seg2 = GC_MakeSegment(p2, p3).Value()
-        seg3 = GC_MakeSegment(p3, p4).Value()
-        seg4 = GC_MakeSegment(p4, p1).Value()
-        # Build the edges
-        e1 = BRepBuilderAPI_MakeEdge(seg1).Edge()  # TopoDS_Edge
-        e2 = BRepBuilderAPI_MakeEdge(seg2).Edge()
-        e3 = BRepBuilderAPI_MakeEdge(seg3).Edge()
-        e4 = BRepBuilderAPI_MakeEdge(seg4).Edge()
-        edges = (e1, e2, e3, e4)
-        for edge in edges:
-            self.edgeList.append(edge)
+        p1 = (x1, y1)
+        p2 = (x2, y1)
+        p3 = (x2, y2)
+        p4 = (x1, y2)
+        # 4 sides (sharing corner points in the sketch)
+        for ps, pe in ((p1, p2), (p2, p3), (p3, p4), (p4, p1)):
+            self.line(ps, pe)
 
     def circle(self, cntr, rad, constr=False):
         """Create a circle (constr or profile)"""
         circ = (cntr, rad)
         if constr:
             self.ccircs.add(circ)
+            self.snapIndex = None
             self.hvcl(cntr)
         else:
-            edge = BRepBuilderAPI_MakeEdge(
-                self.convert_circ_to_geomCirc(circ)).Edge()
-            self.edgeList.append(edge)
+            eid = self.sketch.add_circ(cntr, rad)
+            self.add_entity_edge(eid, self.make_circ_edge(cntr, rad))
 
     def convert_circ_to_geomCirc(self, circ):
         """Convert 2d circle ((cx, cy), r) to type <Geom_Circle>"""
@@ -722,6 +1928,21 @@ class WorkPlane():
         geomCirc.Transform(self.Trsf)
         return geomCirc
 
+    def geomCirc(self, ccirc):
+        """Return (cached) type: <Geom_Circle> of ccirc."""
+        try:
+            return self.geomCircDict[ccirc]
+        except KeyError:
+            geomCirc = self.convert_circ_to_geomCirc(ccirc)
+            self.geomCircDict[ccirc] = geomCirc
+            return geomCirc
+
+    def remove_ccirc(self, ccirc):
+        """Delete ccirc (and its cached Geom_Circle)."""
+        self.ccircs.discard(ccirc)
+        self.geomCircDict.pop(ccirc, None)
+        self.snapIndex = None
+
     def convert_circ_to_geom2dCirc(self, circ):
         (cx, cy), r = circ
         return Geom2d_Circle(gp_Circ2d(gp_Ax2d(gp_Pnt2d(cx, cy),
@@ -734,15 +1955,8 @@ class WorkPlane():
 
     def arcc2p(self, pc, ps, pe):
         """Create an arc from center pt, start pt and end pt."""
-        rad = p2p_dist(pc, ps)
-        circ2d = (pc, rad)
-        geom_circ = self.convert_circ_to_geomCirc(circ2d)
-        gp_circ = geom_circ.Circ()
-        gp_ps = gp_Pnt(ps[0], ps[1], 0).Transformed(self.Trsf)
-        gp_pe = gp_Pnt(pe[0], pe[1], 0).Transformed(self.Trsf)
-        geom_arc = GC_MakeArcOfCircle(gp_circ, gp_ps, gp_pe, True).Value()
-        edge = BRepBuilderAPI_MakeEdge(geom_arc).Edge()
-        self.edgeList.append(edge)
+        eid = self.sketch.add_arc(pc, ps, pe)
+        self.add_entity_edge(eid, self.make_arc_edge(pc, ps, pe))
 
     def arc3p(self, ps, pe, p3):
         """Create an arc from start pt, end pt, and 3rd pt on the arc."""
@@ -751,7 +1965,302 @@ class WorkPlane():
         gp_p3 = gp_Pnt(p3[0], p3[1], 0).Transformed(self.Trsf)
         geom_arc = GC_MakeArcOfCircle(gp_ps, gp_pe, gp_p3).Value()
         edge = BRepBuilderAPI_MakeEdge(geom_arc).Edge()
-        self.edgeList.append(edge)
+        # The arc runs from ps through pe to p3. In the sketch, arcs are CCW.
+        cr = cr_from_3p(ps, pe, p3)
+        if cr:
+            pc, rad = cr
+            if pt_on_RHS_p(p3, ps, pe):  # CW
+                eid = self.sketch.add_arc(pc, p3, ps)
+            else:
+                eid = self.sketch.add_arc(pc, ps, p3)
+            self.add_entity_edge(eid, edge)
+        else:
+            self.add_edge(edge)
+
+    # =======================================================================
+    # Constraints
+    # Profile elements made by line, rect, circle & arc are also entities
+    # of self.sketch. Constraints applied to them are solved (incrementally)
+    # by the sketch, after which the edges of changed entities are rebuilt.
+    # =======================================================================
+
+    def edge_entity(self, edge):
+        """Return sketch eid of profile edge, else None."""
+        serial = self.edgeReg.find(edge)
+        if serial is None:
+            return None
+        return self.edgeReg.entries[serial][1]
+
+    def entity_edge(self, eid):
+        """Build (and return) edge of sketch entity eid from its values."""
+        typ, values = self.sketch.entity_values(eid)
+        if typ == 'line':
+            return self.make_line_edge(*values)
+        if typ == 'circ':
+            return self.make_circ_edge(*values)
+        return self.make_arc_edge(*values)
+
+    def update_entities(self, eids):
+        """Rebuild profile edges of sketch entities eids (in place)."""
+        for eid in eids:
+            old = self.entityEdges[eid]
+            new = self.entity_edge(eid)
+            ais = self.edgeReg.replace(self.edgeReg.find(old), new)
+            if ais:
+                self.staleAis.append(ais)
+            self.entityEdges[eid] = new
+        if eids:
+            self.snapIndex = None
+
+    def constrain(self, constraint):
+        """Add constraint (to sketch), solve and update. Return cid."""
+        cid, changed = self.sketch.add_constraint(constraint)
+        self.update_entities(changed)
+        return cid
+
+    def set_constraint_value(self, cid, value):
+        """Change value of constraint cid, re-solve and update."""
+        changed = self.sketch.set_value(cid, value)
+        self.update_entities(changed)
+
+    def entity_data(self, edge):
+        """Return (type, data) of sketch entity of edge, else (None, None)."""
+        eid = self.edge_entity(edge)
+        if eid:
+            return self.sketch.entities[eid]
+        return (None, None)
+
+    def constrain_hv(self, edge, horizontal=True):
+        """Constrain line edge to be horizontal (or vertical)."""
+        typ, data = self.entity_data(edge)
+        if typ == 'line':
+            if horizontal:
+                return self.constrain(sketchsolver.Horizontal(*data))
+            return self.constrain(sketchsolver.Vertical(*data))
+
+    def constrain_size(self, edge, value):
+        """Constrain length of line edge or radius of circle/arc edge.
+
+        If already constrained, just change the value."""
+        typ, data = self.entity_data(edge)
+        if typ == 'line':
+            cls, args = sketchsolver.Distance, data
+        elif typ in ('circ', 'arc'):
+            cls, args = sketchsolver.Radius, (data[1],)
+        else:
+            return None
+        varIds = cls(*args, value).vars
+        cid = self.sketch.find_constraint(cls, varIds)
+        if cid:
+            self.set_constraint_value(cid, value)
+            return cid
+        return self.constrain(cls(*args, value))
+
+    def constrain_angle(self, edge1, edge2, angle):
+        """Constrain angle (deg, CCW) from line edge1 to line edge2."""
+        typ1, data1 = self.entity_data(edge1)
+        typ2, data2 = self.entity_data(edge2)
+        if typ1 == typ2 == 'line':
+            args = (*data1, *data2)
+            cid = self.sketch.find_constraint(
+                sketchsolver.Angle, sketchsolver.Angle(*args, angle).vars)
+            if cid:
+                self.set_constraint_value(cid, angle)
+                return cid
+            return self.constrain(sketchsolver.Angle(*args, angle))
+
+    def constrain_tangent(self, edge1, edge2):
+        """Constrain line edge tangent to circle/arc edge (either order)."""
+        (typ1, data1), (typ2, data2) = sorted(
+            (self.entity_data(edge1), self.entity_data(edge2)),
+            key=lambda td: td[0] != 'line')
+        if typ1 == 'line' and typ2 in ('circ', 'arc'):
+            p, q = data1
+            c, r = data2[:2]
+            return self.constrain(sketchsolver.Tangent(p, q, c, r))
+
+    def constrain_points(self, pnt1, pnt2, dist=None):
+        """Constrain distance between 2d points pnt1 & pnt2 (which are
+        profile points), or make them coincident if dist is None.
+
+        Return False (constraining nothing) unless both are profile points."""
+        p = self.sketch.find_point(pnt1)
+        q = self.sketch.find_point(pnt2)
+        if p is None or q is None:
+            return False
+        if dist is None:
+            return self.constrain(sketchsolver.Coincident(p, q))
+        return self.constrain(sketchsolver.Distance(p, q, dist))
+
+    def fix_point(self, pnt):
+        """Fix profile point pnt (x, y) at its current location.
+
+        Return False (fixing nothing) unless pnt is a profile point."""
+        p = self.sketch.find_point(pnt)
+        if p is None:
+            return False
+        return self.constrain(sketchsolver.Fix(p, self.sketch.pnt(p)))
+
+    def solve_time(self):
+        """Return time (sec) of most recent constraint solve."""
+        return self.sketch.solveStats.get('time', 0.0)
+
+    # =======================================================================
+    # Patterns
+    # Copies of template edges are made by moving them (sharing the template
+    # geometry) rather than by building new edges one at a time. All the
+    # copies are added to the profile in one batch.
+    # =======================================================================
+
+    def local_to_global(self, trsf):
+        """Convert trsf (in wp 2d coords) to a <TopLoc_Location> (global)."""
+        glob = self.Trsf.Multiplied(trsf).Multiplied(self.Trsf.Inverted())
+        return TopLoc_Location(glob)
+
+    def linear_array(self, edges, delta, count):
+        """Create a linear pattern of count instances of edges (including the
+        original), each offset by delta (dx, dy) from the previous one."""
+        if count < 1:
+            raise ValueError(f"Number of instances must be >= 1, not {count}")
+        newEdges = []
+        for i in range(1, count):
+            trsf = gp_Trsf()
+            trsf.SetTranslation(gp_Vec(delta[0]*i, delta[1]*i, 0))
+            loc = self.local_to_global(trsf)
+            newEdges.extend(edge.Moved(loc) for edge in edges)
+        self.add_edges(newEdges)
+        return newEdges
+
+    def polar_array(self, edges, ctr, count, angle=360):
+        """Create a circular pattern of count instances of edges (including
+        the original) about ctr (x, y), spread evenly over angle (deg)."""
+        if count < 1:
+            raise ValueError(f"Number of instances must be >= 1, not {count}")
+        if angle % 360:
+            step = angle / (count - 1) if count > 1 else 0
+        else:
+            step = angle / count
+        axis = gp_Ax1(gp_Pnt(ctr[0], ctr[1], 0), gp_Dir(0, 0, 1))
+        newEdges = []
+        for i in range(1, count):
+            trsf = gp_Trsf()
+            trsf.SetRotation(axis, math.radians(step*i))
+            loc = self.local_to_global(trsf)
+            newEdges.extend(edge.Moved(loc) for edge in edges)
+        self.add_edges(newEdges)
+        return newEdges
+
+    # =======================================================================
+    # Snap points
+    # Points on the workplane that the user is likely to want to pick:
+    # intersection points, profile edge end points and arc (circle) centers.
+    # They are held in a SnapIndex, which is rebuilt (only) when needed
+    # after any of the workplane geometry has changed.
+    # =======================================================================
+
+    def edgeRecord(self, edge):
+        """Return (type, params) describing edge in wp 2d coords.
+
+        type is one of EDGE_LINE (x1, y1, x2, y2), EDGE_CIRC (cx, cy, r)
+        or EDGE_ARC (x1, y1, xm, ym, x2, y2) (start, mid & end pts).
+        Return None for other types of curve."""
+        trsf = self.Trsf.Inverted()  # global to local
+        curve = BRepAdaptor_Curve(edge)
+        u1, u2 = curve.FirstParameter(), curve.LastParameter()
+        pnts = [curve.Value(u).Transformed(trsf) for u in (u1, (u1+u2)/2, u2)]
+        ps, pm, pe = [(pnt.X(), pnt.Y()) for pnt in pnts]
+        if curve.GetType() == GeomAbs_Line:
+            return (EDGE_LINE, ps + pe)
+        if curve.GetType() == GeomAbs_Circle:
+            if same_pt_p(ps, pe):
+                pc = curve.Circle().Location().Transformed(trsf)
+                return (EDGE_CIRC, (pc.X(), pc.Y(), curve.Circle().Radius()))
+            return (EDGE_ARC, ps + pm + pe)
+        return None
+
+    def entityRecord(self, eid):
+        """Return edge record (type, params) of sketch entity eid, taken
+        directly from its (2d) sketch values."""
+        typ, values = self.sketch.entity_values(eid)
+        if typ == 'line':
+            ps, pe = values
+            return (EDGE_LINE, tuple(ps) + tuple(pe))
+        if typ == 'circ':
+            (cx, cy), r = values
+            return (EDGE_CIRC, (cx, cy, r))
+        (cx, cy), ps, pe = values  # CCW from ps to pe
+        r = p2p_dist((cx, cy), ps)
+        a1 = math.atan2(ps[1] - cy, ps[0] - cx)
+        a2 = math.atan2(pe[1] - cy, pe[0] - cx)
+        am = a1 + ((a2 - a1) % (2 * math.pi)) / 2
+        pm = (cx + r * math.cos(am), cy + r * math.sin(am))
+        return (EDGE_ARC, tuple(ps) + pm + tuple(pe))
+
+    def profileRecords(self):
+        """Return list of edge records of all profile edges.
+
+        Records of edges made by line, circle, arc, etc. come straight from
+        their 2d sketch values. Only other edges (such as pattern copies)
+        are measured from the edge (see edgeRecord)."""
+        records = []
+        for edge, eid, ais in self.edgeReg.entries.values():
+            record = self.entityRecord(eid) if eid else self.edgeRecord(edge)
+            if record:
+                records.append(record)
+        return records
+
+    def constructionRecords(self, box=None):
+        """Return list of edge records of construction geometry: clines
+        (clipped to box, default: roi_box) as lines and ccircs as circles."""
+        box = box or self.roi_box()
+        records = []
+        for cline in self.clines:
+            pts = cline_box_intrsctn(cline, box)
+            if len(pts) >= 2 and not same_pt_p(pts[0], pts[1]):
+                records.append((EDGE_LINE, pts[0] + pts[1]))
+        for (cx, cy), r in self.ccircs:
+            records.append((EDGE_CIRC, (cx, cy, r)))
+        return records
+
+    def edgePts2d(self, edge):
+        """Return list of 2d end points (& center if arc) of profile edge."""
+        trsf = self.Trsf.Inverted()  # global to local
+        curve = BRepAdaptor_Curve(edge)
+        pnts = [curve.Value(curve.FirstParameter()),
+                curve.Value(curve.LastParameter())]
+        if curve.GetType() == GeomAbs_Circle:
+            pnts.append(curve.Circle().Location())
+        pts = []
+        for pnt in pnts:
+            pnt.Transform(trsf)
+            pts.append((pnt.X(), pnt.Y()))
+        return pts
+
+    def snapPts(self):
+        """Return list of all snap points (x, y) on workplane."""
+        points = list(self.intersectPts2d())
+        for pc, r in self.ccircs:
+            points.append(pc)
+        for edge in self.edgeList:
+            points.extend(self.edgePts2d(edge))
+        return points
+
+    def snap(self, pnt, tol):
+        """Return snap point nearest pnt (x, y) and within tol, else None."""
+        if self.snapIndex is None:
+            self.snapIndex = SnapIndex(self.snapPts())
+        return self.snapIndex.nearest(pnt, tol)
+
+    def ray_to_2d(self, pnt, vec):
+        """Return 2d point (x, y) where ray (<gp_Pnt>, <gp_Dir>) pierces the
+        workplane, or None if the ray is parallel to it."""
+        trsf = self.Trsf.Inverted()  # global to local
+        p = pnt.Transformed(trsf)
+        v = vec.Transformed(trsf)
+        if abs(v.Z()) < self.accuracy:
+            return None
+        t = -p.Z() / v.Z()
+        return (p.X() + t*v.X(), p.Y() + t*v.Y())
 
     # =======================================================================
     # Topo_DS_Wire
@@ -759,16 +2268,384 @@ class WorkPlane():
     # Which can be used as a tool to build or modify a face or solid body.
     # =======================================================================
 
+    def chainEdges(self):
+        """Chain the edges of self.edgeList into closed loops.
+
+        Edge end points are merged into nodes through a hash of their
+        coordinates (rounded to self.accuracy), so chaining takes linear time
+        and doesn't depend on the order in which the edges were drawn.
+        Return (loops, openPts) where each loop is a list of (edge, reversed)
+        in order around the loop, and openPts is a list of (x, y) points
+        where the profile isn't closed (an odd number of edges meet)."""
+        tol = self.accuracy
+        nodeDict = {}  # {hash key: node nmbr}
+        nodePts = []  # [(x, y)] indexed by node nmbr
+
+        def node(pnt):
+            i, j = (round(pnt[0] / tol), round(pnt[1] / tol))
+            for key in ((i+m, j+n) for m in (0, -1, 1) for n in (0, -1, 1)):
+                if key in nodeDict:
+                    return nodeDict[key]
+            nodeDict[(i, j)] = len(nodePts)
+            nodePts.append(pnt)
+            return nodeDict[(i, j)]
+
+        edgeList = self.edgeList
+        ends = []  # [(start node, end node)] indexed like edgeList
+        edgesAtNode = defaultdict(list)  # {node: [edge indexes]}
+        for k, edge in enumerate(edgeList):
+            ps, pe = self.edgePts2d(edge)[:2]
+            ns, ne = node(ps), node(pe)
+            ends.append((ns, ne))
+            edgesAtNode[ns].append(k)
+            edgesAtNode[ne].append(k)
+
+        openPts = [nodePts[n] for n, ks in edgesAtNode.items() if len(ks) % 2]
+        used = set()
+        loops = []
+        for k in range(len(edgeList)):
+            if k in used:
+                continue
+            start, n = ends[k]
+            loop = [(edgeList[k], False)]
+            used.add(k)
+            while n != start:
+                nxt = [j for j in edgesAtNode[n] if j not in used]
+                if not nxt:
+                    break  # dead end (open profile)
+                j = nxt[0]
+                used.add(j)
+                reverse = ends[j][0] != n
+                loop.append((edgeList[j], reverse))
+                n = ends[j][0] if reverse else ends[j][1]
+            if n == start:
+                loops.append(loop)
+        return loops, openPts
+
+    def loopPolygon(self, loop):
+        """Return list of 2d pts approximating loop (for classification)."""
+        trsf = self.Trsf.Inverted()  # global to local
+        pts = []
+        for edge, reverse in loop:
+            curve = BRepAdaptor_Curve(edge)
+            u1, u2 = curve.FirstParameter(), curve.LastParameter()
+            n = 1 if curve.GetType() == GeomAbs_Line else 16
+            params = [u1 + (u2 - u1) * i / n for i in range(n)]
+            if reverse:
+                params = [u2 - (u2 - u1) * i / n for i in range(n)]
+            for u in params:
+                pnt = curve.Value(u).Transformed(trsf)
+                pts.append((pnt.X(), pnt.Y()))
+        return pts
+
+    def validateProfile(self):
+        """Check that profile edges meet each other only at shared end
+        points (see profile_crossings). Store edges which cross (or touch)
+        in self.badEdges. Return list of (edge1, edge2, (x, y))."""
+        edges = []
+        records = []
+        for edge in self.edgeList:
+            record = self.edgeRecord(edge)
+            if record:
+                edges.append(edge)
+                records.append(record)
+        crossings = [(edges[i], edges[j], pnt) for i, j, pnt in
+                     profile_crossings(records, self.accuracy)]
+        self.badEdges = []
+        for edge1, edge2, pnt in crossings:
+            for edge in (edge1, edge2):
+                if edge not in self.badEdges:
+                    self.badEdges.append(edge)
+        return crossings
+
     def makeWire(self):
-        """Generate a wire from the edges in self.edgeList."""
+        """Generate wires from the edges in self.edgeList.
+
+        The wires are built by buildWires. Results are stored in self.wires
+        as a list of (outer wire, [hole wires]), ready for makeFace. For
+        backward compatibility, self.wire is the outer wire of largest area.
+        Any open end points are stored in self.openPts. Return True if all
+        edges were used in closed loops."""
+        self.wires, self.wire, self.openPts, allUsed = self.buildWires()
+        return allUsed
+
+    def buildWires(self):
+        """Return (wires, largest outer wire, open end points, all edges used)
+        of the edges in self.edgeList, without storing anything (see
+        makeWire).
+
+        The edges are chained into closed loops (see chainEdges) which are
+        then classified as outer boundaries or holes by nesting depth."""
+        loops, openPts = self.chainEdges()
+        if not loops:
+            return [], None, openPts, False
+        polys = [self.loopPolygon(loop) for loop in loops]
+        areas = [abs(polygon_area(poly)) for poly in polys]
+        # depth = number of other loops containing loop
+        parents = []
+        for i, poly in enumerate(polys):
+            containers = [j for j, other in enumerate(polys) if j != i and
+                          areas[j] > areas[i] and
+                          pnt_in_polygon_p(midpoint(poly[0], poly[1]), other)]
+            parents.append(containers)
+        wires = []
+        for loop in loops:
+            wireBldr = BRepBuilderAPI_MakeWire()
+            for edge, reverse in loop:
+                wireBldr.Add(edge)
+            if not wireBldr.IsDone():
+                return [], None, openPts, False
+            wires.append(wireBldr.Wire())
+        outers = {}  # {loop index: [hole wires]}
+        for i, containers in enumerate(parents):
+            if len(containers) % 2 == 0:  # even depth: outer boundary
+                outers[i] = []
+        for i, containers in enumerate(parents):
+            if len(containers) % 2:  # odd depth: hole in smallest container
+                parent = min(containers, key=lambda j: areas[j])
+                outers[parent].append(wires[i])
+        wireList = [(wires[i], holes) for i, holes in outers.items()]
+        largest = wires[max(outers, key=lambda i: areas[i])]
+        nbrEdges = sum(len(loop) for loop in loops)
+        return wireList, largest, openPts, nbrEdges == len(self.edgeReg)
+
+    def makeFaces(self, wires=None):
+        """Return list of faces, one for each (outer, holes) in wires
+        (default: self.wires).
+
+        Call makeWire first (or pass wires from buildWires). Holes are
+        added to their outer boundary."""
+        if wires is None:
+            wires = self.wires
+        return [self.wiresFace(outer, holes) for outer, holes in wires]
+
+    def wiresFace(self, outer, holes):
+        """Return face bounded by outer wire, with hole wires."""
+        faceBldr = BRepBuilderAPI_MakeFace(outer)
+        for hole in holes:
+            faceBldr.Add(hole)
+        fixer = ShapeFix_Face(faceBldr.Face())
+        fixer.FixOrientation()  # make holes run opposite to outer
+        fixer.Perform()
+        return fixer.Face()
+
+    def makeFace(self):
+        """Return face (or compound of faces) bounded by self.wires.
+
+        Call makeWire first."""
+        faces = self.makeFaces()
+        if len(faces) == 1:
+            return faces[0]
+        return self.makeCompound(faces)
+
+    def makeCompound(self, shapes):
+        """Return compound (type <TopoDS_Compound>) of shapes."""
+        compound = TopoDS_Compound()
+        builder = BRep_Builder()
+        builder.MakeCompound(compound)
+        for shape in shapes:
+            builder.Add(compound, shape)
+        return compound
+
+    # =======================================================================
+    # Regions
+    # However the profile edges cross or overlap, they divide the plane into
+    # regions (see Arrangement). A region, picked by a point inside it, can
+    # be used in place of the profile loops to extrude, mill, etc.
+    # =======================================================================
+
+    def syncArrangement(self):
+        """Bring self.arrangement up to date with the profile edges.
+
+        Only edges added, removed or rebuilt since the last sync are
+        (re)intersected with the others."""
+        entries = self.edgeReg.entries
+        for serial, edge in list(self.arrangedEdges.items()):
+            if serial not in entries or entries[serial][0] is not edge:
+                self.arrangement.remove(serial)
+                del self.arrangedEdges[serial]
+        for serial, (edge, eid, ais) in entries.items():
+            if serial not in self.arrangedEdges:
+                if eid:
+                    record = self.entityRecord(eid)
+                else:
+                    record = self.edgeRecord(edge)
+                if record:
+                    self.arrangement.add(serial, record)
+                self.arrangedEdges[serial] = edge
+
+    def regionAt(self, pnt):
+        """Return (outer records, [hole records]) of the region of the
+        profile containing pnt (x, y), else None."""
+        self.syncArrangement()
+        idx = self.arrangement.region_at(pnt)
+        if idx is None:
+            return None
+        return self.arrangement.region_records(idx)
+
+    def recordEdge(self, record):
+        """Return edge (type <TopoDS_Edge>) of edge record."""
+        typ, params = record
+        if typ == EDGE_LINE:
+            return self.make_line_edge(params[:2], params[2:])
+        if typ == EDGE_CIRC:
+            return self.make_circ_edge(params[:2], params[2])
+        ps, pm, pe = params[:2], params[2:4], params[4:]
+        pc, r = cr_from_3p(ps, pm, pe)
+        if pt_on_RHS_p(pm, ps, pe):  # CCW from ps to pe
+            return self.make_arc_edge(pc, ps, pe)
+        return self.make_arc_edge(pc, pe, ps)
+
+    def recordsWire(self, records):
+        """Return wire (type <TopoDS_Wire>) of records (in order)."""
         wireBldr = BRepBuilderAPI_MakeWire()
-        occ_seq = TopTools_ListOfShape()
-        for edge in self.edgeList:
-            occ_seq.Append(edge)
-        wireBldr.Add(occ_seq)
-        if wireBldr.IsDone():
-            self.wire = wireBldr.Wire()
-            status = True
-        else:
-            status = False
-        return status
+        for record in records:
+            wireBldr.Add(self.recordEdge(record))
+        return wireBldr.Wire()
+
+    def makeRegionFace(self, pnt):
+        """Return face of region containing pnt (x, y), else None."""
+        region = self.regionAt(pnt)
+        if not region:
+            return None
+        outer, holes = region
+        return self.wiresFace(self.recordsWire(outer),
+                              [self.recordsWire(hole) for hole in holes])
+
+    # =======================================================================
+    # Offsets
+    # The closed loops of the profile are offset as faces (so holes move
+    # the opposite way to their outer boundary). Results are cached by
+    # profile geometry, distance and join type, so going back to a value
+    # tried before (while dragging or retyping it) doesn't recompute it.
+    # =======================================================================
+
+    def profileKey(self):
+        """Return hashable key of the current profile geometry."""
+        tol = self.accuracy
+        return tuple(sorted((typ, tuple(round(v / tol) for v in params))
+                            for typ, params in self.profileRecords()))
+
+    def offset(self, dist, join="arc"):
+        """Return list of edges offset from the closed loops of the profile
+        by dist (outward if positive, inward if negative). join is the type
+        of corner made at convex corners: 'arc', 'tangent' or 'intersection'
+        (sharp).
+
+        Return None if the offset fails (a loop collapses, for instance).
+        Failures aren't cached."""
+        key = (self.profileKey(), round(dist / self.accuracy), join)
+        if key not in self.offsetCache:
+            edges = []
+            wires = self.buildWires()[0]  # (self.wires is left as it is)
+            for face in self.makeFaces(wires):
+                offset = BRepOffsetAPI_MakeOffset(face, OFFSET_JOINS[join])
+                try:
+                    offset.Perform(dist)
+                except RuntimeError:  # (Standard_Failure)
+                    return None
+                if not offset.IsDone():
+                    return None
+                faceEdges = list(Topo(offset.Shape()).edges())
+                if not faceEdges:  # loop collapsed
+                    return None
+                edges.extend(faceEdges)
+            self.offsetCache[key] = edges
+        return self.offsetCache[key]
+
+    def add_offset(self, dist, join="arc"):
+        """Add profile edges offset from profile. Return the new edges
+        (None if the offset failed)."""
+        edges = self.offset(dist, join)
+        if edges:
+            self.add_edges(edges)
+        return edges
+
+
+# ===========================================================================
+#
+# Workplane file I/O
+# Workplanes are saved in a compact binary file alongside the CAD document.
+# All values are little-endian. For each workplane, its placement (ax3) and
+# size are followed by flat arrays of cline (a, b, c) & ccirc (cx, cy, r)
+# coefficients and a typed record of each profile edge's 2d parameters.
+#
+# ===========================================================================
+
+def wp_file_name(doc_fname):
+    """Return name of workplane file to accompany doc file doc_fname."""
+    root, ext = os.path.splitext(doc_fname)
+    return root + WP_FILE_EXT
+
+
+def pack_wp(uid, wp):
+    """Return workplane wp (with uid) packed as bytes."""
+    ax3 = gp_Ax3(wp.origin, wp.wDir, wp.uDir)
+    loc, w, u = ax3.Location(), ax3.Direction(), ax3.XDirection()
+    records = wp.profileRecords()
+    uidBytes = uid.encode()
+    data = [struct.pack("<H", len(uidBytes)), uidBytes,
+            struct.pack("<10d", wp.size, loc.X(), loc.Y(), loc.Z(),
+                        w.X(), w.Y(), w.Z(), u.X(), u.Y(), u.Z()),
+            struct.pack("<3I", len(wp.clines), len(wp.ccircs), len(records))]
+    clineCoefs = [coef for cline in wp.clines for coef in cline]
+    data.append(struct.pack(f"<{len(clineCoefs)}d", *clineCoefs))
+    ccircCoefs = [coef for (pc, r) in wp.ccircs for coef in (*pc, r)]
+    data.append(struct.pack(f"<{len(ccircCoefs)}d", *ccircCoefs))
+    for typ, params in records:
+        data.append(struct.pack(f"<B{len(params)}d", typ, *params))
+    return b"".join(data)
+
+
+def unpack_wp(buf, offset):
+    """Return (uid, wp, new offset) of workplane unpacked from buf at offset."""
+    n, = struct.unpack_from("<H", buf, offset)
+    offset += 2
+    uid = buf[offset:offset+n].decode()
+    offset += n
+    size, *ax = struct.unpack_from("<10d", buf, offset)
+    offset += 80
+    nCl, nCc, nEd = struct.unpack_from("<3I", buf, offset)
+    offset += 12
+    ax3 = gp_Ax3(gp_Pnt(*ax[:3]), gp_Dir(*ax[3:6]), gp_Dir(*ax[6:]))
+    wp = WorkPlane(size, ax3=ax3)
+    coefs = struct.unpack_from(f"<{3*nCl}d", buf, offset)
+    offset += 24 * nCl
+    for cline in list(wp.clines):
+        wp.remove_cline(cline)
+    wp.add_clines([coefs[i:i+3] for i in range(0, len(coefs), 3)])
+    coefs = struct.unpack_from(f"<{3*nCc}d", buf, offset)
+    offset += 24 * nCc
+    wp.ccircs = {(coefs[i:i+2], coefs[i+2]) for i in range(0, len(coefs), 3)}
+    records = []
+    for i in range(nEd):
+        typ, = struct.unpack_from("<B", buf, offset)
+        nbr = EDGE_NBR_PARAMS[typ]
+        params = struct.unpack_from(f"<{nbr}d", buf, offset+1)
+        offset += 1 + 8*nbr
+        records.append((typ, params))
+    wp.add_records(records)
+    return uid, wp, offset
+
+
+def save_workplanes(fname, wp_dict):
+    """Save all workplanes in wp_dict {uid: wp} to file fname."""
+    data = [WP_FILE_MAGIC, struct.pack("<I", len(wp_dict))]
+    data.extend(pack_wp(uid, wp) for uid, wp in wp_dict.items())
+    with open(fname, "wb") as f:
+        f.write(b"".join(data))
+
+
+def load_workplanes(fname):
+    """Return {uid: wp} of workplanes loaded from file fname."""
+    with open(fname, "rb") as f:
+        buf = f.read()
+    if buf[:4] != WP_FILE_MAGIC:
+        raise ValueError(f"{fname} is not a workplane file")
+    nbr, = struct.unpack_from("<I", buf, 4)
+    offset = 8
+    wp_dict = {}
+    for i in range(nbr):
+        uid, wp, offset = unpack_wp(buf, offset)
+        wp_dict[uid] = wp
+    return wp_dict